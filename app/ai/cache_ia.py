@@ -0,0 +1,114 @@
+import os
+import json
+import asyncio
+import hashlib
+from typing import Any, Optional
+from dotenv import load_dotenv
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.session import SessionLocal
+from app.models.ia_cache import AnalisisIACache
+from app.utils.cache import CacheLRU
+
+load_dotenv()
+IA_CACHE_MAX_ENTRADAS = int(os.getenv("IA_CACHE_MAX_ENTRADAS", 5000))
+IA_CACHE_PERSISTENTE = os.getenv("IA_CACHE_PERSISTENTE", "true").lower() == "true"
+
+
+def normalizar_comentario(comentario: str) -> str:
+    """
+    Normaliza el comentario para que variantes triviales ("Todo bien ", "todo  BIEN") compartan entrada.
+    """
+    return " ".join(comentario.lower().split())
+
+
+def version_prompt(*partes: str) -> str:
+    """
+    Calcula una versión corta a partir del texto del prompt: si el prompt cambia, cambia la versión
+    y con ella todas las claves de caché asociadas.
+    """
+    return hashlib.sha256("\x1f".join(partes).encode("utf-8")).hexdigest()[:12]
+
+
+def calcular_clave(operacion: str, comentario: str, version: str, modelo: str) -> str:
+    contenido = "\x1f".join([operacion, version, modelo, normalizar_comentario(comentario)])
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheAnalisisIA:
+    """
+    Caché de dos niveles para los resultados de IA:
+    1. LRU en memoria, acotada por IA_CACHE_MAX_ENTRADAS.
+    2. Tabla `ia_cache` en la base de datos, compartida entre procesos y reinicios.
+    """
+
+    def __init__(self, max_entradas: int, persistente: bool = True):
+        self.memoria = CacheLRU(max_entradas)
+        self.persistente = persistente
+        self.aciertos_persistente = 0
+        self.fallos_persistente = 0
+
+    async def obtener(self, clave: str) -> Optional[Any]:
+        valor = self.memoria.obtener(clave)
+        if valor is not None or not self.persistente:
+            return valor
+
+        valor = await asyncio.to_thread(self._leer_persistente, clave)
+        if valor is None:
+            self.fallos_persistente += 1
+            return None
+
+        self.aciertos_persistente += 1
+        self.memoria.guardar(clave, valor)
+        return valor
+
+    async def guardar(self, clave: str, operacion: str, version: str, modelo: str, valor: Any) -> None:
+        self.memoria.guardar(clave, valor)
+        if self.persistente:
+            await asyncio.to_thread(self._escribir_persistente, clave, operacion, version, modelo, valor)
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos_persistente + self.fallos_persistente
+        return {
+            "memoria": self.memoria.estadisticas(),
+            "persistente": {
+                "activa": self.persistente,
+                "aciertos": self.aciertos_persistente,
+                "fallos": self.fallos_persistente,
+                "tasa_aciertos": round(self.aciertos_persistente / consultas, 4) if consultas else 0.0,
+            },
+        }
+
+    # Los accesos a la tabla son síncronos, por eso se ejecutan en un hilo aparte.
+    # Un fallo de la caché nunca debe impedir el análisis, así que los errores solo se registran.
+
+    def _leer_persistente(self, clave: str) -> Optional[Any]:
+        db = SessionLocal()
+        try:
+            fila = db.get(AnalisisIACache, clave)
+            return json.loads(fila.resultado) if fila else None
+        except SQLAlchemyError as e:
+            print("ERROR AL LEER CACHE IA:", str(e))
+            return None
+        finally:
+            db.close()
+
+    def _escribir_persistente(self, clave: str, operacion: str, version: str, modelo: str, valor: Any) -> None:
+        db = SessionLocal()
+        try:
+            db.merge(AnalisisIACache(
+                clave=clave,
+                operacion=operacion,
+                modelo=modelo,
+                version_prompt=version,
+                resultado=json.dumps(valor, ensure_ascii=False),
+            ))
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            print("ERROR AL GUARDAR CACHE IA:", str(e))
+        finally:
+            db.close()
+
+
+cache_ia = CacheAnalisisIA(IA_CACHE_MAX_ENTRADAS, persistente=IA_CACHE_PERSISTENTE)
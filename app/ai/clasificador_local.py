@@ -0,0 +1,183 @@
+"""
+Clasificador local de sentimiento y temas para comentarios en español.
+
+Funciona en el propio proceso y sin red: un léxico de polaridad con tratamiento de negaciones,
+intensificadores y "pero", y un etiquetador por palabras clave que usa el mismo vocabulario
+que /metrics/palabras_frecuentes. Devuelve además una confianza entre 0 y 1 para decidir
+si el resultado basta o hay que consultar a la IA.
+"""
+from collections import Counter
+
+from app.utils.texto import tokenizar, palabras_significativas
+
+# Peso de cada palabra con polaridad: 1 = normal, 2 = muy marcada
+LEXICO_POSITIVO = {
+    "bien": 1.5, "bueno": 1.5, "buena": 1.5, "buenos": 1.5, "buenas": 1.5,
+    "mejor": 1, "mejorado": 1.5, "mejora": 1, "mejoras": 1,
+    "excelente": 2, "genial": 2, "estupendo": 2, "fantástico": 2, "perfecto": 2,
+    "increíble": 2, "maravilloso": 2, "encanta": 2, "encantado": 2, "encantada": 2,
+    "contento": 1.5, "contenta": 1.5, "satisfecho": 1.5, "satisfecha": 1.5, "feliz": 1.5,
+    "agradable": 1.5, "gusta": 1, "útil": 1, "positivo": 1, "positiva": 1,
+    "motivado": 1.5, "motivada": 1.5, "agradecido": 1.5, "agradecida": 1.5, "gracias": 1,
+    "apoyo": 1, "flexible": 1, "flexibilidad": 1, "cómodo": 1, "cómoda": 1,
+    "orgulloso": 1.5, "orgullosa": 1.5, "valorado": 1.5, "valorada": 1.5,
+    "eficiente": 1, "claro": 1, "clara": 1, "fácil": 1, "recomiendo": 1.5,
+}
+
+LEXICO_NEGATIVO = {
+    "mal": 1.5, "malo": 1.5, "mala": 1.5, "malos": 1.5, "malas": 1.5, "peor": 1.5,
+    "horrible": 2, "terrible": 2, "pésimo": 2, "pésima": 2, "fatal": 2, "insoportable": 2,
+    "desastre": 2, "odio": 2, "acoso": 2, "abuso": 2, "tóxico": 2, "tóxica": 2,
+    "injusto": 1.5, "injusta": 1.5, "estrés": 1.5, "estresado": 1.5, "estresada": 1.5,
+    "cansado": 1, "cansada": 1, "agotado": 1.5, "agotada": 1.5, "quemado": 1.5, "quemada": 1.5,
+    "frustrado": 1.5, "frustrada": 1.5, "desmotivado": 1.5, "desmotivada": 1.5,
+    "molesto": 1, "molesta": 1, "triste": 1, "preocupado": 1, "preocupada": 1,
+    "problema": 1, "problemas": 1, "queja": 1, "quejas": 1, "difícil": 1,
+    "caos": 1.5, "desorganizado": 1.5, "desorganización": 1.5, "lento": 1, "retraso": 1,
+    "retrasos": 1, "sobrecarga": 1.5, "falta": 1, "faltan": 1, "inútil": 1.5, "ignorado": 1.5,
+}
+
+# Invierten la polaridad de las siguientes palabras con sentimiento
+NEGADORES = {"no", "nunca", "jamás", "tampoco", "ni", "nada", "sin", "poco"}
+VENTANA_NEGACION = 3
+
+# Multiplican la intensidad de la siguiente palabra con sentimiento
+INTENSIFICADORES = {"muy": 1.5, "súper": 1.5, "super": 1.5, "bastante": 1.3, "demasiado": 1.3, "totalmente": 1.5}
+
+# Tras un "pero" / "aunque" / "sin embargo" lo que sigue pesa más que lo anterior
+ADVERSATIVAS = {"pero", "aunque", "embargo"}
+PESO_ANTES_ADVERSATIVA = 0.5
+PESO_DESPUES_ADVERSATIVA = 1.5
+
+# Comentarios sin contenido que son neutros con toda seguridad
+FRASES_NEUTRAS = {
+    "sin comentarios", "ningún comentario", "ninguno", "nada", "nada que comentar",
+    "nada que añadir", "nada que decir", "na", "no aplica", "normal", "ok",
+}
+
+# Vocabulario de temas: palabra clave -> etiqueta
+TEMAS = {
+    "salario": {"salario", "sueldo", "sueldos", "nómina", "pago", "pagos", "cobrar", "retribución", "aumento", "subida"},
+    "horario": {"horario", "horarios", "horas", "turno", "turnos", "jornada", "teletrabajo", "remoto", "conciliación"},
+    "ambiente": {"ambiente", "compañeros", "compañeras", "equipo", "clima", "compañerismo"},
+    "liderazgo": {"jefe", "jefa", "jefes", "responsable", "manager", "dirección", "gerencia", "liderazgo", "supervisor"},
+    "formación": {"formación", "curso", "cursos", "aprender", "aprendizaje", "capacitación", "mentoring"},
+    "carga de trabajo": {"carga", "estrés", "estresado", "estresada", "agotado", "agotada", "sobrecarga", "presión", "plazos"},
+    "comunicación": {"comunicación", "información", "reunión", "reuniones", "informar", "transparencia"},
+    "instalaciones": {"oficina", "oficinas", "instalaciones", "material", "ordenador", "herramientas", "sillas", "espacio"},
+    "reconocimiento": {"reconocimiento", "valorado", "valorada", "agradecimiento", "reconocen", "valoran"},
+    "beneficios": {"beneficios", "vacaciones", "seguro", "comedor", "comida", "bonus", "incentivos"},
+    "carrera": {"ascenso", "ascensos", "promoción", "crecimiento", "carrera", "desarrollo"},
+}
+_TEMA_POR_PALABRA = {palabra: tema for tema, palabras in TEMAS.items() for palabra in palabras}
+
+# Palabras frecuentes que no sirven como etiqueta cuando no se reconoce ningún tema
+NO_ETIQUETAS = {
+    "embargo", "comentario", "comentarios", "siempre", "también", "estoy", "están", "estamos",
+    "mucho", "mucha", "muchos", "muchas", "tiene", "tienen", "hemos", "puede", "pueden", "hacer",
+}
+
+# A partir de esta longitud el léxico es menos fiable y la confianza se reduce
+TOKENS_FIABLES = 25
+LONGITUD_MAXIMA_RESUMEN = 120
+
+
+def puntuar_sentimiento(tokens: list[str]) -> tuple[float, float]:
+    """
+    Suma la evidencia positiva y negativa de una lista de tokens, teniendo en cuenta
+    negaciones, intensificadores y conectores adversativos.
+    Devuelve (evidencia_positiva, evidencia_negativa).
+    """
+    positiva = 0.0
+    negativa = 0.0
+    factor_tramo = 1.0
+    negacion_restante = 0
+    intensidad = 1.0
+
+    for token in tokens:
+        if token in ADVERSATIVAS:
+            positiva *= PESO_ANTES_ADVERSATIVA
+            negativa *= PESO_ANTES_ADVERSATIVA
+            factor_tramo = PESO_DESPUES_ADVERSATIVA
+            negacion_restante = 0
+            continue
+        if token in NEGADORES:
+            negacion_restante = VENTANA_NEGACION
+            continue
+        if token in INTENSIFICADORES:
+            intensidad = INTENSIFICADORES[token]
+            continue
+
+        peso = LEXICO_POSITIVO.get(token, 0) - LEXICO_NEGATIVO.get(token, 0)
+        if peso:
+            peso *= intensidad * factor_tramo
+            if negacion_restante > 0:
+                # "no está mal" es positivo, pero menos que "está bien"
+                peso = -peso * 0.7
+                negacion_restante = 0
+            if peso > 0:
+                positiva += peso
+            else:
+                negativa -= peso
+            intensidad = 1.0
+        elif negacion_restante > 0:
+            negacion_restante -= 1
+
+    return positiva, negativa
+
+
+def etiquetar_temas(comentario: str, max_etiquetas: int = 3) -> list[str]:
+    """
+    Asigna etiquetas temáticas según las palabras clave del comentario.
+    Si no encaja ningún tema, usa las palabras significativas más repetidas.
+    """
+    palabras = palabras_significativas(comentario)
+    temas = Counter(_TEMA_POR_PALABRA[p] for p in palabras if p in _TEMA_POR_PALABRA)
+    if temas:
+        return [tema for tema, _ in temas.most_common(max_etiquetas)]
+
+    largas = [
+        p for p in palabras
+        if len(p) > 4 and p not in NO_ETIQUETAS and p not in LEXICO_POSITIVO and p not in LEXICO_NEGATIVO
+    ]
+    return [palabra for palabra, _ in Counter(largas).most_common(min(2, max_etiquetas))]
+
+
+def resumir(comentario: str) -> str:
+    resumen = " ".join(comentario.split())
+    if len(resumen) <= LONGITUD_MAXIMA_RESUMEN:
+        return resumen
+    return resumen[:LONGITUD_MAXIMA_RESUMEN].rsplit(" ", 1)[0] + "…"
+
+
+def clasificar_localmente(comentario: str) -> dict:
+    """
+    Analiza el comentario sin salir del proceso.
+    Devuelve sentimiento, etiquetas, resumen y una confianza entre 0 y 1.
+    """
+    tokens = tokenizar(comentario)
+    base = {"etiquetas": etiquetar_temas(comentario), "resumen": resumir(comentario)}
+
+    if " ".join(tokens) in FRASES_NEUTRAS or not tokens:
+        return {**base, "sentimiento": "neutro", "confianza": 0.95 if tokens else 0.0}
+
+    positiva, negativa = puntuar_sentimiento(tokens)
+    evidencia = positiva + negativa
+
+    if evidencia == 0:
+        # Sin palabras con polaridad: probablemente neutro, pero no lo sabemos con seguridad
+        return {**base, "sentimiento": "neutro", "confianza": 0.3}
+
+    acuerdo = abs(positiva - negativa) / evidencia       # 1 si toda la evidencia apunta al mismo lado
+    soporte = min(1.0, evidencia / 1.5)                   # una palabra clara basta; más refuerza
+    longitud = min(1.0, TOKENS_FIABLES / len(tokens))     # textos largos: el léxico se queda corto
+    confianza = round(acuerdo * soporte * max(longitud, 0.4), 3)
+
+    if positiva - negativa > 0.25 * evidencia:
+        sentimiento = "positivo"
+    elif negativa - positiva > 0.25 * evidencia:
+        sentimiento = "negativo"
+    else:
+        sentimiento = "neutro"
+
+    return {**base, "sentimiento": sentimiento, "confianza": confianza}
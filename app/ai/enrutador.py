@@ -0,0 +1,80 @@
+import os
+import time
+from dotenv import load_dotenv
+
+from app.ai.clasificador_local import clasificar_localmente
+from app.ai.openai_client import analizar_feedback_con_ia, analizar_feedbacks_en_lote, IA_DEGRADAR
+
+load_dotenv()
+# Confianza mínima para aceptar el resultado del clasificador local sin consultar a la IA.
+# Un valor mayor que 1 desactiva el nivel local y envía todo a la IA.
+IA_UMBRAL_CONFIANZA_LOCAL = float(os.getenv("IA_UMBRAL_CONFIANZA_LOCAL", 0.8))
+
+
+def _resultado(analisis: dict, nivel: str, confianza_local: float, latencia_ms: float) -> dict:
+    return {
+        "sentimiento": analisis["sentimiento"],
+        "etiquetas": analisis["etiquetas"],
+        "resumen": analisis["resumen"],
+        "nivel_analisis": nivel,
+        "confianza_local": confianza_local,
+        "latencia_analisis_ms": round(latencia_ms, 3),
+    }
+
+
+async def analizar_feedback_enrutado(
+    comentario: str,
+    umbral: float = IA_UMBRAL_CONFIANZA_LOCAL,
+    degradar: bool = IA_DEGRADAR
+) -> dict:
+    """
+    Análisis por niveles: primero el clasificador local (sin red) y, solo si su confianza
+    no llega al umbral, la IA. El resultado indica qué nivel lo resolvió y cuánto tardó.
+    `degradar` se pasa a analizar_feedback_con_ia.
+    """
+    inicio = time.perf_counter()
+    local = clasificar_localmente(comentario)
+    if local["confianza"] >= umbral:
+        return _resultado(local, "local", local["confianza"], (time.perf_counter() - inicio) * 1000)
+
+    analisis = await analizar_feedback_con_ia(comentario, degradar)
+    return _resultado(analisis, "ia", local["confianza"], (time.perf_counter() - inicio) * 1000)
+
+
+async def analizar_feedbacks_enrutados_en_lote(comentarios: list[str], umbral: float = IA_UMBRAL_CONFIANZA_LOCAL) -> dict:
+    """
+    Versión por lotes de `analizar_feedback_enrutado`: resuelve en local los comentarios claros
+    y envía el resto a la IA en peticiones agrupadas. Para los escalados, la latencia guardada
+    es el tiempo de las peticiones agrupadas repartido entre sus comentarios.
+    Los comentarios que la IA no ha podido analizar quedan como None en `resultados`.
+    """
+    resultados: list = [None] * len(comentarios)
+    confianzas = []
+    escalados = []
+
+    for indice, comentario in enumerate(comentarios):
+        inicio = time.perf_counter()
+        local = clasificar_localmente(comentario)
+        confianzas.append(local["confianza"])
+        if local["confianza"] >= umbral:
+            resultados[indice] = _resultado(local, "local", local["confianza"], (time.perf_counter() - inicio) * 1000)
+        else:
+            escalados.append(indice)
+
+    inicio = time.perf_counter()
+    analisis_ia = await analizar_feedbacks_en_lote([comentarios[i] for i in escalados]) if escalados else None
+    latencia_por_fila = (time.perf_counter() - inicio) * 1000 / len(escalados) if escalados else 0.0
+
+    for indice, analisis in zip(escalados, analisis_ia["resultados"] if analisis_ia else []):
+        if analisis is not None:
+            resultados[indice] = _resultado(analisis, "ia", confianzas[indice], latencia_por_fila)
+
+    return {
+        "resultados": resultados,
+        "resueltos_localmente": len(comentarios) - len(escalados),
+        "tokens_totales": analisis_ia["tokens_totales"] if analisis_ia else 0,
+        "llamadas": analisis_ia["llamadas"] if analisis_ia else 0,
+        "reintentos": analisis_ia["reintentos"] if analisis_ia else 0,
+        "fallidos": analisis_ia["fallidos"] if analisis_ia else 0,
+        "desde_cache": analisis_ia["desde_cache"] if analisis_ia else 0,
+    }
@@ -1,34 +1,386 @@
 import os
 import json
+import time
+import random
+import asyncio
+from typing import Optional
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
 
-# Cargar la API key desde .env y crear el cliente de OpenAI
+from app.ai.cache_ia import cache_ia, calcular_clave, version_prompt
+from app.ai.uso_ia import uso_ia
+
+# Cargar la API key desde .env y crear el cliente asíncrono de OpenAI
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_MAX_CONCURRENCIA = int(os.getenv("OPENAI_MAX_CONCURRENCIA", 8))  # peticiones simultáneas como máximo
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 30))  # segundos por intento
+OPENAI_REINTENTOS = int(os.getenv("OPENAI_REINTENTOS", 3))  # reintentos ante 429, 5xx, timeouts y errores de conexión
+OPENAI_ESPERA_BASE = float(os.getenv("OPENAI_ESPERA_BASE", 0.5))  # segundos; se duplica en cada reintento
+OPENAI_ESPERA_MAXIMA = float(os.getenv("OPENAI_ESPERA_MAXIMA", 8))  # segundos como máximo entre reintentos
+# Operaciones en las que, si la respuesta tarda más de OPENAI_DUPLICAR_TRAS segundos, se lanza
+# una segunda petición igual y se usa la primera que responda
+OPENAI_DUPLICAR_OPERACIONES = {op.strip() for op in os.getenv("OPENAI_DUPLICAR_OPERACIONES", "analisis").split(",") if op.strip()}
+OPENAI_DUPLICAR_TRAS = float(os.getenv("OPENAI_DUPLICAR_TRAS", 3))
+OPENAI_CIRCUITO_FALLOS = int(os.getenv("OPENAI_CIRCUITO_FALLOS", 5))  # fallos seguidos que abren el circuito
+OPENAI_CIRCUITO_ESPERA = float(os.getenv("OPENAI_CIRCUITO_ESPERA", 30))  # segundos abierto antes de probar otra vez
+# Si es true, el análisis y el enriquecimiento devuelven el análisis neutro cuando la IA no está disponible
+IA_DEGRADAR = os.getenv("IA_DEGRADAR", "true").lower() == "true"
+IA_TAMANO_LOTE = int(os.getenv("IA_TAMANO_LOTE", 20))  # comentarios por petición en el análisis en lote
+IA_REINTENTOS_LOTE = int(os.getenv("IA_REINTENTOS_LOTE", 1))  # reintentos de los elementos que no se pudieron interpretar
 
-# Función genérica para generar respuestas con un prompt y parámetros configurables
-def generar_respuesta_openai(
+SENTIMIENTOS_VALIDOS = ("positivo", "negativo", "neutro")
+URGENCIAS_VALIDAS = ("urgente", "normal", "baja")
+ANALISIS_POR_DEFECTO = {
+    "sentimiento": "neutro",
+    "etiquetas": [],
+    "resumen": "No se pudo procesar el comentario."
+}
+ENRIQUECIMIENTO_POR_DEFECTO = {
+    **ANALISIS_POR_DEFECTO,
+    "toxico": None,
+    "razon_toxicidad": None,
+    "urgencia": None,
+    "sugerencia": None,
+    "respuesta": None,
+}
+
+# Plazo total (segundos) de cada operación, reintentos y esperas incluidos. Las que hacen esperar
+# a un usuario tienen menos margen que las de los trabajadores y el backfill.
+# Cada una se puede cambiar con OPENAI_PLAZO_<OPERACION>, por ejemplo OPENAI_PLAZO_ANALISIS=10.
+PLAZOS_OPERACION = {
+    operacion: float(os.getenv(f"OPENAI_PLAZO_{operacion.upper()}", plazo))
+    for operacion, plazo in {
+        "analisis": 15,
+        "toxicidad": 15,
+        "urgencia": 15,
+        "sugerencia": 20,
+        "respuesta": 20,
+        "cambio_sentimiento": 30,
+        "enriquecimiento": 45,
+        "analisis_lote": 90,
+        "otra": 30,
+    }.items()
+}
+
+# Los reintentos los hace crear_completion, con su propio plazo y el estado del circuito
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT, max_retries=0)
+
+
+class IANoDisponible(Exception):
+    """
+    La llamada a OpenAI no se ha podido completar: el circuito está abierto, se han agotado
+    los reintentos o se ha superado el plazo de la operación.
+    """
+
+    def __init__(self, mensaje: str, reintentar_en: float = 0):
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en  # segundos hasta que tenga sentido volver a intentarlo
+
+
+class RespuestaIAInvalida(Exception):
+    """
+    El modelo ha respondido, pero su respuesta no tiene el formato esperado.
+    """
+
+
+def es_analisis_por_defecto(analisis: dict) -> bool:
+    """
+    Indica si `analisis` es el resultado neutro que se devuelve cuando no se ha podido analizar el comentario.
+    """
+    return all(analisis.get(campo) == valor for campo, valor in ANALISIS_POR_DEFECTO.items())
+
+
+class CircuitoIA:
+    """
+    Cortacircuitos de las llamadas a OpenAI. Tras `umbral` fallos transitorios seguidos (429, 5xx,
+    timeouts o errores de conexión) se abre y durante `espera` segundos las llamadas fallan al
+    momento sin llegar a OpenAI. Después queda semiabierto: deja pasar una sola llamada de prueba,
+    que lo cierra si sale bien o lo vuelve a abrir si falla.
+    """
+
+    def __init__(self, umbral: int, espera: float):
+        self.umbral = umbral
+        self.espera = espera
+        self.estado_actual = "cerrado"
+        self.fallos_seguidos = 0
+        self.aperturas = 0
+        self.rechazadas = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+
+    def _actualizar(self) -> None:
+        if self.estado_actual == "abierto" and time.monotonic() - self._abierto_desde >= self.espera:
+            self.estado_actual = "semiabierto"
+            self._prueba_en_curso = False
+
+    def segundos_para_reintentar(self) -> float:
+        self._actualizar()
+        if self.estado_actual != "abierto":
+            return 0.0
+        return max(0.0, self.espera - (time.monotonic() - self._abierto_desde))
+
+    def disponible(self) -> bool:
+        """
+        Indica si merece la pena intentar una llamada, sin reservar la llamada de prueba.
+        """
+        self._actualizar()
+        return self.estado_actual == "cerrado" or (self.estado_actual == "semiabierto" and not self._prueba_en_curso)
+
+    def permitir(self) -> bool:
+        """
+        Reserva el paso de una llamada. En semiabierto solo se concede a la llamada de prueba.
+        """
+        if not self.disponible():
+            self.rechazadas += 1
+            return False
+        if self.estado_actual == "semiabierto":
+            self._prueba_en_curso = True
+        return True
+
+    def registrar_exito(self) -> None:
+        self.estado_actual = "cerrado"
+        self.fallos_seguidos = 0
+        self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        self.fallos_seguidos += 1
+        if self.estado_actual == "semiabierto" or (self.estado_actual == "cerrado" and self.fallos_seguidos >= self.umbral):
+            self.estado_actual = "abierto"
+            self.aperturas += 1
+            self._abierto_desde = time.monotonic()
+        self._prueba_en_curso = False
+
+    def registrar_cancelacion(self) -> None:
+        # Una llamada cancelada (la más lenta de una pareja duplicada) no dice nada del servicio
+        self._prueba_en_curso = False
+
+    def estado(self) -> dict:
+        segundos = self.segundos_para_reintentar()
+        return {
+            "estado": self.estado_actual,
+            "fallos_seguidos": self.fallos_seguidos,
+            "umbral": self.umbral,
+            "espera_segundos": self.espera,
+            "segundos_para_reintentar": round(segundos, 1),
+            "aperturas": self.aperturas,
+            "llamadas_rechazadas": self.rechazadas,
+        }
+
+
+class LimitadorConcurrencia:
+    """
+    Semáforo global que limita cuántas llamadas a OpenAI hay en vuelo a la vez.
+    Lleva la cuenta de las llamadas en curso y de las que esperan turno (profundidad de la cola).
+    """
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.en_curso = 0
+        self.en_cola = 0
+        self._semaforo = asyncio.Semaphore(limite)
+
+    async def __aenter__(self):
+        self.en_cola += 1
+        try:
+            await self._semaforo.acquire()
+        finally:
+            self.en_cola -= 1
+        self.en_curso += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.en_curso -= 1
+        self._semaforo.release()
+
+    def estado(self) -> dict:
+        return {
+            "limite": self.limite,
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+        }
+
+
+limitador = LimitadorConcurrencia(OPENAI_MAX_CONCURRENCIA)
+
+
+circuito = CircuitoIA(OPENAI_CIRCUITO_FALLOS, OPENAI_CIRCUITO_ESPERA)
+
+
+# Errores que suelen desaparecer al reintentar: límite de peticiones (429), errores del servidor (5xx),
+# timeouts y errores de conexión (APITimeoutError hereda de APIConnectionError)
+def _es_transitorio(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+# Backoff exponencial con jitter completo: un valor al azar entre 0 y OPENAI_ESPERA_BASE * 2^intento
+# (con tope), para que las llamadas que fallaron a la vez no vuelvan todas a la vez.
+# Si OpenAI indica cuánto esperar (cabecera Retry-After), se espera al menos eso.
+def _espera_reintento(intento: int, error: Exception) -> float:
+    espera = random.uniform(0, min(OPENAI_ESPERA_MAXIMA, OPENAI_ESPERA_BASE * 2 ** intento))
+    if isinstance(error, APIStatusError):
+        try:
+            espera = max(espera, float(error.response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return espera
+
+
+# Un intento: pide paso al circuito, espera turno en el limitador y hace la petición sin pasar
+# del plazo de la operación (`limite`, en time.monotonic()) ni de `timeout` segundos.
+async def _intento(peticion: dict, operacion: str, limite: float, timeout: float):
+    if not circuito.permitir():
+        raise IANoDisponible("El circuito de OpenAI está abierto", circuito.segundos_para_reintentar())
+
+    async with limitador:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            # El plazo se ha agotado esperando turno: no es culpa de OpenAI
+            circuito.registrar_cancelacion()
+            raise asyncio.TimeoutError()
+
+        espera_maxima = min(timeout, restante)
+        inicio = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                client.chat.completions.create(**peticion, timeout=espera_maxima), espera_maxima
+            )
+        except asyncio.CancelledError:
+            circuito.registrar_cancelacion()
+            raise
+        except Exception as e:
+            uso_ia.registrar_llamada(operacion, (time.perf_counter() - inicio) * 1000, error=True)
+            if _es_transitorio(e):
+                circuito.registrar_fallo()
+            else:
+                circuito.registrar_exito()  # OpenAI ha respondido, aunque sea con un error de la petición
+            raise
+        uso_ia.registrar_llamada(operacion, (time.perf_counter() - inicio) * 1000, response.usage)
+        circuito.registrar_exito()
+        return response
+
+
+# Petición duplicada para las operaciones en las que espera un usuario: si el intento no ha respondido
+# en OPENAI_DUPLICAR_TRAS segundos y el limitador tiene hueco, se lanza otro igual y se usa la primera
+# respuesta correcta. La otra se cancela. Con el limitador lleno no se duplica para no añadir carga.
+async def _intento_con_duplicado(lanzar, operacion: str):
+    original = asyncio.ensure_future(lanzar())
+    tareas = {original}
+    try:
+        hechas, _ = await asyncio.wait(tareas, timeout=OPENAI_DUPLICAR_TRAS)
+        if hechas or limitador.en_curso >= limitador.limite:
+            return await original
+
+        duplicada = asyncio.ensure_future(lanzar())
+        tareas.add(duplicada)
+        uso_ia.registrar_duplicada(operacion)
+        error = None
+        while tareas:
+            hechas, tareas = await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+            # Una tarea cancelada no tiene excepción que consultar (exception() lanzaría CancelledError)
+            terminadas = [tarea for tarea in hechas if not tarea.cancelled()]
+            correctas = [tarea for tarea in terminadas if tarea.exception() is None]
+            if correctas:
+                if duplicada in correctas:
+                    uso_ia.registrar_duplicada(operacion, ganadora=True)
+                return correctas[0].result()
+            if terminadas:
+                error = terminadas[-1].exception()
+        raise error if error is not None else asyncio.CancelledError()
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+
+
+# Llamada base a OpenAI. No bloquea el event loop: espera turno en el limitador y después a la respuesta.
+# Devuelve la respuesta completa para quien necesite también el consumo de tokens (`response.usage`).
+# Cada intento se anota en uso_ia con su `operacion`; la latencia no incluye la espera en el limitador.
+# Los errores transitorios se reintentan con backoff mientras quede plazo (PLAZOS_OPERACION); si no
+# se consigue respuesta, o el circuito está abierto, se lanza IANoDisponible. `timeout` acota cada intento.
+async def crear_completion(
     system_content: str,
     user_prompt: str,
     temperature: float = 0.5,
-    max_tokens: int = 200
-) -> str:
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
+    max_tokens: int = 200,
+    timeout: Optional[float] = None,
+    operacion: str = "otra"
+):
+    peticion = {
+        "model": OPENAI_MODEL,
+        "messages": [
             {"role": "system", "content": system_content},
             {"role": "user", "content": user_prompt}
         ],
-        temperature=temperature,
-        max_tokens=max_tokens
-    )
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    limite = time.monotonic() + PLAZOS_OPERACION.get(operacion, PLAZOS_OPERACION["otra"])
+
+    def lanzar():
+        return _intento(peticion, operacion, limite, timeout or OPENAI_TIMEOUT)
+
+    for intento in range(OPENAI_REINTENTOS + 1):
+        try:
+            if operacion in OPENAI_DUPLICAR_OPERACIONES:
+                return await _intento_con_duplicado(lanzar, operacion)
+            return await lanzar()
+        except IANoDisponible:
+            raise
+        except Exception as e:
+            if not _es_transitorio(e):
+                raise
+            error = e
+
+        espera = _espera_reintento(intento, error)
+        if intento == OPENAI_REINTENTOS or time.monotonic() + espera >= limite:
+            break
+        uso_ia.registrar_reintentos(operacion)
+        await asyncio.sleep(espera)
+
+    raise IANoDisponible(
+        f"OpenAI no ha respondido a {operacion}: {type(error).__name__} {error}",
+        circuito.segundos_para_reintentar()
+    ) from error
+
+
+# Función genérica para generar respuestas con un prompt y parámetros configurables
+async def generar_respuesta_openai(
+    system_content: str,
+    user_prompt: str,
+    temperature: float = 0.5,
+    max_tokens: int = 200,
+    timeout: Optional[float] = None,
+    operacion: str = "otra"
+) -> str:
+    response = await crear_completion(system_content, user_prompt, temperature, max_tokens, timeout, operacion)
     return response.choices[0].message.content.strip()
 
 
+# Comprueba que un análisis devuelto por el modelo tiene la estructura esperada y lo normaliza.
+# Devuelve None si no es válido.
+def validar_analisis(analisis) -> Optional[dict]:
+    if not isinstance(analisis, dict):
+        return None
+
+    sentimiento = str(analisis.get("sentimiento", "")).strip().lower()
+    etiquetas = analisis.get("etiquetas")
+    resumen = analisis.get("resumen")
+
+    if sentimiento not in SENTIMIENTOS_VALIDOS:
+        return None
+    if not isinstance(etiquetas, list) or not all(isinstance(e, str) for e in etiquetas):
+        return None
+    if not isinstance(resumen, str) or not resumen.strip():
+        return None
+
+    return {"sentimiento": sentimiento, "etiquetas": etiquetas, "resumen": resumen.strip()}
+
+
 # Análisis completo del comentario: sentimiento, etiquetas y resumen
-def analizar_feedback_con_ia(comentario: str) -> dict:
-    prompt = f"""
+SYSTEM_ANALISIS = "Eres un analista de RRHH que entiende comentarios humanos."
+PROMPT_ANALISIS = """
     Analiza el siguiente comentario de un empleado y devuelve:
 
     1. Sentimiento general: elige solo entre positivo, negativo o neutro.
@@ -44,21 +396,249 @@ def analizar_feedback_con_ia(comentario: str) -> dict:
       "resumen": "frase resumen del comentario"
     }}
     """
-    system = "Eres un analista de RRHH que entiende comentarios humanos."
-    contenido = generar_respuesta_openai(system, prompt, temperature=0.4)
+# Mismo análisis para varios comentarios en una sola petición
+PROMPT_ANALISIS_LOTE = """
+    Analiza cada uno de los siguientes comentarios de empleados y devuelve para cada uno:
+
+    1. Sentimiento general: elige solo entre positivo, negativo o neutro.
+    2. Dos o tres etiquetas temáticas que resuman los temas clave del comentario.
+    3. Un resumen breve y neutro del comentario en una sola frase.
+
+    Comentarios (array JSON de objetos con "indice" y "comentario"):
+    {comentarios}
+
+    Devuelve solo un array JSON válido con un objeto por comentario y esta estructura:
+    [
+      {{
+        "indice": 0,
+        "sentimiento": "positivo | negativo | neutro",
+        "etiquetas": ["etiqueta1", "etiqueta2"],
+        "resumen": "frase resumen del comentario"
+      }}
+    ]
+    """
+# Ambos prompts producen el mismo resultado, así que comparten versión y entradas de caché
+VERSION_ANALISIS = version_prompt(SYSTEM_ANALISIS, PROMPT_ANALISIS, PROMPT_ANALISIS_LOTE, "0.4")
+
+
+# Con degradar=False, si la IA no está disponible o su respuesta no es válida se lanza
+# IANoDisponible o RespuestaIAInvalida en lugar de devolver el análisis neutro.
+async def analizar_feedback_con_ia(comentario: str, degradar: bool = IA_DEGRADAR) -> dict:
+    clave = calcular_clave("analisis", comentario, VERSION_ANALISIS, OPENAI_MODEL)
+    cacheado = await cache_ia.obtener(clave)
+    if cacheado is not None:
+        return cacheado
+
+    prompt = PROMPT_ANALISIS.format(comentario=comentario)
+    try:
+        contenido = await generar_respuesta_openai(SYSTEM_ANALISIS, prompt, temperature=0.4, operacion="analisis")
+    except IANoDisponible:
+        if not degradar:
+            raise
+        uso_ia.registrar_degradada("analisis")
+        return dict(ANALISIS_POR_DEFECTO)
 
     try:
-        return json.loads(contenido)
+        analisis = validar_analisis(json.loads(contenido))
     except Exception:
-        return {
-            "sentimiento": "neutro",
-            "etiquetas": [],
-            "resumen": "No se pudo procesar el comentario."
-        }
+        analisis = None
+
+    if analisis is None:
+        uso_ia.registrar_fallo_parseo("analisis")
+        if not degradar:
+            raise RespuestaIAInvalida(f"Análisis no válido: {contenido[:200]}")
+        return dict(ANALISIS_POR_DEFECTO)
+
+    await cache_ia.guardar(clave, "analisis", VERSION_ANALISIS, OPENAI_MODEL, analisis)
+    return analisis
+
+
+# Analiza un grupo de comentarios en una sola petición.
+# Devuelve un análisis por comentario (None si el modelo no lo devolvió bien o la IA no está disponible)
+# y los tokens consumidos.
+async def _analizar_grupo(comentarios: list[str]) -> tuple[list[Optional[dict]], int]:
+    entrada = json.dumps(
+        [{"indice": i, "comentario": c} for i, c in enumerate(comentarios)],
+        ensure_ascii=False
+    )
+    prompt = PROMPT_ANALISIS_LOTE.format(comentarios=entrada)
+    try:
+        response = await crear_completion(
+            SYSTEM_ANALISIS, prompt, temperature=0.4, max_tokens=100 + 120 * len(comentarios), operacion="analisis_lote"
+        )
+    except IANoDisponible:
+        if not IA_DEGRADAR:
+            raise
+        uso_ia.registrar_degradada("analisis_lote", len(comentarios))
+        return [None] * len(comentarios), 0
+    tokens = response.usage.total_tokens if response.usage else 0
+
+    resultados: list[Optional[dict]] = [None] * len(comentarios)
+    try:
+        elementos = json.loads(response.choices[0].message.content)
+    except Exception:
+        elementos = None
+
+    if isinstance(elementos, list):
+        for elemento in elementos:
+            indice = elemento.get("indice") if isinstance(elemento, dict) else None
+            if isinstance(indice, int) and 0 <= indice < len(comentarios):
+                resultados[indice] = validar_analisis(elemento)
+
+    # Cada comentario que falta o no es válido cuenta como un fallo de interpretación
+    fallidos = resultados.count(None)
+    if fallidos:
+        uso_ia.registrar_fallo_parseo("analisis_lote", fallidos)
+    return resultados, tokens
+
+
+# Analiza muchos comentarios agrupándolos en peticiones de IA_TAMANO_LOTE comentarios.
+# Aprovecha la caché, analiza una sola vez los comentarios repetidos y solo reintenta
+# los elementos que el modelo no devolvió bien. Los que siguen fallando quedan como None
+# (no reciben el análisis por defecto, que no se distinguiría de un resultado real).
+async def analizar_feedbacks_en_lote(comentarios: list[str], tamano_lote: int = IA_TAMANO_LOTE) -> dict:
+    analisis_por_clave: dict[str, dict] = {}
+    claves = [calcular_clave("analisis", c, VERSION_ANALISIS, OPENAI_MODEL) for c in comentarios]
+
+    # 1. Comentarios únicos que no están en caché
+    pendientes: dict[str, str] = {}
+    for clave, comentario in zip(claves, comentarios):
+        if clave in analisis_por_clave or clave in pendientes:
+            continue
+        cacheado = await cache_ia.obtener(clave)
+        if cacheado is not None:
+            analisis_por_clave[clave] = cacheado
+        else:
+            pendientes[clave] = comentario
+    desde_cache = sum(1 for clave in claves if clave in analisis_por_clave)
+
+    # 2. Peticiones agrupadas en paralelo (el limitador acota la concurrencia) y reintento de los fallidos
+    tokens_totales = 0
+    llamadas = 0
+    reintentos = 0
+    for intento in range(IA_REINTENTOS_LOTE + 1):
+        if not pendientes:
+            break
+        if intento > 0:
+            reintentos += len(pendientes)
+            uso_ia.registrar_reintentos("analisis_lote", len(pendientes))
+
+        items = list(pendientes.items())
+        grupos = [items[i:i + tamano_lote] for i in range(0, len(items), tamano_lote)]
+        respuestas = await asyncio.gather(*(_analizar_grupo([c for _, c in grupo]) for grupo in grupos))
+        llamadas += len(grupos)
+
+        for grupo, (resultados, tokens) in zip(grupos, respuestas):
+            tokens_totales += tokens
+            for (clave, _), analisis in zip(grupo, resultados):
+                if analisis is None:
+                    continue
+                analisis_por_clave[clave] = analisis
+                del pendientes[clave]
+                await cache_ia.guardar(clave, "analisis", VERSION_ANALISIS, OPENAI_MODEL, analisis)
+
+    return {
+        "resultados": [dict(analisis_por_clave[clave]) if clave in analisis_por_clave else None for clave in claves],
+        "tokens_totales": tokens_totales,
+        "llamadas": llamadas,
+        "reintentos": reintentos,
+        "fallidos": sum(1 for clave in claves if clave in pendientes),
+        "desde_cache": desde_cache,
+    }
+
+
+# Enriquecimiento completo en una sola llamada: análisis, toxicidad, urgencia, sugerencia y respuesta.
+# Sustituye a las cinco llamadas separadas cuando se quiere procesar un comentario entero.
+SYSTEM_ENRIQUECIMIENTO = "Eres un analista de RRHH experto en experiencia del empleado, análisis de lenguaje y comunicación empática."
+PROMPT_ENRIQUECIMIENTO = """
+    Analiza el siguiente comentario de un empleado y devuelve:
+
+    1. Sentimiento general: elige solo entre positivo, negativo o neutro.
+    2. Dos o tres etiquetas temáticas que resuman los temas clave del comentario.
+    3. Un resumen breve y neutro del comentario en una sola frase.
+    4. Si contiene lenguaje tóxico, agresivo o inapropiado (true o false) y una frase corta explicando por qué.
+    5. Su nivel de urgencia para que el equipo de RRHH actúe: urgente, normal o baja.
+    6. Una sugerencia útil que la empresa pueda aplicar, en una sola frase.
+    7. Solo si el sentimiento es negativo, una respuesta educada y empática al empleado; si no, null.
+
+    Comentario: {comentario}
+
+    Devuelve solo un JSON válido con esta estructura:
+    {{
+      "sentimiento": "positivo | negativo | neutro",
+      "etiquetas": ["etiqueta1", "etiqueta2"],
+      "resumen": "frase resumen del comentario",
+      "toxico": true | false,
+      "razon_toxicidad": "frase corta",
+      "urgencia": "urgente | normal | baja",
+      "sugerencia": "frase con la sugerencia",
+      "respuesta": "respuesta empática" | null
+    }}
+    """
+VERSION_ENRIQUECIMIENTO = version_prompt(SYSTEM_ENRIQUECIMIENTO, PROMPT_ENRIQUECIMIENTO, "0.4")
+
+
+# Valida el enriquecimiento completo. El análisis básico es obligatorio;
+# los campos adicionales que no sean válidos se dejan a None para calcularlos más tarde si hace falta.
+def validar_enriquecimiento(enriquecimiento) -> Optional[dict]:
+    resultado = validar_analisis(enriquecimiento)
+    if resultado is None:
+        return None
+
+    toxico = enriquecimiento.get("toxico")
+    razon = enriquecimiento.get("razon_toxicidad")
+    urgencia = str(enriquecimiento.get("urgencia", "")).strip().lower()
+    sugerencia = enriquecimiento.get("sugerencia")
+    respuesta = enriquecimiento.get("respuesta")
+
+    resultado["toxico"] = toxico if isinstance(toxico, bool) else None
+    resultado["razon_toxicidad"] = razon if resultado["toxico"] is not None and isinstance(razon, str) else None
+    resultado["urgencia"] = urgencia if urgencia in URGENCIAS_VALIDAS else None
+    resultado["sugerencia"] = sugerencia.strip() if isinstance(sugerencia, str) and sugerencia.strip() else None
+    resultado["respuesta"] = (
+        respuesta.strip()
+        if resultado["sentimiento"] == "negativo" and isinstance(respuesta, str) and respuesta.strip()
+        else None
+    )
+    return resultado
+
+
+# Con degradar=False, si la IA no está disponible o su respuesta no es válida se lanza
+# IANoDisponible o RespuestaIAInvalida en lugar de devolver el análisis neutro.
+async def enriquecer_feedback_completo(comentario: str, degradar: bool = IA_DEGRADAR) -> dict:
+    clave = calcular_clave("enriquecimiento", comentario, VERSION_ENRIQUECIMIENTO, OPENAI_MODEL)
+    cacheado = await cache_ia.obtener(clave)
+    if cacheado is not None:
+        return cacheado
+
+    prompt = PROMPT_ENRIQUECIMIENTO.format(comentario=comentario)
+    try:
+        contenido = await generar_respuesta_openai(
+            SYSTEM_ENRIQUECIMIENTO, prompt, temperature=0.4, max_tokens=600, operacion="enriquecimiento"
+        )
+    except IANoDisponible:
+        if not degradar:
+            raise
+        uso_ia.registrar_degradada("enriquecimiento")
+        return dict(ENRIQUECIMIENTO_POR_DEFECTO)
+
+    try:
+        enriquecimiento = validar_enriquecimiento(json.loads(contenido))
+    except Exception:
+        enriquecimiento = None
+
+    if enriquecimiento is None:
+        uso_ia.registrar_fallo_parseo("enriquecimiento")
+        if not degradar:
+            raise RespuestaIAInvalida(f"Enriquecimiento no válido: {contenido[:200]}")
+        return dict(ENRIQUECIMIENTO_POR_DEFECTO)
+
+    await cache_ia.guardar(clave, "enriquecimiento", VERSION_ENRIQUECIMIENTO, OPENAI_MODEL, enriquecimiento)
+    return enriquecimiento
 
 
 # Genera una respuesta profesional a un comentario negativo
-def generar_respuesta_educada(comentario: str) -> str:
+async def generar_respuesta_educada(comentario: str) -> str:
     prompt = f"""
     Eres un asistente profesional de RRHH. Responde con educación y empatía a este comentario negativo:
 
@@ -66,11 +646,11 @@ def generar_respuesta_educada(comentario: str) -> str:
     {comentario}
     """
     system = "Eres especialista en tratar temas delicados con educación y empatía en un departamento de atención al cliente."
-    return generar_respuesta_openai(system, prompt, temperature=0.5)
+    return await generar_respuesta_openai(system, prompt, temperature=0.5, operacion="respuesta")
 
 
 # Propone una mejora basada en el comentario del empleado
-def generar_sugerencia_para_comentario(comentario: str) -> str:
+async def generar_sugerencia_para_comentario(comentario: str) -> str:
     prompt = f"""
     Comentario del empleado:
     {comentario}
@@ -78,12 +658,12 @@ def generar_sugerencia_para_comentario(comentario: str) -> str:
     Propón una sugerencia útil que la empresa pueda aplicar. Devuelve solo una frase con la sugerencia.
     """
     system = "Eres un consultor experto en gestión de equipos y experiencia del empleado. Tu tarea es proponer una mejora concreta a partir del comentario."
-    return generar_respuesta_openai(system, prompt, temperature=0.7)
+    return await generar_respuesta_openai(system, prompt, temperature=0.7, operacion="sugerencia")
 
 
 # Detecta si el comentario tiene tono tóxico y explica por qué
-def analizar_toxicidad_comentario(comentario: str) -> dict:
-    prompt = f"""
+SYSTEM_TOXICIDAD = "Eres un experto en análisis de lenguaje y recursos humanos. Tu trabajo es detectar si un comentario es tóxico y explicar por qué."
+PROMPT_TOXICIDAD = """
     Comentario del empleado:
     \"{comentario}\"
 
@@ -92,21 +672,48 @@ def analizar_toxicidad_comentario(comentario: str) -> dict:
     - toxico: true o false
     - razon: una frase corta explicando por qué es tóxico o no
     """
-    system = "Eres un experto en análisis de lenguaje y recursos humanos. Tu trabajo es detectar si un comentario es tóxico y explicar por qué."
-    contenido = generar_respuesta_openai(system, prompt, temperature=0.3)
+VERSION_TOXICIDAD = version_prompt(SYSTEM_TOXICIDAD, PROMPT_TOXICIDAD, "0.3")
+
+
+# Comprueba que la respuesta de toxicidad es un objeto con "toxico" booleano y la normaliza.
+# Devuelve None si no es válida.
+def validar_toxicidad(resultado) -> Optional[dict]:
+    if not isinstance(resultado, dict) or not isinstance(resultado.get("toxico"), bool):
+        return None
+    razon = resultado.get("razon")
+    return {"toxico": resultado["toxico"], "razon": razon.strip() if isinstance(razon, str) else None}
+
+
+async def analizar_toxicidad_comentario(comentario: str) -> dict:
+    clave = calcular_clave("toxicidad", comentario, VERSION_TOXICIDAD, OPENAI_MODEL)
+    # Las entradas guardadas antes de validar las respuestas pueden no ser válidas: se ignoran
+    cacheado = validar_toxicidad(await cache_ia.obtener(clave))
+    if cacheado is not None:
+        return cacheado
+
+    prompt = PROMPT_TOXICIDAD.format(comentario=comentario)
+    contenido = await generar_respuesta_openai(SYSTEM_TOXICIDAD, prompt, temperature=0.3, operacion="toxicidad")
 
     try:
-        return json.loads(contenido)
+        resultado = validar_toxicidad(json.loads(contenido))
     except Exception:
+        resultado = None
+
+    # Las respuestas que no se pueden interpretar no se guardan en caché: la próxima vez se vuelve a preguntar
+    if resultado is None:
+        uso_ia.registrar_fallo_parseo("toxicidad")
         return {
             "toxico": None,
             "razon": f"No se pudo interpretar correctamente la respuesta: {contenido}"
         }
 
+    await cache_ia.guardar(clave, "toxicidad", VERSION_TOXICIDAD, OPENAI_MODEL, resultado)
+    return resultado
+
 
 # Clasifica la urgencia del comentario según su contenido
-def clasificar_nivel_urgencia(comentario: str) -> str:
-    prompt = f"""
+SYSTEM_URGENCIA = "Eres un experto en RRHH que evalúa la urgencia de comentarios internos."
+PROMPT_URGENCIA = """
     Clasifica este comentario de un empleado según su nivel de urgencia para que el equipo de RRHH actúe:
 
     Comentario: {comentario}
@@ -115,13 +722,29 @@ def clasificar_nivel_urgencia(comentario: str) -> str:
 
     Devuelve solo una palabra: urgente, normal o baja.
     """
-    system = "Eres un experto en RRHH que evalúa la urgencia de comentarios internos."
-    contenido = generar_respuesta_openai(system, prompt, temperature=0.3)
-    return contenido.strip().lower()
+VERSION_URGENCIA = version_prompt(SYSTEM_URGENCIA, PROMPT_URGENCIA, "0.3")
+
+
+# Devuelve None si el modelo no responde con una de las URGENCIAS_VALIDAS (no se guarda en caché).
+async def clasificar_nivel_urgencia(comentario: str) -> Optional[str]:
+    clave = calcular_clave("urgencia", comentario, VERSION_URGENCIA, OPENAI_MODEL)
+    cacheado = await cache_ia.obtener(clave)
+    if cacheado in URGENCIAS_VALIDAS:
+        return cacheado
+
+    prompt = PROMPT_URGENCIA.format(comentario=comentario)
+    contenido = await generar_respuesta_openai(SYSTEM_URGENCIA, prompt, temperature=0.3, operacion="urgencia")
+    urgencia = contenido.strip().lower().rstrip(".")
+    if urgencia not in URGENCIAS_VALIDAS:
+        uso_ia.registrar_fallo_parseo("urgencia")
+        return None
+
+    await cache_ia.guardar(clave, "urgencia", VERSION_URGENCIA, OPENAI_MODEL, urgencia)
+    return urgencia
 
 
 # Evalúa si ha habido un cambio de actitud en una serie de sentimientos
-def detectar_cambio_de_sentimiento(historial: list[str]) -> str:
+async def detectar_cambio_de_sentimiento(historial: list[str]) -> str:
     prompt = f"""
     Analiza esta secuencia de sentimientos expresados por un mismo empleado a lo largo del tiempo:
 
@@ -132,4 +755,4 @@ def detectar_cambio_de_sentimiento(historial: list[str]) -> str:
     Devuelve solo una frase clara y directa sobre si ha mejorado, empeorado o si su actitud es estable.
     """
     system = "Eres un experto en analizar patrones emocionales en comentarios de empleados."
-    return generar_respuesta_openai(system, prompt, temperature=0.4)
+    return await generar_respuesta_openai(system, prompt, temperature=0.4, operacion="cambio_sentimiento")
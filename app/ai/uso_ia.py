@@ -0,0 +1,130 @@
+"""
+Registro del uso de la IA por operación.
+
+Cada llamada a OpenAI se anota con el nombre de su operación (analisis, toxicidad, urgencia...),
+su latencia, los tokens de `response.usage` y si falló. Las funciones de openai_client anotan
+además las respuestas que no se pudieron interpretar, los reintentos, las peticiones duplicadas
+(y cuántas respondieron antes que la original) y las respuestas degradadas al análisis neutro
+porque la IA no estaba disponible. Se consulta en
+GET /metrics/ai_usage para ver qué prompts son lentos, cuáles gastan más tokens y cuáles fallan.
+Los contadores son del proceso y empiezan de cero en cada arranque.
+"""
+import bisect
+import threading
+
+# Límites superiores (ms) de las cubetas del histograma de latencia; la última cubeta no tiene límite
+CUBETAS_LATENCIA_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class EstadisticasOperacion:
+    """
+    Contadores e histograma de latencia de las llamadas de una operación.
+    """
+
+    def __init__(self):
+        self.llamadas = 0
+        self.errores = 0
+        self.fallos_parseo = 0
+        self.reintentos = 0
+        self.duplicadas = 0
+        self.duplicadas_ganadoras = 0
+        self.degradadas = 0
+        self.tokens_prompt = 0
+        self.tokens_completion = 0
+        self.latencia_total_ms = 0.0
+        self.latencia_maxima_ms = 0.0
+        self.cubetas = [0] * (len(CUBETAS_LATENCIA_MS) + 1)
+
+    def a_dict(self) -> dict:
+        tokens = self.tokens_prompt + self.tokens_completion
+        return {
+            "llamadas": self.llamadas,
+            "errores": self.errores,
+            "fallos_parseo": self.fallos_parseo,
+            "reintentos": self.reintentos,
+            "duplicadas": self.duplicadas,
+            "duplicadas_ganadoras": self.duplicadas_ganadoras,
+            "degradadas": self.degradadas,
+            "tokens_prompt": self.tokens_prompt,
+            "tokens_completion": self.tokens_completion,
+            "tokens_por_llamada": round(tokens / self.llamadas, 1) if self.llamadas else 0.0,
+            "latencia_media_ms": round(self.latencia_total_ms / self.llamadas, 1) if self.llamadas else 0.0,
+            "latencia_maxima_ms": round(self.latencia_maxima_ms, 1),
+            # Llamadas acumuladas por debajo de cada límite, como los histogramas de Prometheus
+            "histograma_latencia_ms": {
+                **{f"<={limite}": sum(self.cubetas[:i + 1]) for i, limite in enumerate(CUBETAS_LATENCIA_MS)},
+                "+inf": self.llamadas,
+            },
+        }
+
+
+class RegistroUsoIA:
+    """
+    Estadísticas de uso de la IA agrupadas por operación.
+    """
+
+    def __init__(self):
+        self._operaciones: dict[str, EstadisticasOperacion] = {}
+        self._lock = threading.Lock()
+
+    def _operacion(self, operacion: str) -> EstadisticasOperacion:
+        if operacion not in self._operaciones:
+            self._operaciones[operacion] = EstadisticasOperacion()
+        return self._operaciones[operacion]
+
+    def registrar_llamada(self, operacion: str, latencia_ms: float, usage=None, error: bool = False) -> None:
+        """
+        Anota una llamada terminada. `usage` es el `response.usage` de OpenAI (None si falló o no lo trae).
+        """
+        with self._lock:
+            estadisticas = self._operacion(operacion)
+            estadisticas.llamadas += 1
+            estadisticas.errores += int(error)
+            estadisticas.latencia_total_ms += latencia_ms
+            estadisticas.latencia_maxima_ms = max(estadisticas.latencia_maxima_ms, latencia_ms)
+            estadisticas.cubetas[bisect.bisect_left(CUBETAS_LATENCIA_MS, latencia_ms)] += 1
+            if usage is not None:
+                estadisticas.tokens_prompt += usage.prompt_tokens or 0
+                estadisticas.tokens_completion += usage.completion_tokens or 0
+
+    def registrar_fallo_parseo(self, operacion: str, cantidad: int = 1) -> None:
+        with self._lock:
+            self._operacion(operacion).fallos_parseo += cantidad
+
+    def registrar_reintentos(self, operacion: str, cantidad: int = 1) -> None:
+        with self._lock:
+            self._operacion(operacion).reintentos += cantidad
+
+    def registrar_duplicada(self, operacion: str, ganadora: bool = False) -> None:
+        """
+        Anota una petición duplicada lanzada porque la original tardaba; `ganadora` si respondió antes.
+        """
+        with self._lock:
+            estadisticas = self._operacion(operacion)
+            if ganadora:
+                estadisticas.duplicadas_ganadoras += 1
+            else:
+                estadisticas.duplicadas += 1
+
+    def registrar_degradada(self, operacion: str, cantidad: int = 1) -> None:
+        with self._lock:
+            self._operacion(operacion).degradadas += cantidad
+
+    def estado(self) -> dict:
+        with self._lock:
+            operaciones = {nombre: e.a_dict() for nombre, e in sorted(self._operaciones.items())}
+        totales = {
+            campo: sum(o[campo] for o in operaciones.values())
+            for campo in (
+                "llamadas", "errores", "fallos_parseo", "reintentos", "duplicadas", "duplicadas_ganadoras",
+                "degradadas", "tokens_prompt", "tokens_completion"
+            )
+        }
+        return {"operaciones": operaciones, "totales": totales}
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self._operaciones.clear()
+
+
+uso_ia = RegistroUsoIA()
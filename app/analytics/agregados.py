@@ -0,0 +1,205 @@
+"""
+Tablas de agregados que se mantienen de forma incremental.
+
+Cada función de feedback_service que crea, modifica o borra feedbacks toma una instantánea
+de los campos agregados antes y después del cambio y llama a `actualizar_agregados` antes del
+commit, en la misma transacción: los agregados restan lo que había y suman lo nuevo.
+La instantánea de antes se toma con la fila bloqueada (SELECT ... FOR UPDATE); si no, dos
+escrituras simultáneas sobre el mismo feedback restarían las dos el mismo estado anterior.
+La actualización incremental usa la AsyncSession del servicio (o una conexión síncrona en el
+importador); las reconstrucciones completas son síncronas porque se ejecutan desde las
+migraciones y desde la línea de comandos.
+Si alguna vez se desincronizan (por ejemplo, datos cargados a mano con SQL), se regeneran con
+
+    python -m app.analytics.reconstruir
+"""
+from collections import Counter
+from datetime import date
+from typing import Iterable, Optional
+from sqlalchemy import delete, func, insert, select, text, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.feedback import Feedback
+from app.models.conteo_terminos import ConteoTermino
+from app.models.resumen_diario import ResumenDiario
+from app.utils.texto import tokenizar
+
+# Filas leídas de cada vez al reconstruir
+TAMANO_BLOQUE_RECONSTRUCCION = 2000
+
+
+def instantanea(feedback: Feedback) -> dict:
+    """
+    Copia de los campos de un feedback de los que dependen los agregados.
+    """
+    return {
+        "dia": feedback.fecha.date() if feedback.fecha else None,  # sin fecha no cuenta en ningún día
+        "autor": feedback.autor,
+        "sentimiento": feedback.sentimiento or "",
+        "urgencia": feedback.urgencia or "",
+        "comentario": feedback.comentario or "",
+    }
+
+
+def _terminos(datos: dict) -> Counter:
+    if datos["dia"] is None:
+        return Counter()
+    return Counter((termino, datos["dia"], datos["sentimiento"]) for termino in tokenizar(datos["comentario"]))
+
+
+def _resumen(datos: dict) -> Counter:
+    if datos["dia"] is None:
+        return Counter()
+    clave = (datos["dia"], datos["autor"], datos["sentimiento"], datos["urgencia"])
+    return Counter({(clave, "cantidad"): 1, (clave, "longitud_total"): len(datos["comentario"])})
+
+
+def _sentencias_suma(dialecto: str, modelo, columnas_clave: tuple[str, ...], deltas: dict) -> list[tuple]:
+    """
+    Sentencias que suman `deltas` ({clave: {columna: incremento}}) a las filas de `modelo`, creándolas
+    si no existen (INSERT ... ON CONFLICT DO UPDATE), y borran las que se quedan a cero.
+    Devuelve una lista de (sentencia, parámetros).
+    """
+    if not deltas:
+        return []
+
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insertar_o_sumar
+    else:
+        from sqlalchemy.dialects.sqlite import insert as insertar_o_sumar
+
+    # Siempre en el mismo orden, para que dos transacciones que tocan las mismas filas no se bloqueen mutuamente
+    filas = [dict(zip(columnas_clave, clave), **incrementos) for clave, incrementos in sorted(deltas.items())]
+    columnas_suma = [c for c in filas[0] if c not in columnas_clave]
+    sentencia = insertar_o_sumar(modelo)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=list(columnas_clave),
+        set_={c: getattr(modelo, c) + getattr(sentencia.excluded, c) for c in columnas_suma}
+    )
+    sentencias = [(sentencia, filas)]
+
+    restadas = [clave for clave, incrementos in deltas.items() if any(v < 0 for v in incrementos.values())]
+    if restadas:
+        columnas = tuple_(*(getattr(modelo, c) for c in columnas_clave))
+        sentencias.append((
+            delete(modelo)
+            .where(columnas.in_(restadas), getattr(modelo, columnas_suma[0]) <= 0)
+            .execution_options(synchronize_session=False),
+            None
+        ))
+    return sentencias
+
+
+def sentencias_agregados(dialecto: str, antes: Iterable[dict] = (), despues: Iterable[dict] = ()) -> list[tuple]:
+    """
+    Sentencias (sentencia, parámetros) que restan de los agregados las instantáneas `antes`
+    y suman las `despues`. Para un feedback nuevo solo hay `despues`; para uno borrado, solo `antes`.
+    """
+    terminos = Counter()
+    resumen = Counter()
+    for datos in antes:
+        terminos.subtract(_terminos(datos))
+        resumen.subtract(_resumen(datos))
+    for datos in despues:
+        terminos.update(_terminos(datos))
+        resumen.update(_resumen(datos))
+
+    deltas_resumen: dict = {}
+    for (clave, columna), incremento in resumen.items():
+        deltas_resumen.setdefault(clave, {"cantidad": 0, "longitud_total": 0})[columna] = incremento
+
+    return _sentencias_suma(
+        dialecto, ConteoTermino, ("termino", "dia", "sentimiento"),
+        {clave: {"cantidad": cantidad} for clave, cantidad in terminos.items() if cantidad}
+    ) + _sentencias_suma(
+        dialecto, ResumenDiario, ("dia", "autor", "sentimiento", "urgencia"),
+        {clave: incrementos for clave, incrementos in deltas_resumen.items() if any(incrementos.values())}
+    )
+
+
+async def actualizar_agregados(db: AsyncSession, antes: Iterable[dict] = (), despues: Iterable[dict] = ()) -> None:
+    """
+    Aplica en la sesión del servicio las sentencias de `sentencias_agregados`. No hace commit.
+    """
+    for sentencia, parametros in sentencias_agregados(db.get_bind().dialect.name, antes, despues):
+        await db.execute(sentencia, parametros)
+
+
+def actualizar_agregados_sincrono(conexion: Connection, antes: Iterable[dict] = (), despues: Iterable[dict] = ()) -> None:
+    """
+    Igual que `actualizar_agregados` sobre una conexión síncrona (importación con COPY). No hace commit.
+    """
+    for sentencia, parametros in sentencias_agregados(conexion.dialect.name, antes, despues):
+        conexion.execute(sentencia, parametros)
+
+
+def reconstruir_conteo_terminos(db: Session) -> int:
+    """
+    Vacía term_counts y lo vuelve a calcular a partir de todos los feedbacks. No hace commit.
+    Recorre los feedbacks por fecha y escribe cada día en cuanto termina, así que en memoria
+    solo están los términos de un día. Devuelve el número de filas escritas.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Las escrituras concurrentes esperan a que termine para no contar dos veces sus cambios
+        db.execute(text("LOCK TABLE term_counts IN EXCLUSIVE MODE"))
+    db.execute(delete(ConteoTermino))
+
+    filas_escritas = 0
+    dia_actual: Optional[date] = None
+    conteo = Counter()
+
+    def escribir():
+        nonlocal filas_escritas
+        if conteo:
+            db.execute(
+                ConteoTermino.__table__.insert(),
+                [{"termino": t, "dia": d, "sentimiento": s, "cantidad": c} for (t, d, s), c in conteo.items()]
+            )
+            filas_escritas += len(conteo)
+            conteo.clear()
+
+    feedbacks = (
+        db.query(Feedback.fecha, Feedback.autor, Feedback.sentimiento, Feedback.urgencia, Feedback.comentario)
+        .filter(Feedback.fecha.isnot(None))
+        .order_by(Feedback.fecha)
+        .yield_per(TAMANO_BLOQUE_RECONSTRUCCION)
+    )
+    for fila in feedbacks:
+        datos = instantanea(fila)
+        if datos["dia"] != dia_actual:
+            escribir()
+            dia_actual = datos["dia"]
+        conteo.update(_terminos(datos))
+    escribir()
+
+    return filas_escritas
+
+
+def reconstruir_resumen_diario(db: Session) -> int:
+    """
+    Vacía feedback_daily_rollup y lo vuelve a calcular con un único INSERT ... SELECT ... GROUP BY.
+    No hace commit. Devuelve el número de filas escritas.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE feedback_daily_rollup IN EXCLUSIVE MODE"))
+    db.execute(delete(ResumenDiario))
+
+    dia = func.date(Feedback.fecha)
+    sentimiento = func.coalesce(Feedback.sentimiento, "")
+    urgencia = func.coalesce(Feedback.urgencia, "")
+    agrupado = (
+        select(
+            dia, Feedback.autor, sentimiento, urgencia,
+            func.count(Feedback.id), func.coalesce(func.sum(func.length(Feedback.comentario)), 0)
+        )
+        .where(Feedback.fecha.isnot(None))
+        .group_by(dia, Feedback.autor, sentimiento, urgencia)
+    )
+    resultado = db.execute(
+        insert(ResumenDiario).from_select(
+            ["dia", "autor", "sentimiento", "urgencia", "cantidad", "longitud_total"], agrupado
+        )
+    )
+    return resultado.rowcount
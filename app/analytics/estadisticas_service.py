@@ -1,52 +1,231 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, cast, Date, select
+from typing import List, Optional
+from datetime import datetime, date, time
 from app.models.feedback import Feedback
-from app.db.session import SessionLocal
-import pandas
-from app.utils.utils import model_to_dict_feedback
+from app.models.resumen_diario import ResumenDiario
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+TIPOS_SENTIMIENTO = ['positivo', 'neutro', 'negativo']
+GRANULARIDADES = ('day', 'week', 'month')
 
+# Las funciones de recuento leen de feedback_daily_rollup (un registro por día, autor,
+# sentimiento y urgencia), así que su coste depende del número de días, no del de feedbacks.
 
-def calcular_resumen_sentimientos(db: Session):
-    # import pdb; pdb.set_trace()
 
-    # Convertimos los registros de feedback a un DataFrame de pandas
-    feedbacks_df = pandas.DataFrame(
-        model_to_dict_feedback(db.query(Feedback).all())
+def _filtrar_resumen(query, desde: Optional[date] = None, hasta: Optional[date] = None, autor: Optional[str] = None):
+    if desde:
+        query = query.filter(ResumenDiario.dia >= desde)
+    if hasta:
+        query = query.filter(ResumenDiario.dia <= hasta)
+    if autor:
+        query = query.filter(ResumenDiario.autor == autor)
+    return query
+
+
+def expresion_periodo(db: AsyncSession, granularidad: str):
+    """
+    Expresión SQL con el primer día del periodo (día, semana empezando en lunes o mes) de cada fila del resumen.
+    """
+    if granularidad == 'day':
+        return ResumenDiario.dia
+    if db.get_bind().dialect.name == 'postgresql':
+        return cast(func.date_trunc(granularidad, ResumenDiario.dia), Date)
+    # SQLite (tests y benchmarks locales)
+    if granularidad == 'week':
+        return func.date(ResumenDiario.dia, 'weekday 0', '-6 days')
+    return func.date(ResumenDiario.dia, 'start of month')
+
+
+def _como_fecha(valor) -> date:
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+async def contar_por_sentimiento(
+    db: AsyncSession,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    autor: Optional[str] = None
+) -> dict:
+    """
+    Devuelve {sentimiento: cantidad}. Los feedbacks pendientes de análisis aparecen con la clave None.
+    """
+    query = select(ResumenDiario.sentimiento, func.sum(ResumenDiario.cantidad)).group_by(ResumenDiario.sentimiento)
+    filas = await db.execute(_filtrar_resumen(query, desde, hasta, autor))
+    return {sentimiento or None: int(cantidad) for sentimiento, cantidad in filas}
+
+
+async def contar_por_sentimiento_y_periodo(
+    db: AsyncSession,
+    granularidad: str,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    autor: Optional[str] = None
+) -> List[dict]:
+    """
+    Devuelve, para cada periodo con feedbacks, la cantidad por sentimiento y el total, en orden cronológico.
+    """
+    periodo = expresion_periodo(db, granularidad)
+    query = (
+        select(periodo, ResumenDiario.sentimiento, func.sum(ResumenDiario.cantidad))
+        .group_by(periodo, ResumenDiario.sentimiento)
+        .order_by(periodo)
     )
 
-    # Contamos cuántos hay por cada tipo de sentimiento
-    conteo_por_sentimiento = feedbacks_df.value_counts('sentimiento')
+    periodos: dict = {}
+    for inicio, sentimiento, cantidad in await db.execute(_filtrar_resumen(query, desde, hasta, autor)):
+        fila = periodos.setdefault(_como_fecha(inicio), {"periodo": _como_fecha(inicio), "total": 0})
+        fila[sentimiento or None] = int(cantidad)
+        fila["total"] += int(cantidad)
+    return list(periodos.values())
+
+
+async def ranking_autores(
+    db: AsyncSession,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    limite: Optional[int] = None
+) -> List[tuple[str, int]]:
+    """
+    Devuelve (autor, cantidad de feedbacks) de mayor a menor.
+    """
+    total = func.sum(ResumenDiario.cantidad)
+    query = _filtrar_resumen(select(ResumenDiario.autor, total), desde, hasta)
+    query = query.group_by(ResumenDiario.autor).order_by(total.desc(), ResumenDiario.autor)
+    if limite:
+        query = query.limit(limite)
+    return [(autor, int(cantidad)) for autor, cantidad in await db.execute(query)]
+
+
+async def contar_por_periodo(
+    db: AsyncSession,
+    granularidad: str = 'day',
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    autor: Optional[str] = None
+) -> List[dict]:
+    """
+    Devuelve cuántos feedbacks hay en cada periodo y la longitud media de sus comentarios, en orden cronológico.
+    """
+    periodo = expresion_periodo(db, granularidad)
+    query = select(periodo, func.sum(ResumenDiario.cantidad), func.sum(ResumenDiario.longitud_total))
+    query = _filtrar_resumen(query, desde, hasta, autor).group_by(periodo).order_by(periodo)
+
+    return [
+        {
+            "fecha": _como_fecha(inicio),
+            "cantidad": int(cantidad),
+            "longitud_media": round(longitud / cantidad, 1) if cantidad else 0.0,
+        }
+        for inicio, cantidad, longitud in await db.execute(query)
+    ]
+
+
+def _filtrar_feedback(query, desde: Optional[date] = None, hasta: Optional[date] = None, sentimiento: Optional[str] = None):
+    if desde:
+        query = query.filter(Feedback.fecha >= datetime.combine(desde, time.min))
+    if hasta:
+        query = query.filter(Feedback.fecha <= datetime.combine(hasta, time.max))
+    if sentimiento:
+        query = query.filter(Feedback.sentimiento == sentimiento)
+    return query
 
-    # Calculamos el porcentaje de cada sentimiento respecto al total
-    porcentaje_por_sentimiento = (
-        (conteo_por_sentimiento / conteo_por_sentimiento.sum()) * 100
-    ).round(2).to_dict()
+
+async def feedbacks_extremos(
+    db: AsyncSession,
+    k: int = 1,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sentimiento: Optional[str] = None
+) -> dict:
+    """
+    Devuelve los `k` feedbacks con el comentario más corto y los `k` con el más largo.
+    Cada lista es un ORDER BY length(comentario) LIMIT k que recorre el índice
+    ix_feedback_longitud_comentario desde un extremo, sin leer el resto de la tabla.
+    """
+    longitud = func.length(Feedback.comentario)
+    query = _filtrar_feedback(
+        select(Feedback.id, Feedback.autor, Feedback.comentario, Feedback.fecha, longitud.label("longitud")),
+        desde, hasta, sentimiento
+    )
+
+    async def extremo(orden) -> List[dict]:
+        return [fila._asdict() for fila in await db.execute(query.order_by(orden, Feedback.id).limit(k))]
+
+    return {"mas_cortos": await extremo(longitud.asc()), "mas_largos": await extremo(longitud.desc())}
+
+
+async def histograma_longitud(
+    db: AsyncSession,
+    cubetas: int = 10,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sentimiento: Optional[str] = None
+) -> List[dict]:
+    """
+    Reparte los comentarios en `cubetas` grupos del mismo tamaño ordenados por longitud (deciles con 10)
+    y devuelve la longitud mínima, máxima y media y la cantidad de cada uno.
+    """
+    longitud = func.length(Feedback.comentario)
+    ordenados = _filtrar_feedback(
+        select(longitud.label("longitud"), func.ntile(cubetas).over(order_by=longitud).label("cubeta")),
+        desde, hasta, sentimiento
+    ).subquery()
+
+    filas = await db.execute(
+        select(
+            ordenados.c.cubeta,
+            func.min(ordenados.c.longitud),
+            func.max(ordenados.c.longitud),
+            func.avg(ordenados.c.longitud),
+            func.count(),
+        )
+        .group_by(ordenados.c.cubeta)
+        .order_by(ordenados.c.cubeta)
+    )
+
+    return [
+        {
+            "percentil_desde": round((cubeta - 1) * 100 / cubetas, 2),
+            "percentil_hasta": round(cubeta * 100 / cubetas, 2),
+            "longitud_min": minimo,
+            "longitud_max": maximo,
+            "longitud_media": round(float(media), 1),
+            "cantidad": cantidad,
+        }
+        for cubeta, minimo, maximo, media, cantidad in filas
+    ]
+
+
+async def calcular_resumen_sentimientos(
+    db: AsyncSession,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    autor: Optional[str] = None
+):
+    """
+    Cuenta los feedbacks por sentimiento y calcula el porcentaje de cada uno.
+    """
+    conteo_por_sentimiento = await contar_por_sentimiento(db, desde, hasta, autor)
+
+    # Los feedbacks pendientes de análisis (sentimiento NULL) cuentan en el total pero no en los porcentajes
+    total_feedbacks = sum(conteo_por_sentimiento.values())
+    total_con_sentimiento = total_feedbacks - conteo_por_sentimiento.get(None, 0)
 
     # Creamos un resumen estructurado por tipo de sentimiento
     resumen_sentimientos = {}
-    tipos_sentimiento = ['positivo', 'neutro', 'negativo']
-    for tipo in tipos_sentimiento:
+    for tipo in TIPOS_SENTIMIENTO:
+        cantidad = conteo_por_sentimiento.get(tipo, 0)
         resumen_sentimientos[tipo] = {
-            "cantidad": int(conteo_por_sentimiento.get(tipo, 0)),
-            "porcentaje": float(porcentaje_por_sentimiento.get(tipo, 0))
+            "cantidad": cantidad,
+            "porcentaje": round(cantidad / total_con_sentimiento * 100, 2) if total_con_sentimiento else 0.0
         }
 
     # Construimos el diccionario final con el total de feedbacks y el resumen
     resumen_final = {
-        "total_feedbacks": len(feedbacks_df),
+        "total_feedbacks": total_feedbacks,
         "resumen_por_sentimiento": resumen_sentimientos
     }
 
     return resumen_final
-
-
@@ -0,0 +1,39 @@
+"""
+Regenera desde cero las tablas de agregados a partir de la tabla feedback.
+
+    python -m app.analytics.reconstruir               # todas
+    python -m app.analytics.reconstruir term_counts   # solo una
+
+Cada tabla se reconstruye en su propia transacción; mientras tanto, las escrituras de
+feedbacks que tengan que actualizarla esperan a que termine.
+"""
+import time
+import argparse
+
+from app.db.session import SessionLocal
+from app.analytics.agregados import reconstruir_conteo_terminos, reconstruir_resumen_diario
+
+RECONSTRUCCIONES = {
+    "term_counts": reconstruir_conteo_terminos,
+    "feedback_daily_rollup": reconstruir_resumen_diario,
+}
+
+
+def reconstruir(tablas: list[str]) -> None:
+    for tabla in tablas:
+        inicio = time.perf_counter()
+        db = SessionLocal()
+        try:
+            filas = RECONSTRUCCIONES[tabla](db)
+            db.commit()
+        finally:
+            db.close()
+        print(f"✅ {tabla}: {filas} filas en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenera las tablas de agregados de métricas")
+    parser.add_argument("tablas", nargs="*", choices=sorted(RECONSTRUCCIONES), default=sorted(RECONSTRUCCIONES))
+    args = parser.parse_args()
+
+    reconstruir(args.tablas)
@@ -1,26 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.models.user import User
 from app.utils.dependencies import get_current_user  
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.schemas.user import UserCreate, UserLogin, UserOut
-from app.db.session import SessionLocal
-from app.services.auth_service import create_user, authenticate_user
+from app.services.auth_service import create_user, authenticate_user, UsuarioAutenticado
 from app.utils.security import create_access_token
 
 
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        
 @router.get("/me")
-def read_current_user(user: User = Depends(get_current_user)):
+def read_current_user(user: UsuarioAutenticado = Depends(get_current_user)):
     return {
         "id": user.id,
         "email": user.email,
@@ -29,20 +20,21 @@ def read_current_user(user: User = Depends(get_current_user)):
 
 
 @router.post("/register", response_model=UserOut)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
 
-    user = create_user(db, user)
+    user = await create_user(db, user)
 
     return user
 
 
 @router.post("/login")
-async def login_user(user: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user.email, user.password)
+async def login_user(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await authenticate_user(db, user.email, user.password)
 
     if not user:
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
 
-    token = create_access_token({"sub": user.email})
+    # "uid" y "role" permiten autenticar sin consultar la base de datos con AUTH_CONFIAR_EN_TOKEN=true
+    token = create_access_token({"sub": user.email, "uid": user.id, "role": user.role})
 
     return {"access_token": token, "token_type": "bearer"}
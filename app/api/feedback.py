@@ -1,50 +1,114 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import io
+import os
+import math
+import time
+import asyncio
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, date
 
-from app.models.user import User
-from app.utils.dependencies import get_current_user
-from app.schemas.feedback import FeedbackIn, FeedbackOut, FeedbackDB, FeedbackUpdate
+from app.utils.dependencies import get_current_user, get_current_admin
+from app.services.auth_service import UsuarioAutenticado
+from app.schemas.feedback import (
+    FeedbackIn, FeedbackOut, FeedbackDB, FeedbackUpdate, FeedbackBulkOut, EstadoAnalisisOut, FeedbackPagina
+)
 from app.services.feedback_service import (
     guardar_feedback,
+    guardar_feedback_pendiente,
+    guardar_feedbacks_en_lote,
     obtener_todos_los_feedbacks,
     buscar_feedback_por_id,
     generar_respuesta_para_feedback,
+    enriquecer_feedback_existente,
     generar_sugerencia_para_feedback,
     detectar_feedback_toxico,
     clasificar_urgencia_feedback,
     detectar_cambios_sentimiento,
     actualizar_feedback_parcial,
     eliminar_feedback,
-    filtrar_feedbacks
+    filtrar_feedbacks,
+    contar_feedbacks_por_estado,
+    iterar_feedbacks,
+    validar_campos,
+    LIMITE_PAGINA_POR_DEFECTO,
+    LIMITE_PAGINA_MAXIMO
+)
+from app.ai.openai_client import enriquecer_feedback_completo, IANoDisponible, RespuestaIAInvalida
+from app.ai.enrutador import analizar_feedback_enrutado, analizar_feedbacks_enrutados_en_lote
+from app.db.session import SessionLocal, get_db
+from app.utils.exportacion import filas_a_ndjson, filas_a_csv, agrupar_en_trozos, comprimir_gzip
+from app.worker import avisar_trabajadores, ENRIQUECIMIENTO_COMPLETO
+from app.importer import importar_fichero, IMPORTACION_TAMANO_LOTE
+from app.backfill import (
+    CAMPOS_BACKFILL,
+    BACKFILL_TAMANO_BLOQUE,
+    BACKFILL_PETICIONES_POR_SEGUNDO,
+    progresos,
+    backfill_en_curso,
+    iniciar_backfill,
+    detener_backfill,
+    obtener_checkpoint
 )
-from app.ai.openai_client import analizar_feedback_con_ia
-from app.db.session import SessionLocal
 
 router = APIRouter()
 
+# Si es true, POST /feedback/ guarda el feedback sin esperar a la IA salvo que se indique diferido=false
+ANALISIS_DIFERIDO_POR_DEFECTO = os.getenv("ANALISIS_DIFERIDO_POR_DEFECTO", "false").lower() == "true"
 
-# --- Dependencia para sesión de base de datos ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+def _ia_no_disponible(error: IANoDisponible) -> HTTPException:
+    """
+    Respuesta 503 cuando OpenAI no responde o su circuito está abierto, con Retry-After en segundos.
+    """
+    print("IA NO DISPONIBLE:", str(error))
+    return HTTPException(
+        status_code=503,
+        detail="El servicio de IA no está disponible en este momento",
+        headers={"Retry-After": str(max(1, math.ceil(error.reintentar_en)))}
+    )
 
 
 # --- CRUD BÁSICO ---
 
 @router.post("/", response_model=FeedbackDB)
-async def crear_feedback(feedback: FeedbackIn, db: Session = Depends(get_db)):
+async def crear_feedback(
+    feedback: FeedbackIn,
+    response: Response,
+    diferido: bool = Query(default=ANALISIS_DIFERIDO_POR_DEFECTO, description="Guardar sin esperar al análisis IA"),
+    completo: bool = Query(default=ENRIQUECIMIENTO_COMPLETO, description="Incluir toxicidad, urgencia, sugerencia y respuesta"),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Crea un nuevo feedback y ejecuta análisis IA (sentimiento, etiquetas, resumen).
+    Los comentarios claros los resuelve el clasificador local; el resto se escala a la IA.
+    Con completo=true se obtienen además toxicidad, urgencia, sugerencia y respuesta en la misma llamada.
+    Con diferido=true se guarda al momento con estado_analisis="pendiente" (respuesta 202)
+    y el análisis lo completan los trabajadores en segundo plano.
     """
-    analisis = await analizar_feedback_con_ia(feedback.comentario)
     fecha_final = feedback.fecha or datetime.now()
 
-    nuevo_feedback = guardar_feedback(
+    if diferido:
+        nuevo_feedback = await guardar_feedback_pendiente(db, feedback.autor, feedback.comentario, fecha_final)
+        avisar_trabajadores()
+        response.status_code = 202
+        return nuevo_feedback
+
+    try:
+        if completo:
+            analisis = await enriquecer_feedback_completo(feedback.comentario)
+        else:
+            analisis = await analizar_feedback_enrutado(feedback.comentario)
+    except IANoDisponible as e:
+        raise _ia_no_disponible(e)
+    except RespuestaIAInvalida as e:
+        # Solo con IA_DEGRADAR=false; si no, la respuesta no válida se sustituye por el análisis neutro
+        print("RESPUESTA IA NO VÁLIDA:", str(e))
+        raise HTTPException(status_code=502, detail="La IA ha devuelto una respuesta no válida")
+
+    nuevo_feedback = await guardar_feedback(
         db=db,
         autor=feedback.autor,
         comentario=feedback.comentario,
@@ -52,36 +116,243 @@ async def crear_feedback(feedback: FeedbackIn, db: Session = Depends(get_db)):
         sentimiento=analisis["sentimiento"],
         etiquetas=analisis["etiquetas"],
         resumen=analisis["resumen"],
+        toxico=analisis.get("toxico"),
+        razon_toxicidad=analisis.get("razon_toxicidad"),
+        urgencia=analisis.get("urgencia"),
+        sugerencia=analisis.get("sugerencia"),
+        respuesta=analisis.get("respuesta"),
+        nivel_analisis=analisis.get("nivel_analisis", "ia"),
+        confianza_local=analisis.get("confianza_local"),
+        latencia_analisis_ms=analisis.get("latencia_analisis_ms"),
     )
     return nuevo_feedback
 
 
-@router.get("/", response_model=List[FeedbackDB])
-def listar_feedbacks(db: Session = Depends(get_db)):
+@router.post("/bulk", response_model=FeedbackBulkOut)
+async def crear_feedbacks_en_lote(feedbacks: List[FeedbackIn], db: AsyncSession = Depends(get_db)):
+    """
+    Crea muchos feedbacks de una vez (p. ej. exportaciones de encuestas).
+    Los comentarios claros los resuelve el clasificador local; el resto se analiza
+    agrupado en pocas peticiones a la IA. Todas las filas
+    se guardan en una única transacción. Devuelve el rendimiento obtenido.
+    Los comentarios que la IA no ha podido analizar se guardan pendientes (`ids_pendientes`)
+    y los analizan los trabajadores de enriquecimiento.
+    """
+    if not feedbacks:
+        raise HTTPException(status_code=400, detail="La lista de feedbacks está vacía")
+
+    inicio = time.perf_counter()
+    try:
+        analisis = await analizar_feedbacks_enrutados_en_lote([fb.comentario for fb in feedbacks])
+    except IANoDisponible as e:
+        raise _ia_no_disponible(e)
+    fecha_actual = datetime.now()
+
+    # Sin resultado: la fila se guarda sin sentimiento y queda pendiente de análisis
+    filas = [
+        {"autor": fb.autor, "comentario": fb.comentario, "fecha": fb.fecha or fecha_actual, **(resultado or {})}
+        for fb, resultado in zip(feedbacks, analisis["resultados"])
+    ]
+    ids = await guardar_feedbacks_en_lote(db, filas)
+    duracion = time.perf_counter() - inicio
+
+    return {
+        "creados": len(ids),
+        "ids": ids,
+        "ids_pendientes": [feedback_id for feedback_id, resultado in zip(ids, analisis["resultados"]) if resultado is None],
+        "duracion_segundos": round(duracion, 3),
+        "filas_por_segundo": round(len(ids) / duracion, 2) if duracion else 0.0,
+        "tokens_totales": analisis["tokens_totales"],
+        "tokens_por_fila": round(analisis["tokens_totales"] / len(ids), 2),
+        "llamadas_ia": analisis["llamadas"],
+        "reintentos": analisis["reintentos"],
+        "fallidos": analisis["fallidos"],
+        "desde_cache": analisis["desde_cache"],
+        "resueltos_localmente": analisis["resueltos_localmente"],
+    }
+
+
+def _separar_campos(fields: Optional[str]) -> Optional[list[str]]:
+    if not fields:
+        return None
+    return [c.strip() for c in fields.split(",") if c.strip()]
+
+
+@router.get("/", response_model=FeedbackPagina, response_model_exclude_unset=True)
+async def listar_feedbacks(
+    limit: int = Query(default=LIMITE_PAGINA_POR_DEFECTO, ge=1, le=LIMITE_PAGINA_MAXIMO, description="Feedbacks por página"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor de la página anterior"),
+    fields: Optional[str] = Query(default=None, description="Campos a devolver separados por comas, p. ej. id,autor,sentimiento"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Lista los feedbacks ordenados por fecha descendente, por páginas.
+    Para pedir la siguiente página se pasa el next_cursor de la respuesta; es None en la última.
+    """
+    try:
+        items, siguiente = await obtener_todos_los_feedbacks(db, limit, cursor, _separar_campos(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": siguiente}
+
+
+# --- FILTRADO AVANZADO ---
+# Debe declararse antes de /{feedback_id} para que "filtrados" no se interprete como un id
+
+@router.get("/filtrados", response_model=FeedbackPagina, response_model_exclude_unset=True)
+async def filtrar_feedbacks_endpoint(
+    autor: Optional[str] = Query(default=None, description="Filtrar por autor"),
+    desde: Optional[date] = Query(default=None, description="Fecha mínima YYYY-MM-DD"),
+    hasta: Optional[date] = Query(default=None, description="Fecha máxima YYYY-MM-DD"),
+    sentimiento: Optional[str] = Query(default=None, description="positivo, negativo o neutro"),
+    urgencia: Optional[str] = Query(default=None, description="urgente, normal o baja"),
+    tag: Optional[str] = Query(default=None, description="Filtrar por etiqueta"),
+    limit: int = Query(default=LIMITE_PAGINA_POR_DEFECTO, ge=1, le=LIMITE_PAGINA_MAXIMO, description="Feedbacks por página"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor de la página anterior"),
+    fields: Optional[str] = Query(default=None, description="Campos a devolver separados por comas"),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Lista todos los feedbacks ordenados por fecha descendente.
+    Devuelve feedbacks filtrados por autor, rango de fechas, sentimiento, urgencia y/o etiqueta, por páginas.
     """
-    return obtener_todos_los_feedbacks(db)
+    try:
+        items, siguiente = await filtrar_feedbacks(
+            db, autor, desde, hasta, sentimiento, urgencia, tag,
+            limite=limit, cursor=cursor, campos=_separar_campos(fields)
+        )
+        return {"items": items, "next_cursor": siguiente}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print("ERROR AL FILTRAR:", str(e))
+        raise HTTPException(status_code=500, detail="Error al filtrar feedbacks")
+
+
+# --- EXPORTACIÓN ---
+
+TIPOS_EXPORTACION = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _generar_exportacion(formato: str, campos: list[str], comprimir: bool, filtros: dict):
+    # El generador abre su propia sesión: la de get_db se cierra antes de que empiece el streaming.
+    # Es síncrono (cursor del servidor de psycopg2) y Starlette lo recorre en un hilo del threadpool.
+    db = SessionLocal()
+    try:
+        filas = iterar_feedbacks(db, campos=campos, **filtros)
+        lineas = filas_a_ndjson(filas) if formato == "ndjson" else filas_a_csv(filas, campos)
+        trozos = agrupar_en_trozos(lineas)
+        yield from comprimir_gzip(trozos) if comprimir else trozos
+    finally:
+        db.close()
+
+
+@router.get("/export")
+def exportar_feedbacks(
+    formato: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson o csv"),
+    autor: Optional[str] = Query(default=None, description="Filtrar por autor"),
+    desde: Optional[date] = Query(default=None, description="Fecha mínima YYYY-MM-DD"),
+    hasta: Optional[date] = Query(default=None, description="Fecha máxima YYYY-MM-DD"),
+    sentimiento: Optional[str] = Query(default=None, description="positivo, negativo o neutro"),
+    urgencia: Optional[str] = Query(default=None, description="urgente, normal o baja"),
+    tag: Optional[str] = Query(default=None, description="Filtrar por etiqueta"),
+    fields: Optional[str] = Query(default=None, description="Campos a exportar separados por comas"),
+    gzip: bool = Query(default=False, description="Comprimir la respuesta con gzip"),
+):
+    """
+    Exporta todos los feedbacks que cumplen los filtros en NDJSON o CSV.
+    Las filas se leen por bloques y se envían según se leen, así que la memoria no depende
+    del número de filas exportadas.
+    """
+    try:
+        campos = validar_campos(_separar_campos(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filtros = {"autor": autor, "desde": desde, "hasta": hasta, "sentimiento": sentimiento, "urgencia": urgencia, "tag": tag}
+    cabeceras = {"Content-Disposition": f'attachment; filename="feedbacks.{formato}"'}
+    if gzip:
+        cabeceras["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        _generar_exportacion(formato, campos, gzip, filtros),
+        media_type=TIPOS_EXPORTACION[formato],
+        headers=cabeceras
+    )
+
+
+# --- IMPORTACIÓN ---
+
+@router.post("/importar")
+async def importar_feedbacks(
+    request: Request,
+    formato: str = Query(default="csv", alias="format", pattern="^(csv|jsonl)$", description="csv o jsonl"),
+    lote: int = Query(default=IMPORTACION_TAMANO_LOTE, ge=1, le=500_000, description="Filas por COPY"),
+    admin: UsuarioAutenticado = Depends(get_current_admin)
+):
+    """
+    Importa feedbacks históricos desde el cuerpo de la petición (CSV con cabecera o JSONL)
+    con COPY, por lotes. Solo para administradores. Las filas sin sentimiento quedan pendientes
+    de análisis para los trabajadores de enriquecimiento. Devuelve las filas importadas y por segundo.
+    """
+    # El cuerpo se guarda según llega en un fichero temporal (en memoria hasta 64 MB) y se importa
+    # en un hilo, porque COPY usa la conexión síncrona de psycopg2
+    with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as cuerpo:
+        async for trozo in request.stream():
+            cuerpo.write(trozo)
+        cuerpo.seek(0)
+        texto = io.TextIOWrapper(cuerpo, encoding="utf-8-sig", newline="")
+        try:
+            informe = await asyncio.to_thread(importar_fichero, texto, formato, lote)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            print("ERROR AL IMPORTAR:", str(e))
+            raise HTTPException(status_code=500, detail="Error al importar los feedbacks")
+        finally:
+            texto.detach()
+
+    if informe["pendientes_analisis"]:
+        avisar_trabajadores()
+    return informe
+
+
+@router.get("/estado_analisis")
+async def resumen_estado_analisis(db: AsyncSession = Depends(get_db)):
+    """
+    Cuenta cuántos feedbacks hay pendientes, procesando, completados o con error de análisis.
+    """
+    return await contar_feedbacks_por_estado(db)
+
+
+@router.get("/{feedback_id}/estado", response_model=EstadoAnalisisOut)
+async def obtener_estado_analisis(feedback_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Devuelve el estado del análisis IA de un feedback (pendiente, procesando, completado o error).
+    """
+    feedback = await buscar_feedback_por_id(feedback_id, db)
+    if not feedback:
+        raise HTTPException(status_code=404, detail="Feedback no encontrado")
+    return feedback
 
 
 @router.get("/{feedback_id}", response_model=FeedbackDB)
-def obtener_feedback(feedback_id: int, db: Session = Depends(get_db)):
+async def obtener_feedback(feedback_id: int, db: AsyncSession = Depends(get_db)):
     """
     Obtiene un feedback por su ID.
     """
-    feedback = buscar_feedback_por_id(feedback_id, db)
+    feedback = await buscar_feedback_por_id(feedback_id, db)
     if not feedback:
         raise HTTPException(status_code=404, detail="Feedback no encontrado")
     return feedback
 
 
 @router.patch("/{feedback_id}", response_model=FeedbackDB)
-def feedback_actualizado(feedback_id: int, datos: FeedbackUpdate):
+async def feedback_actualizado(feedback_id: int, datos: FeedbackUpdate, db: AsyncSession = Depends(get_db)):
     """
     Actualiza parcialmente un feedback existente (PATCH).
     """
     try:
-        feedback_actualizado = actualizar_feedback_parcial(feedback_id, datos.dict(exclude_unset=True))
+        feedback_actualizado = await actualizar_feedback_parcial(db, feedback_id, datos.dict(exclude_unset=True))
         return feedback_actualizado
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -91,12 +362,12 @@ def feedback_actualizado(feedback_id: int, datos: FeedbackUpdate):
 
 
 @router.delete("/{feedback_id}")
-def eliminar_feedback_endpoint(feedback_id: int):
+async def eliminar_feedback_endpoint(feedback_id: int, db: AsyncSession = Depends(get_db)):
     """
     Elimina un feedback existente por su ID.
     """
     try:
-        eliminar_feedback(feedback_id)
+        await eliminar_feedback(db, feedback_id)
         return {"detail": f"Feedback {feedback_id} eliminado correctamente"}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -105,97 +376,153 @@ def eliminar_feedback_endpoint(feedback_id: int):
         raise HTTPException(status_code=500, detail="Error al eliminar el feedback")
 
 
-# --- FILTRADO AVANZADO ---
+# --- BACKFILL ---
 
-@router.get("/filtrados", response_model=List[FeedbackDB])
-def filtrar_feedbacks_endpoint(
-    autor: Optional[str] = Query(default=None, description="Filtrar por autor"),
-    desde: Optional[date] = Query(default=None, description="Fecha mínima YYYY-MM-DD"),
-    hasta: Optional[date] = Query(default=None, description="Fecha máxima YYYY-MM-DD"),
-    sentimiento: Optional[str] = Query(default=None, description="positivo, negativo o neutro"),
-    urgencia: Optional[str] = Query(default=None, description="urgente, normal o baja"),
-    db: Session = Depends(get_db)
+@router.post("/backfill/{campo}", status_code=202)
+async def lanzar_backfill(
+    campo: str,
+    bloque: int = Query(default=BACKFILL_TAMANO_BLOQUE, ge=1, le=5000, description="Filas por bloque"),
+    rps: float = Query(default=BACKFILL_PETICIONES_POR_SEGUNDO, gt=0, description="Peticiones IA por segundo"),
+    admin: UsuarioAutenticado = Depends(get_current_admin)
 ):
     """
-    Devuelve feedbacks filtrados por autor, rango de fechas, sentimiento y/o urgencia.
+    Lanza en segundo plano el relleno con IA de `campo` (urgencia o sugerencia) en todos los
+    feedbacks que no lo tienen. Si se detuvo antes, se reanuda desde el último bloque guardado.
+    Solo para administradores.
     """
-    try:
-        feedbacks = filtrar_feedbacks(db, autor, desde, hasta, sentimiento, urgencia)
-        return feedbacks
-    except Exception as e:
-        print("ERROR AL FILTRAR:", str(e))
-        raise HTTPException(status_code=500, detail="Error al filtrar feedbacks")
+    if campo not in CAMPOS_BACKFILL:
+        raise HTTPException(status_code=404, detail=f"Campo no soportado. Opciones: {sorted(CAMPOS_BACKFILL)}")
+    if backfill_en_curso(campo):
+        raise HTTPException(status_code=409, detail=f"Ya hay un backfill de {campo} en curso")
+
+    iniciar_backfill(campo, bloque, rps)
+    return {"detail": f"Backfill de {campo} iniciado"}
+
+
+@router.get("/backfill/{campo}")
+async def progreso_backfill(campo: str, usuario: UsuarioAutenticado = Depends(get_current_user)):
+    """
+    Devuelve el progreso del backfill de `campo`: filas procesadas, filas por segundo y tiempo restante estimado.
+    Requiere autenticación.
+    """
+    if campo not in CAMPOS_BACKFILL:
+        raise HTTPException(status_code=404, detail=f"Campo no soportado. Opciones: {sorted(CAMPOS_BACKFILL)}")
+
+    return {
+        "ejecucion_actual": progresos[campo].a_dict() if campo in progresos else None,
+        "checkpoint": await obtener_checkpoint(campo),
+    }
+
+
+@router.post("/backfill/{campo}/detener")
+async def parar_backfill(campo: str, admin: UsuarioAutenticado = Depends(get_current_admin)):
+    """
+    Detiene el backfill en curso de `campo`. Se puede reanudar más tarde. Solo para administradores.
+    """
+    if not detener_backfill(campo):
+        raise HTTPException(status_code=404, detail=f"No hay ningún backfill de {campo} en curso")
+    return {"detail": f"Backfill de {campo} detenido"}
 
 
 # --- FUNCIONES IA ---
 
+@router.post("/enriquecer/{feedback_id}", response_model=FeedbackDB)
+async def enriquecer_feedback(feedback_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Completa en una sola llamada IA el análisis, la toxicidad, la urgencia, la sugerencia
+    y (si es negativo) la respuesta de un feedback existente.
+    """
+    try:
+        return await enriquecer_feedback_existente(db, feedback_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RespuestaIAInvalida as e:
+        print("RESPUESTA IA NO VÁLIDA:", str(e))
+        raise HTTPException(status_code=502, detail="La IA ha devuelto una respuesta no válida; el feedback no se ha modificado")
+    except IANoDisponible as e:
+        raise _ia_no_disponible(e)
+    except Exception as e:
+        print("ERROR:", str(e))
+        raise HTTPException(status_code=500, detail="Error al enriquecer el feedback")
+
+
 @router.post("/responder_feedback/{feedback_id}")
-def responder_feedback(feedback_id: int):
+async def responder_feedback(feedback_id: int, db: AsyncSession = Depends(get_db)):
     """
     Genera una respuesta empática para un comentario negativo.
     """
     try:
-        respuesta = generar_respuesta_para_feedback(feedback_id)
+        respuesta = await generar_respuesta_para_feedback(db, feedback_id)
         return {"respuesta": respuesta}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except IANoDisponible as e:
+        raise _ia_no_disponible(e)
     except Exception as e:
         print("ERROR:", str(e))
         raise HTTPException(status_code=500, detail="Error al generar la respuesta")
 
 
 @router.post("/sugerencia_feedback/{feedback_id}")
-def sugerencia_feedback(feedback_id: int):
+async def sugerencia_feedback(feedback_id: int, db: AsyncSession = Depends(get_db)):
     """
     Genera una sugerencia de mejora basada en el comentario.
     """
     try:
-        sugerencia = generar_sugerencia_para_feedback(feedback_id)
+        sugerencia = await generar_sugerencia_para_feedback(db, feedback_id)
         return {"sugerencia": sugerencia}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except IANoDisponible as e:
+        raise _ia_no_disponible(e)
     except Exception as e:
         print("ERROR:", str(e))
         raise HTTPException(status_code=500, detail="Error al generar la sugerencia")
 
 
 @router.post("/detectar_toxico/{feedback_id}")
-def detectar_toxico(feedback_id: int):
+async def detectar_toxico(feedback_id: int, db: AsyncSession = Depends(get_db)):
     """
     Detecta si el comentario contiene lenguaje tóxico.
     """
     try:
-        resultado = detectar_feedback_toxico(feedback_id)
+        resultado = await detectar_feedback_toxico(db, feedback_id)
         return resultado
+    except IANoDisponible as e:
+        raise _ia_no_disponible(e)
     except Exception as e:
         print("ERROR:", str(e))
         raise HTTPException(status_code=500, detail="Error al analizar toxicidad del comentario")
 
 
 @router.post("/clasificar_urgencia/{feedback_id}")
-def clasificar_urgencia(feedback_id: int):
+async def clasificar_urgencia(feedback_id: int, db: AsyncSession = Depends(get_db)):
     """
     Clasifica el nivel de urgencia de un feedback (urgente, normal, baja).
     """
     try:
-        urgencia = clasificar_urgencia_feedback(feedback_id)
+        urgencia = await clasificar_urgencia_feedback(db, feedback_id)
         return {"urgencia": urgencia}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except IANoDisponible as e:
+        raise _ia_no_disponible(e)
     except Exception as e:
         print("ERROR INTERNO:", str(e))
         raise HTTPException(status_code=500, detail="Error al clasificar urgencia")
 
 
 @router.post("/detectar_sentimientos_cambiantes/{autor}")
-def detectar_sentimiento_cambiante(autor: str, db: Session = Depends(get_db)):
+async def detectar_sentimiento_cambiante(autor: str, db: AsyncSession = Depends(get_db)):
     """
     Analiza la evolución del sentimiento de un autor a lo largo del tiempo.
     """
     try:
-        resultado = detectar_cambios_sentimiento(autor, db)
+        resultado = await detectar_cambios_sentimiento(autor, db)
         return resultado
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except IANoDisponible as e:
+        raise _ia_no_disponible(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error interno al analizar sentimientos")
@@ -1,221 +1,400 @@
-from typing import List
-from datetime import datetime
-import re
-from collections import Counter
+import os
+import functools
+from typing import List, Optional
+from datetime import datetime, date
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
-from app.utils.dependencies import get_db
-import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db, estado_pools
 
-from app.db.session import SessionLocal
 from app.models.feedback import Feedback
-from app.analytics.estadisticas_service import calcular_resumen_sentimientos
+from app.models.feedback_tag import FeedbackTag
+from app.models.conteo_terminos import ConteoTermino
+from app.analytics.estadisticas_service import (
+    calcular_resumen_sentimientos,
+    contar_por_sentimiento,
+    contar_por_sentimiento_y_periodo,
+    ranking_autores,
+    contar_por_periodo,
+    feedbacks_extremos,
+    histograma_longitud
+)
+from app.ai.cache_ia import cache_ia
+from app.ai.uso_ia import uso_ia
+from app.ai.openai_client import limitador, circuito
+from app.utils.texto import STOPWORDS_ES
+from app.utils.cache import CacheLRU, version_datos
+from app.utils.telemetria import telemetria
+from app.services.auth_service import cache_usuarios, AUTH_CACHE_TTL
+from app.utils.dependencies import AUTH_CONFIAR_EN_TOKEN
 
 router = APIRouter()
 
-# Dependencia reutilizable para obtener la sesión de base de datos
+# Caché de respuestas de métricas: los paneles consultan cada pocos segundos y los datos solo
+# cambian cuando se escriben feedbacks. La clave incluye la versión de los datos, así que una
+# escritura en este proceso invalida lo anterior al momento; el TTL acota cuánto tarda en verse
+# una escritura hecha en otro proceso (otro worker de uvicorn o python -m app.worker).
+METRICAS_CACHE_TTL = float(os.getenv("METRICAS_CACHE_TTL", 30))  # segundos; 0 desactiva la caché
+METRICAS_CACHE_MAX_ENTRADAS = int(os.getenv("METRICAS_CACHE_MAX_ENTRADAS", 500))
+cache_metricas = CacheLRU(METRICAS_CACHE_MAX_ENTRADAS, ttl=METRICAS_CACHE_TTL)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def cachear_metrica(endpoint):
+    """
+    Decorador para endpoints de métricas: guarda la respuesta por endpoint, parámetros y versión de los datos.
+    Conserva la firma del endpoint para que FastAPI siga resolviendo parámetros y dependencias.
+    """
+    @functools.wraps(endpoint)
+    async def envoltorio(**kwargs):
+        if METRICAS_CACHE_TTL <= 0:
+            return await endpoint(**kwargs)
+
+        parametros = tuple(sorted((k, v) for k, v in kwargs.items() if not isinstance(v, AsyncSession)))
+        clave = (endpoint.__name__, version_datos.valor, parametros)
+        resultado = cache_metricas.obtener(clave)
+        if resultado is None:
+            resultado = await endpoint(**kwargs)
+            cache_metricas.guardar(clave, resultado)
+        return resultado
+
+    return envoltorio
 
 
 @router.get("/resumen", summary="Resumen general de sentimientos (IA)")
-async def obtener_resumen_sentimientos(db: Session = Depends(get_db)):
+@cachear_metrica
+async def obtener_resumen_sentimientos(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    autor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
     """
     Devuelve un resumen generado por IA con el análisis de sentimientos.
-    Se delega la lógica a `calcular_resumen_sentimientos`, donde se procesan todos los comentarios.
+    Se delega la lógica a `calcular_resumen_sentimientos`, que cuenta en la base de datos.
+    Se puede limitar a un rango de fechas (YYYY-MM-DD) y/o a un autor.
     """
-    resumen = calcular_resumen_sentimientos(db)
+    resumen = await calcular_resumen_sentimientos(db, desde, hasta, autor)
     return resumen
 
 
 @router.get("/general", summary="Cantidad de feedbacks por sentimiento")
-async def metricas_generales(db: Session = Depends(get_db)):
+@cachear_metrica
+async def metricas_generales(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    granularidad: Optional[str] = Query(default=None, pattern="^(day|week|month)$"),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Cuenta cuántos comentarios hay por tipo de sentimiento (positivo, negativo, neutral).
     Devuelve también el total acumulado.
+    Con `granularidad` (day, week o month) devuelve el mismo recuento para cada periodo.
     """
-    resultados = (
-        db.query(Feedback.sentimiento, func.count(Feedback.id))
-        .group_by(Feedback.sentimiento)
-        .all()
-    )
+    if granularidad:
+        return await contar_por_sentimiento_y_periodo(db, granularidad, desde, hasta)
 
-    # Convertimos la lista de tuplas a un diccionario
-    resumen = {sentimiento: cantidad for sentimiento, cantidad in resultados}
+    resumen = await contar_por_sentimiento(db, desde, hasta)
     resumen["total"] = sum(resumen.values())
 
     return resumen
 
 
 @router.get("/por_usuario", summary="Resumen de sentimientos por usuario")
-async def metricas_por_usuario(nombre: str, db: Session = Depends(get_db)):
+@cachear_metrica
+async def metricas_por_usuario(
+    nombre: str,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    granularidad: Optional[str] = Query(default=None, pattern="^(day|week|month)$"),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Devuelve cuántos comentarios positivos/negativos/neutrales ha escrito un usuario concreto.
+    Con `granularidad` (day, week o month) devuelve el recuento de cada periodo.
     """
-    resultados = (
-        db.query(Feedback.sentimiento, func.count(Feedback.id))
-        .filter(Feedback.autor == nombre)
-        .group_by(Feedback.sentimiento)
-        .all()
-    )
+    if granularidad:
+        resultados = await contar_por_sentimiento_y_periodo(db, granularidad, desde, hasta, nombre)
+    else:
+        resultados = await contar_por_sentimiento(db, desde, hasta, nombre)
 
     if not resultados:
         raise HTTPException(
             status_code=404, detail=f"No se ha encontrado ningún feedback de {nombre}")
 
-    resumen = {sentimiento: cantidad for sentimiento, cantidad in resultados}
-    resumen["total"] = sum(resumen.values())
+    if granularidad:
+        return resultados
 
-    return resumen
+    resultados["total"] = sum(resultados.values())
+    return resultados
 
 
 @router.get("/ranking_usuarios", summary="Usuarios que más feedback han enviado")
-async def ranking_por_actividad(db: Session = Depends(get_db)):
+@cachear_metrica
+async def ranking_por_actividad(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
     """
     Devuelve un ranking con los usuarios que más comentarios han escrito, en orden descendente.
     """
-    resultados = (
-        db.query(Feedback.autor, func.count(Feedback.id))
-        .group_by(Feedback.autor)
-        .order_by(func.count(Feedback.id).desc())
-        .all()
-    )
-
-    resumen = {autor: cantidad for autor, cantidad in resultados}
+    resumen = {autor: cantidad for autor, cantidad in await ranking_autores(db, desde, hasta, limit)}
     return resumen
 
 
 @router.get("/ultimos_feedbacks", summary="Últimos feedbacks enviados")
-async def ultimos_feedbacks(limit: int = 5, db: Session = Depends(get_db)):
+@cachear_metrica
+async def ultimos_feedbacks(limit: int = 5, db: AsyncSession = Depends(get_db)):
     """
     Devuelve los últimos feedbacks registrados, ordenados por fecha descendente.
     Incluye autor, sentimiento, fecha y comentario.
     """
-    resultados = (
-        db.query(Feedback)
+    resultados = await db.execute(
+        select(Feedback.autor, Feedback.sentimiento, Feedback.fecha, Feedback.comentario)
         .order_by(Feedback.fecha.desc())
         .limit(limit)
-        .all()
     )
 
-    return [
-        {
-            "autor": fb.autor,
-            "sentimiento": fb.sentimiento,
-            "fecha": fb.fecha,
-            "comentario": fb.comentario,
-        }
-        for fb in resultados
-    ]
+    return [fb._asdict() for fb in resultados]
 
 
-@router.get("/palabras_frecuentes", summary="Devuelve las 10 palabras más comunes")
-async def palabras_frecuentes(db: Session = Depends(get_db)):
+@router.get("/palabras_frecuentes", summary="Devuelve las palabras más comunes")
+@cachear_metrica
+async def palabras_frecuentes(
+    limit: int = 10,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sentimiento: Optional[str] = None,
+    stopwords: Optional[str] = None,
+    stopwords_por_defecto: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Analiza todos los comentarios de feedback y devuelve las 10 palabras
-    más repetidas tras limpiar el texto (minúsculas y eliminación de signos).
+    Devuelve las `limit` palabras más repetidas en los comentarios, opcionalmente de un rango
+    de fechas (YYYY-MM-DD) y/o de un sentimiento.
+    Se excluyen las palabras vacías habituales (salvo con stopwords_por_defecto=false)
+    y las indicadas en `stopwords`, separadas por comas.
+    Se suma sobre term_counts, que ya tiene cada comentario limpiado y contado por día.
     """
-    stopwords_es = {
-        "el", "la", "los", "las", "de", "del", "a", "al", "en", "por", "para",
-        "y", "o", "con", "sin", "un", "una", "unos", "unas", "es", "son",
-        "que", "como", "más", "muy", "se", "lo", "su", "sus", "ya", "no", "me", "mi", "fue"
-    }
+    excluidas = set(STOPWORDS_ES) if stopwords_por_defecto else set()
+    if stopwords:
+        excluidas.update(p.strip().lower() for p in stopwords.split(",") if p.strip())
+
+    frecuencia = func.sum(ConteoTermino.cantidad)
+    query = select(ConteoTermino.termino, frecuencia)
+    if desde:
+        query = query.filter(ConteoTermino.dia >= desde)
+    if hasta:
+        query = query.filter(ConteoTermino.dia <= hasta)
+    if sentimiento:
+        query = query.filter(ConteoTermino.sentimiento == sentimiento)
+    if excluidas:
+        query = query.filter(ConteoTermino.termino.notin_(excluidas))
+
+    palabras_mas_comunes = await db.execute(
+        query.group_by(ConteoTermino.termino)
+        .order_by(frecuencia.desc(), ConteoTermino.termino)
+        .limit(limit)
+    )
 
-    # 1. Obtener todos los comentarios de la base de datos
-    resultados = db.query(Feedback).all()
+    # Convertimos a lista de diccionarios para un JSON más legible
+    resultado_json = [
+        {"palabra": palabra, "frecuencia": int(cantidad)}
+        for palabra, cantidad in palabras_mas_comunes
+    ]
 
-    text_list = []
+    return resultado_json
 
-    # 2. Limpiar cada comentario
-    for fb in resultados:
-        # Convertir a minúsculas
-        texto = fb.comentario.lower()
 
-        # Eliminar signos, dejando solo letras, números y espacios
-        texto = re.sub(r"[^a-zA-Z0-9áéíóúÁÉÍÓÚñÑ\s]", "", texto)
+@router.get("/etiquetas", summary="Frecuencia de cada etiqueta")
+@cachear_metrica
+async def frecuencia_etiquetas(limit: int = 20, sentimiento: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Devuelve las etiquetas más usadas y en cuántos feedbacks aparece cada una, en orden descendente.
+    Se cuenta en SQL sobre la tabla feedback_tag; con `sentimiento` solo se cuentan los feedbacks de ese sentimiento.
+    """
+    query = select(FeedbackTag.etiqueta, func.count(FeedbackTag.feedback_id).label("cantidad"))
+    if sentimiento:
+        query = query.join(Feedback, Feedback.id == FeedbackTag.feedback_id).filter(Feedback.sentimiento == sentimiento)
 
-        # Eliminar espacios al inicio y final
-        texto = texto.strip()
+    resultados = await db.execute(
+        query.group_by(FeedbackTag.etiqueta)
+        .order_by(func.count(FeedbackTag.feedback_id).desc(), FeedbackTag.etiqueta)
+        .limit(limit)
+    )
 
-        # Añadir a la lista de textos
-        text_list.append(texto)
+    return [{"etiqueta": etiqueta, "cantidad": cantidad} for etiqueta, cantidad in resultados]
 
-    # 3. Unir todos los comentarios y separarlos en palabras individuales
-    todas_las_palabras = " ".join(text_list).split()
 
-    # filtra las "palabras" que no queremos que cuenten
-    palabras_filtradas = [
-        palabra for palabra in todas_las_palabras if palabra not in stopwords_es
-    ]
+@router.get("/feedback_extremos", summary="Devuelve los feedbacks más cortos y más largos")
+@cachear_metrica
+async def feedback_extremos(
+    k: int = Query(default=1, ge=1, le=100),
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sentimiento: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Devuelve los `k` feedbacks con el comentario más corto y los `k` con el más largo,
+    opcionalmente de un rango de fechas y/o un sentimiento.
+    "más_corto" y "más_largo" son el primero de cada lista.
+    """
+    extremos = await feedbacks_extremos(db, k, desde, hasta, sentimiento)
 
-    # 4. Contar ocurrencias de cada palabra
-    conteo = Counter(palabras_filtradas)
+    if not extremos["mas_cortos"]:
+        raise HTTPException(status_code=404, detail="No hay feedbacks")
 
-    # 5. Obtener las 10 más comunes
-    palabras_mas_comunes = conteo.most_common(10)
+    return {
+        "más_corto": extremos["mas_cortos"][0],
+        "más_largo": extremos["mas_largos"][0],
+        "más_cortos": extremos["mas_cortos"],
+        "más_largos": extremos["mas_largos"],
+    }
 
-    # Convertimos a lista de diccionarios para un JSON más legible
-    resultado_json = [
-        {"palabra": palabra, "frecuencia": cantidad}
-        for palabra, cantidad in palabras_mas_comunes
-    ]
 
-    return resultado_json
+@router.get("/longitud_comentarios", summary="Distribución de la longitud de los comentarios por percentiles")
+@cachear_metrica
+async def longitud_comentarios(
+    cubetas: int = Query(default=10, ge=1, le=100),
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sentimiento: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Histograma de longitudes: reparte los comentarios en `cubetas` grupos por percentil (10 = deciles)
+    con la longitud mínima, máxima y media de cada uno.
+    """
+    return await histograma_longitud(db, cubetas, desde, hasta, sentimiento)
 
 
-@router.get("/feedback_extremos", summary="Devuelve el feedback más corto y más largo")
-async def feedback_extremos(db: Session = Depends(get_db)):
-    resultados = db.query(Feedback).all()
+@router.get("/feedback_por_fecha", summary="Distribución de feedbacks por fecha")
+@cachear_metrica
+async def feedback_por_fecha(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    granularidad: str = Query(default="day", pattern="^(day|week|month)$"),
+    autor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Devuelve un resumen de cuántos feedbacks se han recibido por día (o semana o mes, según `granularidad`)
+    y la longitud media de sus comentarios.
+    Útil para detectar picos o patrones en la actividad.
+    """
+    return await contar_por_periodo(db, granularidad, desde, hasta, autor)
 
-    data = [{
-        "id": fb.id,
-        "autor": fb.autor,
-        "comentario": fb.comentario,
-        "fecha": fb.fecha,
-        "longitud": len(fb.comentario)
-    } for fb in resultados]
 
-    df = pd.DataFrame(data)
+@router.get("/ia_cache", summary="Estadísticas de la caché de resultados de IA")
+async def estadisticas_cache_ia():
+    """
+    Devuelve aciertos, fallos y ocupación de los dos niveles de la caché de IA (memoria y base de datos).
+    """
+    return cache_ia.estadisticas()
 
-    if df.empty:
-        raise HTTPException(status_code=401, detail=f"No hay feedbacks")
 
-    # Obtener el más corto y el más largo
-    feedback_corto = df.loc[df["longitud"].idxmin()].to_dict()
-    feedback_largo = df.loc[df["longitud"].idxmax()].to_dict()
+@router.get("/ai_usage", summary="Uso de la IA por operación: llamadas, latencia, tokens y fallos")
+async def uso_de_ia():
+    """
+    Devuelve, para cada operación de IA (analisis, analisis_lote, enriquecimiento, toxicidad, urgencia,
+    sugerencia, respuesta, cambio_sentimiento), las llamadas, errores, respuestas que no se pudieron
+    interpretar, reintentos, peticiones duplicadas, respuestas degradadas, tokens de prompt y de
+    respuesta y el histograma de latencia, junto con los totales, el estado del limitador de
+    concurrencia y el del circuito (cerrado, abierto o semiabierto).
+    """
+    return {**uso_ia.estado(), "limitador": limitador.estado(), "circuito": circuito.estado()}
+
 
+@router.get("/cache", summary="Estadísticas de la caché de respuestas de métricas")
+async def estadisticas_cache_metricas():
+    """
+    Devuelve aciertos, fallos, tasa de aciertos y ocupación de la caché de /metrics,
+    junto con el TTL y la versión actual de los datos.
+    """
     return {
-        "más_corto": feedback_corto,
-        "más_largo": feedback_largo
+        **cache_metricas.estadisticas(),
+        "ttl_segundos": METRICAS_CACHE_TTL,
+        "version_datos": version_datos.valor,
     }
 
 
-@router.get("/feedback_por_fecha", summary="Distribución de feedbacks por fecha")
-async def feedback_por_fecha(db: Session = Depends(get_db)):
+@router.get("/auth_cache", summary="Estadísticas de la caché de usuarios autenticados")
+async def estadisticas_cache_usuarios():
     """
-    Devuelve un resumen de cuántos feedbacks se han recibido por día.
-    Útil para detectar picos o patrones en la actividad.
+    Devuelve aciertos, fallos y ocupación de la caché de get_current_user: cada fallo es una
+    consulta a la tabla users. Con AUTH_CONFIAR_EN_TOKEN=true los tokens con uid y role no la usan.
     """
-    resultados = db.query(Feedback).all()
+    return {
+        **cache_usuarios.estadisticas(),
+        "ttl_segundos": AUTH_CACHE_TTL,
+        "confiar_en_token": AUTH_CONFIAR_EN_TOKEN,
+    }
 
-    data = [{
-        "fecha": fb.fecha.date()
-    } for fb in resultados]
 
-    df = pd.DataFrame(data)
+@router.get("/prometheus", summary="Latencia HTTP y de base de datos por ruta en formato Prometheus")
+async def exposicion_prometheus():
+    """
+    Peticiones por método, ruta y código de estado, histogramas de latencia por ruta, peticiones
+    en curso y duración de las consultas SQL según la ruta que las lanzó, en el formato de texto
+    que lee Prometheus.
+    """
+    return PlainTextResponse(telemetria.exposicion(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/pool", summary="Estado de los pools de conexiones a la base de datos")
+async def estado_pool_conexiones():
+    """
+    Devuelve, para el motor asíncrono (API y trabajadores) y el síncrono (exportación y scripts),
+    las conexiones en uso, libres y de overflow, la espera media y máxima para obtener una
+    y cuántas esperas han acabado en timeout, junto con la configuración del pool.
+    """
+    return estado_pools()
+
+
+@router.get("/niveles_analisis", summary="Uso del clasificador local frente a la IA")
+@cachear_metrica
+async def niveles_analisis(db: AsyncSession = Depends(get_db)):
+    """
+    Cuenta cuántos feedbacks resolvió el clasificador local y cuántos se escalaron a la IA,
+    con la latencia media de cada nivel y una estimación del tiempo ahorrado.
+    """
+    resultados = await db.execute(
+        select(
+            Feedback.nivel_analisis,
+            func.count(Feedback.id),
+            func.avg(Feedback.latencia_analisis_ms),
+            func.avg(Feedback.confianza_local),
+        )
+        .where(Feedback.nivel_analisis.isnot(None))
+        .group_by(Feedback.nivel_analisis)
+    )
+
+    niveles = {
+        nivel: {
+            "cantidad": cantidad,
+            "latencia_media_ms": round(latencia, 3) if latencia is not None else None,
+            "confianza_local_media": round(confianza, 3) if confianza is not None else None,
+        }
+        for nivel, cantidad, latencia, confianza in resultados
+    }
 
-    conteo_por_fecha = df.groupby("fecha").size().reset_index(name="cantidad")
+    local = niveles.get("local", {"cantidad": 0, "latencia_media_ms": None})
+    ia = niveles.get("ia", {"cantidad": 0, "latencia_media_ms": None})
+    total = local["cantidad"] + ia["cantidad"]
 
-    resultado = conteo_por_fecha.to_dict(orient="records")
+    # Tiempo ahorrado: lo que habrían tardado en la IA los resueltos en local
+    ahorro_ms = None
+    if local["cantidad"] and ia["latencia_media_ms"] is not None:
+        ahorro_ms = round(local["cantidad"] * (ia["latencia_media_ms"] - (local["latencia_media_ms"] or 0)), 1)
 
-    return resultado
+    return {
+        "niveles": niveles,
+        "total": total,
+        "tasa_escalado": round(ia["cantidad"] / total, 4) if total else 0.0,
+        "latencia_ahorrada_estimada_ms": ahorro_ms,
+    }
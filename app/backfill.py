@@ -0,0 +1,308 @@
+"""
+Backfill de urgencia y sugerencia sobre los feedbacks existentes.
+
+Recorre en bloques ordenados por id las filas que tienen el campo a NULL, las enriquece con
+llamadas IA concurrentes y limitadas en tasa, y guarda el progreso en `backfill_checkpoint`
+para poder reanudar donde se quedó. Se lanza desde la API (POST /feedback/backfill/{campo})
+o como proceso independiente:
+
+    python -m app.backfill urgencia --rps 10 --bloque 200
+"""
+import os
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from typing import Optional
+from dotenv import load_dotenv
+
+from app.db.session import AsyncSessionLocal
+from app.models.backfill import BackfillCheckpoint
+from app.ai.openai_client import (
+    clasificar_nivel_urgencia,
+    generar_sugerencia_para_comentario,
+    circuito,
+    IANoDisponible,
+    URGENCIAS_VALIDAS
+)
+from app.services.feedback_service import (
+    obtener_feedbacks_sin_campo,
+    contar_feedbacks_sin_campo,
+    guardar_valores_campo
+)
+
+load_dotenv()
+BACKFILL_TAMANO_BLOQUE = int(os.getenv("BACKFILL_TAMANO_BLOQUE", 200))  # filas leídas y guardadas de cada vez
+BACKFILL_PETICIONES_POR_SEGUNDO = float(os.getenv("BACKFILL_PETICIONES_POR_SEGUNDO", 5))
+
+# Con el circuito de la IA abierto el backfill se pausa; comprueba de nuevo como muy pronto tras estos segundos
+ESPERA_MINIMA_CIRCUITO = 1.0
+
+# Campo que se rellena -> función IA que calcula su valor a partir del comentario
+CAMPOS_BACKFILL = {
+    "urgencia": clasificar_nivel_urgencia,
+    "sugerencia": generar_sugerencia_para_comentario,
+}
+
+
+class LimitadorTasa:
+    """
+    Cubo de fichas: deja pasar de media `por_segundo` peticiones por segundo,
+    con ráfagas de como mucho `por_segundo` peticiones.
+    """
+
+    def __init__(self, por_segundo: float):
+        self.por_segundo = por_segundo
+        self.capacidad = max(1.0, por_segundo)
+        self._fichas = self.capacidad
+        self._ultima_recarga = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def esperar(self) -> None:
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultima_recarga) * self.por_segundo)
+                self._ultima_recarga = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.por_segundo)
+
+
+class ProgresoBackfill:
+    """
+    Progreso de la ejecución en curso de un backfill: filas procesadas, velocidad y tiempo restante estimado.
+    """
+
+    def __init__(self, campo: str, ultimo_id: int, restantes: int):
+        self.campo = campo
+        self.ultimo_id = ultimo_id
+        self.restantes_al_inicio = restantes
+        self.procesados = 0
+        self.errores = 0
+        self.estado = "en_curso"  # en_curso, pausado (circuito de la IA abierto), completado o detenido
+        self.inicio = time.monotonic()
+        self.fin: Optional[float] = None
+
+    def terminar(self, estado: str) -> None:
+        self.estado = estado
+        self.fin = time.monotonic()
+
+    def a_dict(self) -> dict:
+        transcurrido = (self.fin or time.monotonic()) - self.inicio
+        hechos = self.procesados + self.errores
+        filas_por_segundo = hechos / transcurrido if transcurrido > 0 else 0.0
+        restantes = max(self.restantes_al_inicio - hechos, 0)
+
+        return {
+            "campo": self.campo,
+            "estado": self.estado,
+            "ultimo_id": self.ultimo_id,
+            "procesados": self.procesados,
+            "errores": self.errores,
+            "restantes": restantes,
+            "segundos_transcurridos": round(transcurrido, 1),
+            "filas_por_segundo": round(filas_por_segundo, 2),
+            "eta_segundos": round(restantes / filas_por_segundo) if filas_por_segundo else None,
+        }
+
+
+# Progreso y tarea de cada backfill lanzado desde este proceso
+progresos: dict[str, ProgresoBackfill] = {}
+_tareas: dict[str, asyncio.Task] = {}
+
+
+def _validar_valor(campo: str, valor) -> Optional[str]:
+    if isinstance(valor, Exception) or not isinstance(valor, str):
+        return None
+    valor = valor.strip()
+    if campo == "urgencia":
+        valor = valor.lower().rstrip(".")
+        return valor if valor in URGENCIAS_VALIDAS else None
+    return valor or None
+
+
+# --- Acceso a base de datos ---
+
+async def _cargar_checkpoint(campo: str) -> BackfillCheckpoint:
+    async with AsyncSessionLocal() as db:
+        checkpoint = await db.get(BackfillCheckpoint, campo)
+        if checkpoint is None:
+            checkpoint = BackfillCheckpoint(campo=campo, ultimo_id=0, procesados=0, errores=0)
+            db.add(checkpoint)
+        elif checkpoint.estado == "completado":
+            # Una pasada terminada se vuelve a empezar desde el principio (filas nuevas o que fallaron)
+            checkpoint.ultimo_id = 0
+            checkpoint.procesados = 0
+            checkpoint.errores = 0
+            checkpoint.iniciado = datetime.utcnow()
+        checkpoint.estado = "en_curso"
+        await db.commit()
+        await db.refresh(checkpoint)
+        db.expunge(checkpoint)
+        return checkpoint
+
+
+async def _contar_restantes(campo: str, desde_id: int) -> int:
+    async with AsyncSessionLocal() as db:
+        return await contar_feedbacks_sin_campo(db, campo, desde_id)
+
+
+async def _leer_bloque(campo: str, desde_id: int, limite: int) -> list[tuple[int, str]]:
+    async with AsyncSessionLocal() as db:
+        return await obtener_feedbacks_sin_campo(db, campo, desde_id, limite)
+
+
+async def _guardar_bloque(campo: str, valores: dict[int, str], ultimo_id: int, procesados: int, errores: int) -> None:
+    # Si el proceso se corta entre las dos transacciones, el bloque se vuelve a leer al reanudar
+    # y las filas ya rellenadas no aparecen (el campo ya no es NULL), así que es seguro.
+    async with AsyncSessionLocal() as db:
+        await guardar_valores_campo(db, campo, valores)
+        checkpoint = await db.get(BackfillCheckpoint, campo)
+        checkpoint.ultimo_id = ultimo_id
+        checkpoint.procesados += procesados
+        checkpoint.errores += errores
+        await db.commit()
+
+
+async def _marcar_estado(campo: str, estado: str) -> None:
+    async with AsyncSessionLocal() as db:
+        checkpoint = await db.get(BackfillCheckpoint, campo)
+        checkpoint.estado = estado
+        await db.commit()
+
+
+async def obtener_checkpoint(campo: str) -> Optional[dict]:
+    """
+    Devuelve el progreso acumulado guardado en base de datos para `campo`, o None si nunca se ha ejecutado.
+    """
+    async with AsyncSessionLocal() as db:
+        checkpoint = await db.get(BackfillCheckpoint, campo)
+        if checkpoint is None:
+            return None
+        return {
+            "campo": checkpoint.campo,
+            "estado": checkpoint.estado,
+            "ultimo_id": checkpoint.ultimo_id,
+            "procesados": checkpoint.procesados,
+            "errores": checkpoint.errores,
+            "iniciado": checkpoint.iniciado,
+            "actualizado": checkpoint.actualizado,
+        }
+
+
+# --- Ejecución ---
+
+async def ejecutar_backfill(
+    campo: str,
+    tamano_bloque: int = BACKFILL_TAMANO_BLOQUE,
+    peticiones_por_segundo: float = BACKFILL_PETICIONES_POR_SEGUNDO
+) -> ProgresoBackfill:
+    """
+    Rellena `campo` en todos los feedbacks que lo tienen a NULL, reanudando desde el último checkpoint.
+    Las llamadas IA de cada bloque se lanzan en paralelo, limitadas por el limitador global de
+    concurrencia de OpenAI y por `peticiones_por_segundo`.
+    Mientras el circuito de la IA está abierto se pausa en lugar de gastar los bloques en errores.
+    """
+    generar = CAMPOS_BACKFILL[campo]
+    limitador_tasa = LimitadorTasa(peticiones_por_segundo)
+
+    checkpoint = await _cargar_checkpoint(campo)
+    restantes = await _contar_restantes(campo, checkpoint.ultimo_id)
+    progreso = ProgresoBackfill(campo, checkpoint.ultimo_id, restantes)
+    progresos[campo] = progreso
+
+    async def calcular(comentario: str):
+        await limitador_tasa.esperar()
+        return await generar(comentario)
+
+    try:
+        while True:
+            while not circuito.disponible():
+                progreso.estado = "pausado"
+                await asyncio.sleep(max(circuito.segundos_para_reintentar(), ESPERA_MINIMA_CIRCUITO))
+            progreso.estado = "en_curso"
+
+            bloque = await _leer_bloque(campo, progreso.ultimo_id, tamano_bloque)
+            if not bloque:
+                break
+
+            resultados = await asyncio.gather(
+                *(calcular(comentario) for _, comentario in bloque),
+                return_exceptions=True
+            )
+
+            valores = {}
+            for (feedback_id, _), resultado in zip(bloque, resultados):
+                valor = _validar_valor(campo, resultado)
+                if valor is not None:
+                    valores[feedback_id] = valor
+
+            if any(isinstance(resultado, IANoDisponible) for resultado in resultados):
+                # La IA ha dejado de responder a mitad de bloque: se guardan los valores obtenidos pero el
+                # checkpoint no avanza, así que las filas que faltan se vuelven a leer cuando se recupere
+                await _guardar_bloque(campo, valores, progreso.ultimo_id, len(valores), 0)
+                progreso.procesados += len(valores)
+                continue
+
+            errores = len(bloque) - len(valores)
+            await _guardar_bloque(campo, valores, bloque[-1][0], len(valores), errores)
+            progreso.ultimo_id = bloque[-1][0]
+            progreso.procesados += len(valores)
+            progreso.errores += errores
+
+        progreso.terminar("completado")
+    except asyncio.CancelledError:
+        progreso.terminar("detenido")
+        raise
+    except Exception as e:
+        print(f"ERROR EN EL BACKFILL DE {campo}:", str(e))
+        progreso.terminar("detenido")
+        raise
+    finally:
+        await asyncio.shield(_marcar_estado(campo, progreso.estado))
+
+    return progreso
+
+
+def backfill_en_curso(campo: str) -> bool:
+    tarea = _tareas.get(campo)
+    return tarea is not None and not tarea.done()
+
+
+def iniciar_backfill(campo: str, tamano_bloque: int, peticiones_por_segundo: float) -> None:
+    """
+    Lanza el backfill de `campo` como tarea en segundo plano del event loop actual.
+    """
+    _tareas[campo] = asyncio.create_task(ejecutar_backfill(campo, tamano_bloque, peticiones_por_segundo))
+
+
+def detener_backfill(campo: str) -> bool:
+    """
+    Detiene el backfill en curso de `campo`. Se podrá reanudar desde el último bloque guardado.
+    """
+    if not backfill_en_curso(campo):
+        return False
+    _tareas[campo].cancel()
+    return True
+
+
+async def _main(campo: str, tamano_bloque: int, peticiones_por_segundo: float) -> None:
+    tarea = asyncio.create_task(ejecutar_backfill(campo, tamano_bloque, peticiones_por_segundo))
+    while not tarea.done():
+        await asyncio.wait({tarea}, timeout=10)
+        if campo in progresos and not tarea.done():
+            print(progresos[campo].a_dict())
+    progreso = await tarea
+    print("✅ Backfill terminado:", progreso.a_dict())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rellena con IA la urgencia o la sugerencia de los feedbacks existentes")
+    parser.add_argument("campo", choices=sorted(CAMPOS_BACKFILL))
+    parser.add_argument("--bloque", type=int, default=BACKFILL_TAMANO_BLOQUE, help="Filas por bloque")
+    parser.add_argument("--rps", type=float, default=BACKFILL_PETICIONES_POR_SEGUNDO, help="Peticiones IA por segundo")
+    args = parser.parse_args()
+
+    asyncio.run(_main(args.campo, args.bloque, args.rps))
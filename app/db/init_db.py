@@ -1,10 +1,13 @@
 from app.db.session import engine
-from app.models import user, feedback  # Importa modelos para que se registren
+from app.db.migraciones import aplicar_migraciones
+from app.models import user, feedback, feedback_tag, conteo_terminos, resumen_diario, ia_cache, backfill  # Importa modelos para que se registren
 from app.db.base_class import Base
 
 def init_db():
     print("🔧 Creando tablas en la base de datos...")
     Base.metadata.create_all(bind=engine)
+    # create_all no modifica tablas que ya existen: los cambios de esquema van en app/db/migraciones.py
+    aplicar_migraciones(engine)
     print("✅ Tablas creadas correctamente.")
 
 if __name__ == "__main__":
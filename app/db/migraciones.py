@@ -0,0 +1,180 @@
+"""
+Migraciones de esquema versionadas.
+
+create_all crea las tablas e índices que faltan, pero no modifica tablas que ya existen.
+Los cambios sobre bases de datos existentes se añaden aquí como una función por versión,
+en orden. Cada versión aplicada se registra en `schema_migraciones` y no se vuelve a ejecutar.
+Para añadir un cambio: escribir la función y añadirla al final de MIGRACIONES.
+
+    python -m app.db.migraciones          # aplica las pendientes
+    python -m app.db.migraciones --estado # muestra las aplicadas y las pendientes
+"""
+import argparse
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+# Identificador arbitrario del bloqueo que evita que dos procesos migren a la vez
+BLOQUEO_MIGRACIONES = 728341
+
+# Índices B-tree de los filtros de filtrar_feedbacks y las métricas por usuario: nombre -> columnas.
+# También están declarados en el modelo Feedback para que create_all los cree en bases nuevas.
+INDICES_FILTRADO = {
+    "ix_feedback_fecha_id": "(fecha, id)",  # orden y paginación por (fecha, id) y rangos de fecha
+    "ix_feedback_autor_fecha": "(autor, fecha)",  # autor exacto (métricas por usuario)
+    "ix_feedback_sentimiento_fecha": "(sentimiento, fecha)",
+}
+# Índice de trigramas para autor ILIKE '%texto%'; solo PostgreSQL con la extensión pg_trgm
+INDICE_TRIGRAMAS_AUTOR = ("ix_feedback_autor_trgm", "USING gin (autor gin_trgm_ops)")
+
+
+def _m001_columnas_analisis(conn: Connection) -> None:
+    # Antes se ejecutaban en cada arranque; son idempotentes, así que también valen para bases que ya las tienen
+    for sentencia in [
+        "ALTER TABLE feedback ALTER COLUMN sentimiento DROP NOT NULL",
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS estado_analisis VARCHAR NOT NULL DEFAULT 'completado'",
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS analisis_reclamado TIMESTAMP",
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS analisis_intentos INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS toxico BOOLEAN",
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS razon_toxicidad VARCHAR",
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS nivel_analisis VARCHAR",
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS confianza_local DOUBLE PRECISION",
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS latencia_analisis_ms DOUBLE PRECISION",
+        # Índice parcial para que los trabajadores encuentren rápido las filas sin analizar
+        "CREATE INDEX IF NOT EXISTS ix_feedback_analisis_pendiente ON feedback (id) "
+        "WHERE estado_analisis IN ('pendiente', 'procesando')",
+    ]:
+        conn.execute(text(sentencia))
+
+
+def crear_indices_filtrado(conn: Connection, tabla: str = "feedback") -> bool:
+    """
+    Crea los índices de INDICES_FILTRADO y, si pg_trgm está disponible, el de trigramas sobre autor.
+    Devuelve si se ha podido crear el de trigramas. `tabla` permite reutilizarlo en los benchmarks.
+    """
+    sufijo = "" if tabla == "feedback" else f"_{tabla}"
+    for nombre, columnas in INDICES_FILTRADO.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nombre}{sufijo} ON {tabla} {columnas}"))
+
+    nombre, definicion = INDICE_TRIGRAMAS_AUTOR
+    # Crear la extensión requiere permisos que el usuario de la aplicación puede no tener:
+    # en ese caso se sigue sin el índice de trigramas (la búsqueda por autor funciona igual, más lenta)
+    punto = conn.begin_nested()
+    try:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nombre}{sufijo} ON {tabla} {definicion}"))
+        punto.commit()
+        return True
+    except SQLAlchemyError as e:
+        punto.rollback()
+        print("⚠️ No se ha podido crear el índice de trigramas (¿falta pg_trgm?):", str(e).splitlines()[0])
+        return False
+
+
+def _m002_indices_filtrado(conn: Connection) -> None:
+    # CREATE INDEX bloquea las escrituras en feedback mientras se construye; en tablas muy grandes
+    # se puede crear antes a mano con CREATE INDEX CONCURRENTLY y esta migración no hará nada
+    crear_indices_filtrado(conn)
+    conn.execute(text("ANALYZE feedback"))
+
+
+def _m003_feedback_tag(conn: Connection) -> None:
+    # create_all ya ha creado la tabla; aquí se copian las etiquetas de los feedbacks existentes
+    conn.execute(text("""
+        INSERT INTO feedback_tag (feedback_id, etiqueta)
+        SELECT DISTINCT f.id, lower(trim(e.etiqueta))
+        FROM feedback f, unnest(string_to_array(f.etiquetas, ',')) AS e(etiqueta)
+        WHERE trim(e.etiqueta) <> ''
+        ON CONFLICT DO NOTHING
+    """))
+    conn.execute(text("ANALYZE feedback_tag"))
+
+
+def _m004_term_counts(conn: Connection) -> None:
+    # create_all ya ha creado la tabla vacía; se llena con los feedbacks existentes
+    from sqlalchemy.orm import Session
+    from app.analytics.agregados import reconstruir_conteo_terminos
+
+    print("🔧 Calculando term_counts a partir de los comentarios existentes...")
+    with Session(bind=conn) as db:
+        reconstruir_conteo_terminos(db)
+
+
+def _m005_feedback_daily_rollup(conn: Connection) -> None:
+    from sqlalchemy.orm import Session
+    from app.analytics.agregados import reconstruir_resumen_diario
+
+    with Session(bind=conn) as db:
+        reconstruir_resumen_diario(db)
+
+
+def _m006_indice_longitud(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_feedback_longitud_comentario ON feedback (length(comentario))"))
+
+
+# (versión, descripción, función). Solo se añaden al final; nunca se cambia una ya publicada.
+MIGRACIONES: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Columnas del análisis en segundo plano, toxicidad y nivel de análisis", _m001_columnas_analisis),
+    (2, "Índices de filtrado por fecha, autor y sentimiento y trigramas sobre autor", _m002_indices_filtrado),
+    (3, "Etiquetas normalizadas en feedback_tag a partir de la columna etiquetas", _m003_feedback_tag),
+    (4, "Conteo de términos por día y sentimiento (term_counts)", _m004_term_counts),
+    (5, "Resumen diario por autor, sentimiento y urgencia (feedback_daily_rollup)", _m005_feedback_daily_rollup),
+    (6, "Índice sobre la longitud del comentario", _m006_indice_longitud),
+]
+
+
+def _crear_tabla_versiones(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migraciones ("
+        "version INTEGER PRIMARY KEY, "
+        "descripcion VARCHAR NOT NULL, "
+        "aplicada TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def versiones_aplicadas(conn: Connection) -> set[int]:
+    _crear_tabla_versiones(conn)
+    return {fila[0] for fila in conn.execute(text("SELECT version FROM schema_migraciones"))}
+
+
+def aplicar_migraciones(engine: Engine) -> list[int]:
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia transacción.
+    Devuelve las versiones aplicadas. Solo hace algo en PostgreSQL.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+
+    aplicadas = []
+    for version, descripcion, migrar in MIGRACIONES:
+        with engine.begin() as conn:
+            # Si varios procesos arrancan a la vez, el resto espera aquí y luego ve la versión ya aplicada
+            conn.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": BLOQUEO_MIGRACIONES})
+            if version in versiones_aplicadas(conn):
+                continue
+            print(f"🔧 Aplicando migración {version}: {descripcion}")
+            migrar(conn)
+            conn.execute(
+                text("INSERT INTO schema_migraciones (version, descripcion) VALUES (:version, :descripcion)"),
+                {"version": version, "descripcion": descripcion}
+            )
+            aplicadas.append(version)
+    return aplicadas
+
+
+if __name__ == "__main__":
+    from app.db.session import engine
+
+    parser = argparse.ArgumentParser(description="Aplica las migraciones de esquema pendientes")
+    parser.add_argument("--estado", action="store_true", help="Solo muestra qué migraciones están aplicadas")
+    args = parser.parse_args()
+
+    if args.estado:
+        with engine.begin() as conn:
+            hechas = versiones_aplicadas(conn)
+        for version, descripcion, _ in MIGRACIONES:
+            print(f"{'✅' if version in hechas else '⏳'} {version}: {descripcion}")
+    else:
+        aplicadas = aplicar_migraciones(engine)
+        print(f"✅ Migraciones aplicadas: {aplicadas or 'ninguna pendiente'}")
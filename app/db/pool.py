@@ -0,0 +1,82 @@
+"""
+Pools de conexiones instrumentados.
+
+Miden cuánto espera cada sesión para obtener una conexión (incluida la apertura de conexiones
+nuevas) y cuántas esperas acaban en timeout. Con el estado del pool se ve en GET /metrics/pool
+si las peticiones se están quedando en cola por falta de conexiones.
+"""
+import os
+import time
+import threading
+from sqlalchemy.exc import TimeoutError as TimeoutPool
+from sqlalchemy.pool import Pool, QueuePool, AsyncAdaptedQueuePool
+
+# Las esperas más largas que esto se avisan por consola con el estado del pool
+DB_POOL_ESPERA_AVISO_MS = float(os.getenv("DB_POOL_ESPERA_AVISO_MS", 100))
+
+
+class EstadisticasPool:
+    """
+    Contadores de las esperas para obtener una conexión de un pool.
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def registrar_espera(self, segundos: float) -> None:
+        with self._lock:
+            self.esperas += 1
+            self.espera_total += segundos
+            self.espera_maxima = max(self.espera_maxima, segundos)
+
+    def registrar_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def estado(self, pool: Pool) -> dict:
+        with self._lock:
+            esperas = {
+                "checkouts": self.esperas,
+                "espera_media_ms": round(self.espera_total / self.esperas * 1000, 3) if self.esperas else 0.0,
+                "espera_maxima_ms": round(self.espera_maxima * 1000, 3),
+                "timeouts": self.timeouts,
+            }
+        return {
+            "tamano": pool.size(),
+            "en_uso": pool.checkedout(),
+            "libres": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),  # conexiones abiertas por encima de pool_size
+            **esperas,
+        }
+
+
+class _MedirEspera:
+    estadisticas: EstadisticasPool
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except TimeoutPool:
+            self.estadisticas.registrar_timeout()
+            print(f"AVISO: timeout esperando una conexión del pool {self.estadisticas.nombre}:", self.status())
+            raise
+        espera = time.perf_counter() - inicio
+        self.estadisticas.registrar_espera(espera)
+        if espera * 1000 >= DB_POOL_ESPERA_AVISO_MS:
+            print(f"AVISO: {espera * 1000:.0f} ms esperando una conexión del pool {self.estadisticas.nombre}:", self.status())
+        return conexion
+
+
+# Las estadísticas son de la clase y no de la instancia: sobreviven a engine.dispose(), que crea un pool nuevo
+class PoolInstrumentado(_MedirEspera, QueuePool):
+    estadisticas = EstadisticasPool("sincrono")
+
+
+class PoolAsincronoInstrumentado(_MedirEspera, AsyncAdaptedQueuePool):
+    estadisticas = EstadisticasPool("asincrono")
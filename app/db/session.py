@@ -1,34 +1,108 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import urllib.parse
 
+from app.db.pool import PoolInstrumentado, PoolAsincronoInstrumentado
+
 load_dotenv()
 
 DB_USER = os.getenv("POSTGRES_USER")
-DB_PASSWORD = urllib.parse.quote_plus(os.getenv("POSTGRES_PASSWORD"))  # Escapa caracteres especiales
+DB_PASSWORD = urllib.parse.quote_plus(os.getenv("POSTGRES_PASSWORD", ""))  # Escapa caracteres especiales
 DB_NAME = os.getenv("POSTGRES_DB")
 DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL permite apuntar a otra base de datos (p. ej. sqlite:///benchmark.db) sin las variables POSTGRES_*
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ES_POSTGRES = make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "postgresql"
+
+# Pool de conexiones (cada motor tiene el suyo): conexiones fijas, extra en picos, segundos de
+# espera antes de fallar si no queda ninguna libre, y segundos tras los que se renueva una conexión
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # -1 = no renovar
+OPCIONES_POOL = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+}
+
+# Driver asíncrono equivalente a cada base de datos soportada
+DRIVERS_ASINCRONOS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
 
+def url_asincrona(url: str) -> str:
+    """
+    Misma URL de conexión con el driver asíncrono (asyncpg para PostgreSQL, aiosqlite para SQLite).
+    """
+    url = make_url(url)
+    return url.set(drivername=DRIVERS_ASINCRONOS[url.get_backend_name()]).render_as_string(hide_password=False)
+
+
+# Motor síncrono: migraciones, reconstrucción de agregados, exportación (se ejecuta en un hilo) y scripts
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={
         "options": "-c client_encoding=utf8 -c timezone=UTC",
         "client_encoding": "utf8"
-    },
+    } if ES_POSTGRES else {},
+    poolclass=PoolInstrumentado,
     pool_pre_ping=True,  # Verifica conexiones antes de usarlas
-    echo=False
+    echo=False,
+    **OPCIONES_POOL
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Motor asíncrono: endpoints, servicios y trabajadores. Las consultas esperan en el event loop
+# sin bloquearlo, así que un proceso atiende a la vez tantas peticiones como conexiones tiene el pool.
+async_engine = create_async_engine(
+    url_asincrona(SQLALCHEMY_DATABASE_URL),
+    connect_args={"server_settings": {"timezone": "UTC"}} if ES_POSTGRES else {},
+    poolclass=PoolAsincronoInstrumentado,
+    pool_pre_ping=True,
+    echo=False,
+    **OPCIONES_POOL
+)
+
+
+def _activar_claves_foraneas(conexion_dbapi, _) -> None:
+    # SQLite solo aplica las claves foráneas (y el ON DELETE CASCADE de feedback_tag) si se activan en cada conexión
+    cursor = conexion_dbapi.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+if not ES_POSTGRES:
+    event.listen(engine, "connect", _activar_claves_foraneas)
+    event.listen(async_engine.sync_engine, "connect", _activar_claves_foraneas)
+
+# expire_on_commit=False: tras el commit los atributos siguen cargados y leerlos no lanza
+# consultas implícitas, que en una sesión asíncrona no están permitidas
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_db():
+    """
+    Única dependencia de sesión de la API: la sesión se cierra (y su conexión vuelve al pool)
+    al terminar la petición, también si ha fallado.
+    """
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+def estado_pools() -> dict:
+    """
+    Conexiones en uso, libres y de overflow de cada pool y cuánto se ha esperado para obtenerlas.
+    """
+    return {
+        "asincrono": PoolAsincronoInstrumentado.estadisticas.estado(async_engine.sync_engine.pool),
+        "sincrono": PoolInstrumentado.estadisticas.estado(engine.pool),
+        "configuracion": OPCIONES_POOL,
+    }
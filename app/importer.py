@@ -0,0 +1,247 @@
+"""
+Importación masiva de feedbacks históricos desde CSV o JSONL con COPY (requiere PostgreSQL).
+
+Lee el fichero en streaming y carga cada lote con `COPY ... FROM STDIN`, sin pasar por el ORM.
+Columnas obligatorias: autor y comentario. Opcionales: fecha (ISO 8601), sentimiento, etiquetas
+(lista en JSONL, texto separado por comas en CSV), resumen y urgencia. Las filas sin sentimiento
+se guardan con estado_analisis="pendiente" y las completan después los trabajadores de enriquecimiento.
+Se lanza desde la API (POST /feedback/importar) o como proceso independiente:
+
+    python -m app.importer historico.csv --lote 50000
+"""
+import io
+import os
+import csv
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from typing import IO, Iterable, Iterator, NamedTuple, Optional
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.session import engine
+from app.ai.openai_client import URGENCIAS_VALIDAS
+from app.analytics.estadisticas_service import TIPOS_SENTIMIENTO
+from app.analytics.agregados import instantanea, actualizar_agregados_sincrono
+from app.services.feedback_service import normalizar_etiqueta
+from app.utils.cache import version_datos
+
+load_dotenv()
+IMPORTACION_TAMANO_LOTE = int(os.getenv("IMPORTACION_TAMANO_LOTE", 50000))  # filas por COPY y por transacción
+FORMATOS_IMPORTACION = ("csv", "jsonl")
+MAX_ERRORES_INFORMADOS = 20  # errores de filas que se devuelven en el informe
+
+# Columnas que se escriben con COPY, en el orden de FilaImportada (más id y analisis_intentos)
+COLUMNAS_COPY = "id, autor, comentario, fecha, sentimiento, etiquetas, resumen, urgencia, estado_analisis, analisis_intentos"
+
+
+class FilaImportada(NamedTuple):
+    autor: str
+    comentario: str
+    fecha: datetime
+    sentimiento: Optional[str]
+    etiquetas: list[str]
+    resumen: Optional[str]
+    urgencia: Optional[str]
+    estado_analisis: str
+
+
+def _texto(valor) -> Optional[str]:
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _leer_fecha(valor, fecha_por_defecto: datetime) -> datetime:
+    valor = _texto(valor)
+    if not valor:
+        return fecha_por_defecto
+    try:
+        fecha = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Fecha no válida: {valor}")
+    if fecha.tzinfo:
+        # La columna guarda fechas sin zona horaria, en UTC
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def _leer_etiquetas(valor) -> list[str]:
+    if not valor:
+        return []
+    if isinstance(valor, str):
+        valor = valor.split(",")
+    return [str(e).strip() for e in valor if str(e).strip()]
+
+
+def normalizar_fila(datos: dict, fecha_por_defecto: datetime) -> FilaImportada:
+    """
+    Valida una fila leída del fichero. Lanza ValueError si falta autor o comentario
+    o si fecha, sentimiento o urgencia no son válidos.
+    """
+    autor = _texto(datos.get("autor"))
+    comentario = _texto(datos.get("comentario"))
+    if not autor or not comentario:
+        raise ValueError("Faltan autor o comentario")
+
+    sentimiento = _texto(datos.get("sentimiento"))
+    if sentimiento:
+        sentimiento = sentimiento.lower()
+        if sentimiento not in TIPOS_SENTIMIENTO:
+            raise ValueError(f"Sentimiento no válido: {sentimiento}")
+
+    urgencia = _texto(datos.get("urgencia"))
+    if urgencia:
+        urgencia = urgencia.lower()
+        if urgencia not in URGENCIAS_VALIDAS:
+            raise ValueError(f"Urgencia no válida: {urgencia}")
+
+    return FilaImportada(
+        autor=autor,
+        comentario=comentario,
+        fecha=_leer_fecha(datos.get("fecha"), fecha_por_defecto),
+        sentimiento=sentimiento,
+        etiquetas=_leer_etiquetas(datos.get("etiquetas")),
+        resumen=_texto(datos.get("resumen")),
+        urgencia=urgencia,
+        # Sin sentimiento precalculado, el análisis lo harán los trabajadores en segundo plano
+        estado_analisis="completado" if sentimiento else "pendiente",
+    )
+
+
+def leer_filas(fichero: IO[str], formato: str) -> Iterator[dict]:
+    """
+    Recorre las filas de un fichero de texto CSV (con cabecera) o JSONL sin cargarlo entero en memoria.
+    """
+    if formato == "csv":
+        yield from csv.DictReader(fichero)
+    elif formato == "jsonl":
+        for linea in fichero:
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+            except json.JSONDecodeError:
+                datos = None
+            # Las líneas que no son un objeto se rechazan al normalizarlas
+            yield datos if isinstance(datos, dict) else {}
+    else:
+        raise ValueError(f"Formato no soportado. Opciones: {list(FORMATOS_IMPORTACION)}")
+
+
+def detectar_formato(ruta: str) -> str:
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    raise ValueError(f"No se reconoce el formato de {ruta}; indícalo con --formato")
+
+
+def _copiar(conexion: Connection, tabla_y_columnas: str, filas: Iterable[tuple]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(filas)
+    buffer.seek(0)
+    with conexion.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {tabla_y_columnas} FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _cargar_lote(motor: Engine, lote: list[FilaImportada]) -> None:
+    """
+    Inserta el lote con COPY en una única transacción: feedbacks, sus etiquetas y los agregados.
+    """
+    with motor.begin() as conexion:
+        # Los ids se reservan de la secuencia antes del COPY para poder escribir feedback_tag sin leerlos después
+        ids = conexion.execute(
+            text("SELECT nextval(pg_get_serial_sequence('feedback', 'id')) FROM generate_series(1, :n)"),
+            {"n": len(lote)}
+        ).scalars().all()
+
+        _copiar(conexion, f"feedback ({COLUMNAS_COPY})", (
+            (feedback_id, fila.autor, fila.comentario, fila.fecha.isoformat(), fila.sentimiento,
+             ",".join(fila.etiquetas), fila.resumen, fila.urgencia, fila.estado_analisis, 0)
+            for feedback_id, fila in zip(ids, lote)
+        ))
+        _copiar(conexion, "feedback_tag (feedback_id, etiqueta)", (
+            (feedback_id, etiqueta)
+            for feedback_id, fila in zip(ids, lote)
+            for etiqueta in dict.fromkeys(normalizar_etiqueta(e) for e in fila.etiquetas)
+            if etiqueta
+        ))
+        actualizar_agregados_sincrono(conexion, despues=[instantanea(fila) for fila in lote])
+
+
+def importar_filas(
+    filas: Iterable[dict],
+    tamano_lote: int = IMPORTACION_TAMANO_LOTE,
+    motor: Engine = engine
+) -> dict:
+    """
+    Normaliza las filas y las carga con COPY en lotes de `tamano_lote`, cada uno en su transacción.
+    Las filas no válidas se descartan y se informa de ellas sin detener la importación.
+    Devuelve cuántas filas se han importado, cuántas quedan pendientes de análisis y la velocidad.
+    """
+    if motor.dialect.name != "postgresql":
+        raise ValueError("La importación con COPY requiere PostgreSQL")
+
+    inicio = time.perf_counter()
+    fecha_actual = datetime.now()
+    importadas = pendientes = rechazadas = 0
+    errores = []
+    lote: list[FilaImportada] = []
+
+    def cargar():
+        nonlocal importadas, pendientes
+        _cargar_lote(motor, lote)
+        version_datos.incrementar()
+        importadas += len(lote)
+        pendientes += sum(1 for fila in lote if fila.estado_analisis == "pendiente")
+        lote.clear()
+        print(f"📥 {importadas} feedbacks importados ({importadas / (time.perf_counter() - inicio):.0f} filas/s)")
+
+    for numero, datos in enumerate(filas, start=1):
+        try:
+            lote.append(normalizar_fila(datos, fecha_actual))
+        except ValueError as e:
+            rechazadas += 1
+            if len(errores) < MAX_ERRORES_INFORMADOS:
+                errores.append({"fila": numero, "error": str(e)})
+            continue
+        if len(lote) >= tamano_lote:
+            cargar()
+    if lote:
+        cargar()
+
+    duracion = time.perf_counter() - inicio
+    return {
+        "importadas": importadas,
+        "pendientes_analisis": pendientes,
+        "rechazadas": rechazadas,
+        "errores": errores,
+        "duracion_segundos": round(duracion, 3),
+        "filas_por_segundo": round(importadas / duracion, 2) if duracion else 0.0,
+    }
+
+
+def importar_fichero(fichero: IO[str], formato: str, tamano_lote: int = IMPORTACION_TAMANO_LOTE) -> dict:
+    return importar_filas(leer_filas(fichero, formato), tamano_lote)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa feedbacks históricos desde CSV o JSONL con COPY")
+    parser.add_argument("fichero", help="Ruta del fichero .csv o .jsonl")
+    parser.add_argument("--formato", choices=FORMATOS_IMPORTACION, help="Por defecto, según la extensión")
+    parser.add_argument("--lote", type=int, default=IMPORTACION_TAMANO_LOTE, help="Filas por COPY")
+    args = parser.parse_args()
+
+    with open(args.fichero, encoding="utf-8", newline="") as fichero:
+        informe = importar_fichero(fichero, args.formato or detectar_formato(args.fichero), args.lote)
+
+    print(f"✅ {informe['importadas']} feedbacks importados en {informe['duracion_segundos']} s "
+          f"({informe['filas_por_segundo']} filas/s), {informe['pendientes_analisis']} pendientes de análisis, "
+          f"{informe['rechazadas']} rechazados")
+    for error in informe["errores"]:
+        print(f"   fila {error['fila']}: {error['error']}")
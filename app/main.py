@@ -1,17 +1,43 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api import feedback, metrics, auth
 from app.db.init_db import init_db
+from app.db.session import engine, async_engine
+from app.utils.telemetria import MiddlewareTelemetria, instrumentar_motor
+from app.worker import iniciar_trabajadores
 
 # deactivate
 # .venv\Scripts\activate
 # uvicorn app.main:app --reload
 
 
+# Trabajadores de enriquecimiento dentro del proceso de la API (0 = se ejecutan aparte con python -m app.worker)
+ENRIQUECIMIENTO_WORKERS_EN_PROCESO = int(os.getenv("ENRIQUECIMIENTO_WORKERS_EN_PROCESO", 0))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    trabajadores = iniciar_trabajadores(ENRIQUECIMIENTO_WORKERS_EN_PROCESO)
+    yield
+    for tarea in trabajadores:
+        tarea.cancel()
+    await asyncio.gather(*trabajadores, return_exceptions=True)
+    await async_engine.dispose()  # cierra las conexiones del pool al apagar
+
+
 app = FastAPI(
     title="Gestor de Feedback Inteligente",
-    description="API para recibir, analizar y consultar feedback con IA."
+    description="API para recibir, analizar y consultar feedback con IA.",
+    lifespan=lifespan
 )
 
+# Latencia, códigos de estado y consultas SQL por ruta (GET /metrics/prometheus)
+app.add_middleware(MiddlewareTelemetria)
+instrumentar_motor(engine)
+instrumentar_motor(async_engine.sync_engine)
+
 app.include_router(feedback.router, prefix="/feedback", tags=["Feedback"])
 app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from app.db.base_class import Base
+
+
+class BackfillCheckpoint(Base):
+    """
+    Progreso de un backfill (relleno masivo de un campo con IA) para poder reanudarlo.
+    """
+    __tablename__ = "backfill_checkpoint"
+
+    campo = Column(String, primary_key=True)  # urgencia o sugerencia
+    ultimo_id = Column(Integer, nullable=False, default=0)  # último feedback procesado (orden por id)
+    procesados = Column(Integer, nullable=False, default=0)
+    errores = Column(Integer, nullable=False, default=0)
+    estado = Column(String, nullable=False, default="en_curso")  # en_curso, completado o detenido
+    iniciado = Column(DateTime, default=datetime.utcnow)
+    actualizado = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
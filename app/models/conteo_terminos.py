@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Date, Index
+from app.db.base_class import Base
+
+
+class ConteoTermino(Base):
+    """
+    Veces que aparece cada término en los comentarios de un día con un sentimiento.
+    Se mantiene al guardar, modificar o borrar feedbacks (app/analytics/agregados.py)
+    y sirve /metrics/palabras_frecuentes sin leer los comentarios.
+    """
+    __tablename__ = "term_counts"
+    # Las consultas filtran por rango de días (y a veces sentimiento) y agrupan por término
+    __table_args__ = (Index("ix_term_counts_dia_sentimiento", "dia", "sentimiento", "termino", "cantidad"),)
+
+    termino = Column(String, primary_key=True)
+    dia = Column(Date, primary_key=True)
+    sentimiento = Column(String, primary_key=True)  # "" mientras el análisis está pendiente
+    cantidad = Column(Integer, nullable=False, default=0)
@@ -1,17 +1,41 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Index, func
+from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base_class import Base  # ← Importas el Base global
+from app.models.feedback_tag import FeedbackTag
 
 class Feedback(Base):
     __tablename__ = "feedback"
+    # Índices de los filtros de listado y métricas (en bases existentes los crea la migración 2)
+    __table_args__ = (
+        Index("ix_feedback_fecha_id", "fecha", "id"),
+        Index("ix_feedback_autor_fecha", "autor", "fecha"),
+        Index("ix_feedback_sentimiento_fecha", "sentimiento", "fecha"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     autor = Column(String, nullable=False)
     comentario = Column(String, nullable=False)
     fecha = Column(DateTime, default=datetime.utcnow)
-    sentimiento = Column(String, nullable=False)
+    sentimiento = Column(String, nullable=True)  # NULL mientras el análisis está pendiente
     etiquetas = Column(String)
     resumen = Column(String)
     respuesta = Column(String, nullable=True)
     sugerencia = Column(String, nullable=True)
     urgencia = Column(String, nullable=True)
+    toxico = Column(Boolean, nullable=True)
+    razon_toxicidad = Column(String, nullable=True)
+    nivel_analisis = Column(String, nullable=True)  # "local" (clasificador léxico) o "ia"
+    confianza_local = Column(Float, nullable=True)  # confianza del clasificador local
+    latencia_analisis_ms = Column(Float, nullable=True)
+    estado_analisis = Column(String, nullable=False, default="completado")  # pendiente, procesando, completado o error
+    analisis_reclamado = Column(DateTime, nullable=True)  # cuándo lo reclamó un trabajador
+    analisis_intentos = Column(Integer, nullable=False, default=0)
+
+    # Copia normalizada de `etiquetas` para filtrar y contar por etiqueta (tabla feedback_tag).
+    # La columna de texto se mantiene para devolver las etiquetas sin consultas extra.
+    tags = relationship(FeedbackTag, cascade="all, delete-orphan", passive_deletes=True)
+
+
+# Índice de expresión para ordenar por longitud del comentario (/metrics/feedback_extremos)
+Index("ix_feedback_longitud_comentario", func.length(Feedback.comentario))
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from app.db.base_class import Base
+
+
+class FeedbackTag(Base):
+    """
+    Una fila por cada etiqueta de cada feedback, normalizada en minúsculas.
+    Permite filtrar por etiqueta y contar etiquetas con índices en lugar de buscar en el texto.
+    """
+    __tablename__ = "feedback_tag"
+    # La clave primaria sirve para "etiquetas de un feedback"; este índice, para "feedbacks con la etiqueta X"
+    __table_args__ = (Index("ix_feedback_tag_etiqueta", "etiqueta", "feedback_id"),)
+
+    feedback_id = Column(Integer, ForeignKey("feedback.id", ondelete="CASCADE"), primary_key=True)
+    etiqueta = Column(String, primary_key=True)
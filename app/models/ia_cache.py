@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, Text, DateTime
+from datetime import datetime
+from app.db.base_class import Base
+
+
+class AnalisisIACache(Base):
+    """
+    Nivel persistente de la caché de resultados de IA.
+    La clave es un hash del comentario normalizado, la operación, la versión del prompt y el modelo.
+    """
+    __tablename__ = "ia_cache"
+
+    clave = Column(String(64), primary_key=True)
+    operacion = Column(String, nullable=False)
+    modelo = Column(String, nullable=False)
+    version_prompt = Column(String, nullable=False)
+    resultado = Column(Text, nullable=False)  # JSON serializado
+    fecha = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Date, Index
+from app.db.base_class import Base
+
+
+class ResumenDiario(Base):
+    """
+    Número de feedbacks y longitud total de sus comentarios por día, autor, sentimiento y urgencia.
+    Se mantiene al guardar, modificar o borrar feedbacks (app/analytics/agregados.py) y sirve
+    las métricas por fecha y por usuario con un coste proporcional a los días, no a las filas.
+    """
+    __tablename__ = "feedback_daily_rollup"
+    __table_args__ = (Index("ix_feedback_daily_rollup_autor_dia", "autor", "dia"),)
+
+    dia = Column(Date, primary_key=True)
+    autor = Column(String, primary_key=True)
+    sentimiento = Column(String, primary_key=True)  # "" mientras el análisis está pendiente
+    urgencia = Column(String, primary_key=True)  # "" si no está clasificada
+    cantidad = Column(Integer, nullable=False, default=0)
+    longitud_total = Column(BigInteger, nullable=False, default=0)  # suma de len(comentario)
@@ -12,6 +12,20 @@ class FeedbackOut(BaseModel):
     etiquetas: List[datetime]
     resumen: str
 
+class FeedbackBulkOut(BaseModel):
+    creados: int
+    ids: List[int]
+    ids_pendientes: List[int]  # guardados sin analizar: la IA no devolvió un análisis válido
+    duracion_segundos: float
+    filas_por_segundo: float
+    tokens_totales: int
+    tokens_por_fila: float
+    llamadas_ia: int
+    reintentos: int
+    fallidos: int
+    desde_cache: int
+    resueltos_localmente: int
+
 class FeedbackUpdate(BaseModel):
     autor: Optional[str] = None
     comentario: Optional[str] = None
@@ -22,24 +36,68 @@ class FeedbackUpdate(BaseModel):
     respuesta: Optional[str] = None
     sugerencia: Optional[str] = None
     urgencia: Optional[str] = None
+    toxico: Optional[bool] = None
+    razon_toxicidad: Optional[str] = None
 
 class FeedbackDB(BaseModel):
     id: int
     autor: str
     comentario: str
     fecha: datetime
-    sentimiento: str
+    sentimiento: Optional[str]  # None mientras el análisis está pendiente
     etiquetas: List[str]
-    resumen: str
+    resumen: Optional[str]
     respuesta: Optional[str]
     sugerencia: Optional[str]
     urgencia: Optional[str]
+    toxico: Optional[bool] = None
+    razon_toxicidad: Optional[str] = None
+    nivel_analisis: Optional[str] = None
+    estado_analisis: str
 
     @field_validator("etiquetas", mode="before")
     def convertir_etiquetas(cls, v):
+        if v is None:
+            return []
         if isinstance(v, str):
-            return [e.strip() for e in v.split(",")]
+            return [e.strip() for e in v.split(",") if e.strip()]
         return v
 
   
-    model_config = ConfigDict(from_attributes=True)# Esto es necesario para usar objetos SQLAlchemy como respuesta
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)# Esto es necesario para usar objetos SQLAlchemy como respuesta
+
+class FeedbackParcial(BaseModel):
+    # Mismos campos que FeedbackDB, todos opcionales: solo se devuelven los pedidos en ?fields=
+    id: Optional[int] = None
+    autor: Optional[str] = None
+    comentario: Optional[str] = None
+    fecha: Optional[datetime] = None
+    sentimiento: Optional[str] = None
+    etiquetas: Optional[List[str]] = None
+    resumen: Optional[str] = None
+    respuesta: Optional[str] = None
+    sugerencia: Optional[str] = None
+    urgencia: Optional[str] = None
+    toxico: Optional[bool] = None
+    razon_toxicidad: Optional[str] = None
+    nivel_analisis: Optional[str] = None
+    estado_analisis: Optional[str] = None
+
+    @field_validator("etiquetas", mode="before")
+    def convertir_etiquetas(cls, v):
+        if v is None:
+            return []
+        if isinstance(v, str):
+            return [e.strip() for e in v.split(",") if e.strip()]
+        return v
+
+class FeedbackPagina(BaseModel):
+    items: List[FeedbackParcial]
+    next_cursor: Optional[str] = None  # None en la última página
+
+class EstadoAnalisisOut(BaseModel):
+    id: int
+    estado_analisis: str
+    analisis_intentos: int
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,21 +1,79 @@
-from sqlalchemy.orm import Session
+import os
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
 from app.schemas.user import UserCreate
-from app.utils.security import hash_password, verify_password
+from app.utils.security import hash_password_async, verify_and_update_password_async
+from app.utils.cache import CacheLRU
 
+load_dotenv()
+# Caché email -> usuario de get_current_user: evita leer `users` en cada petición autenticada.
+# Los cambios hechos en este proceso la invalidan al momento; los de otros procesos se ven tras el TTL.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))  # segundos; 0 desactiva la caché
+AUTH_CACHE_MAX_ENTRADAS = int(os.getenv("AUTH_CACHE_MAX_ENTRADAS", 10000))
+cache_usuarios = CacheLRU(AUTH_CACHE_MAX_ENTRADAS, ttl=AUTH_CACHE_TTL)
 
-def create_user(db: Session, user_in : UserCreate):
-    hashed = hash_password(user_in.password)
+
+class UsuarioAutenticado(NamedTuple):
+    """
+    Datos del usuario que necesitan los endpoints autenticados. No está ligado a ninguna sesión,
+    así que se puede guardar en caché o construir a partir del token.
+    """
+    id: int
+    email: str
+    role: str
+
+
+def invalidar_usuario(email: str) -> None:
+    """
+    Descarta el usuario de la caché. Debe llamarse tras cualquier cambio en la tabla users.
+    """
+    cache_usuarios.invalidar(email)
+
+
+async def obtener_usuario_autenticado(db: AsyncSession, email: str) -> Optional[UsuarioAutenticado]:
+    if AUTH_CACHE_TTL > 0:
+        usuario = cache_usuarios.obtener(email)
+        if usuario is not None:
+            return usuario
+
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+    if not user:
+        return None  # los usuarios que no existen no se guardan: un registro posterior se ve al momento
+
+    usuario = UsuarioAutenticado(id=user.id, email=user.email, role=user.role)
+    if AUTH_CACHE_TTL > 0:
+        cache_usuarios.guardar(email, usuario)
+    return usuario
+
+
+async def create_user(db: AsyncSession, user_in : UserCreate):
+    hashed = await hash_password_async(user_in.password)
 
     db_user = User(email=user_in.email, hashed_password=hashed)
 
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    invalidar_usuario(db_user.email)
+    await db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+    if not user:
         return None
-    return user
\ No newline at end of file
+
+    # Se libera la conexión mientras bcrypt calcula
+    await db.commit()
+    valida, hash_nuevo = await verify_and_update_password_async(password, user.hashed_password)
+    if not valida:
+        return None
+
+    if hash_nuevo:
+        # Hash con un coste distinto de BCRYPT_ROUNDS: se guarda recalculado con el actual
+        user.hashed_password = hash_nuevo
+        await db.commit()
+        invalidar_usuario(user.email)
+    return user
@@ -1,91 +1,420 @@
-from typing import List, Optional
-from datetime import datetime, time, date
-from sqlalchemy.orm import Session
+import json
+import base64
+import binascii
+from typing import List, Optional, Iterator
+from datetime import datetime, time, date, timedelta
+from sqlalchemy import func, or_, and_, tuple_, select
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.feedback import Feedback
+from app.models.feedback_tag import FeedbackTag
 from app.ai.openai_client import (
     generar_respuesta_educada,
     generar_sugerencia_para_comentario,
     analizar_toxicidad_comentario,
     clasificar_nivel_urgencia,
-    detectar_cambio_de_sentimiento
+    detectar_cambio_de_sentimiento,
+    enriquecer_feedback_completo,
+    es_analisis_por_defecto
 )
-from app.db.session import SessionLocal
+from app.analytics.agregados import instantanea, actualizar_agregados
+from app.utils.cache import version_datos
 
 # --- CRUD BÁSICO ---
 
-def guardar_feedback(db: Session, autor: str, comentario: str, fecha: datetime, sentimiento: str, etiquetas: list[str], resumen: str) -> Feedback:
+# Campos que rellena el enriquecimiento completo además del análisis básico
+CAMPOS_ENRIQUECIMIENTO = ("toxico", "razon_toxicidad", "urgencia", "sugerencia", "respuesta")
+# Campos que indican qué nivel (clasificador local o IA) resolvió el análisis
+CAMPOS_NIVEL_ANALISIS = ("nivel_analisis", "confianza_local", "latencia_analisis_ms")
+# Campos que se pueden pedir en la proyección de los listados (?fields=)
+CAMPOS_PROYECTABLES = (
+    "id", "autor", "comentario", "fecha", "sentimiento", "etiquetas", "resumen", "respuesta",
+    "sugerencia", "urgencia", "toxico", "razon_toxicidad", "nivel_analisis", "estado_analisis"
+)
+LIMITE_PAGINA_POR_DEFECTO = 50
+LIMITE_PAGINA_MAXIMO = 500
+EXPORTACION_TAMANO_BLOQUE = 1000  # filas que se traen del cursor del servidor de cada vez
+
+
+def normalizar_etiqueta(etiqueta: str) -> str:
+    return etiqueta.strip().lower()
+
+
+def asignar_etiquetas(feedback: Feedback, etiquetas: list[str]) -> None:
+    """
+    Guarda las etiquetas en la columna de texto y en la tabla feedback_tag.
+    Todas las escrituras de etiquetas deben pasar por aquí para que ambas coincidan.
+    Si el feedback ya existe, `tags` tiene que venir cargado (ver _obtener_feedback).
+    """
+    feedback.etiquetas = ",".join(etiquetas)
+    normalizadas = dict.fromkeys(normalizar_etiqueta(e) for e in etiquetas)
+    feedback.tags = [FeedbackTag(etiqueta=e) for e in normalizadas if e]
+
+
+async def _obtener_feedback(
+    db: AsyncSession,
+    feedback_id: int,
+    con_etiquetas: bool = False,
+    bloquear: bool = False
+) -> Optional[Feedback]:
+    """
+    Lee un feedback por su id. Con `bloquear`, la fila queda bloqueada (SELECT ... FOR UPDATE) hasta el
+    commit y se recargan sus atributos aunque ya estuviera en la sesión: hay que usarlo siempre que se
+    tome la instantánea para actualizar_agregados, o dos escrituras simultáneas restarían el mismo
+    estado anterior. En SQLite FOR UPDATE no tiene efecto.
+    """
+    query = select(Feedback).where(Feedback.id == feedback_id)
+    if con_etiquetas:
+        # Reemplazar la colección obliga a leer la anterior; en una sesión asíncrona no puede ser una carga perezosa
+        query = query.options(selectinload(Feedback.tags))
+    if bloquear:
+        query = query.with_for_update().execution_options(populate_existing=True)
+    return (await db.execute(query)).scalar_one_or_none()
+
+
+async def _liberar_conexion(db: AsyncSession) -> None:
+    """
+    Cierra la transacción de lectura antes de esperar a la IA, para que la conexión vuelva al pool
+    durante la llamada. Los objetos leídos siguen cargados (expire_on_commit=False).
+    """
+    await db.commit()
+
+
+async def guardar_feedback(
+    db: AsyncSession,
+    autor: str,
+    comentario: str,
+    fecha: datetime,
+    sentimiento: str,
+    etiquetas: list[str],
+    resumen: str,
+    toxico: Optional[bool] = None,
+    razon_toxicidad: Optional[str] = None,
+    urgencia: Optional[str] = None,
+    sugerencia: Optional[str] = None,
+    respuesta: Optional[str] = None,
+    nivel_analisis: Optional[str] = None,
+    confianza_local: Optional[float] = None,
+    latencia_analisis_ms: Optional[float] = None
+) -> Feedback:
     """
     Guarda un nuevo feedback con análisis IA.
+    Los campos del enriquecimiento completo (toxicidad, urgencia, sugerencia y respuesta)
+    y los del nivel de análisis son opcionales.
     """
     nuevo_feedback = Feedback(
         autor=autor,
         comentario=comentario,
         fecha=fecha,
         sentimiento=sentimiento,
-        etiquetas=",".join(etiquetas),
-        resumen=resumen
+        resumen=resumen,
+        toxico=toxico,
+        razon_toxicidad=razon_toxicidad,
+        urgencia=urgencia,
+        sugerencia=sugerencia,
+        respuesta=respuesta,
+        nivel_analisis=nivel_analisis,
+        confianza_local=confianza_local,
+        latencia_analisis_ms=latencia_analisis_ms
     )
+    asignar_etiquetas(nuevo_feedback, etiquetas)
     db.add(nuevo_feedback)
-    db.commit()
-    db.refresh(nuevo_feedback)
+    await db.flush()
+    await actualizar_agregados(db, despues=[instantanea(nuevo_feedback)])
+    await db.commit()
+    version_datos.incrementar()
+    await db.refresh(nuevo_feedback)
     return nuevo_feedback
 
 
-def obtener_todos_los_feedbacks(db: Session) -> List[Feedback]:
+async def guardar_feedback_pendiente(db: AsyncSession, autor: str, comentario: str, fecha: datetime) -> Feedback:
     """
-    Devuelve todos los feedbacks ordenados por fecha descendente.
+    Guarda un nuevo feedback sin analizar. Los trabajadores de enriquecimiento completarán
+    sentimiento, etiquetas y resumen en segundo plano.
     """
-    return db.query(Feedback).order_by(Feedback.fecha.desc()).all()
+    nuevo_feedback = Feedback(
+        autor=autor,
+        comentario=comentario,
+        fecha=fecha,
+        estado_analisis="pendiente"
+    )
+    db.add(nuevo_feedback)
+    await db.flush()
+    await actualizar_agregados(db, despues=[instantanea(nuevo_feedback)])
+    await db.commit()
+    version_datos.incrementar()
+    await db.refresh(nuevo_feedback)
+    return nuevo_feedback
 
 
-def buscar_feedback_por_id(feedback_id: int, db: Session) -> Feedback:
+async def guardar_feedbacks_en_lote(db: AsyncSession, filas: list[dict]) -> list[int]:
+    """
+    Guarda muchos feedbacks en una única transacción y devuelve sus IDs.
+    Cada fila contiene autor, comentario, fecha, sentimiento, etiquetas (lista) y resumen,
+    y opcionalmente los campos del nivel de análisis. Una fila sin sentimiento se guarda
+    pendiente de análisis, para que la completen los trabajadores de enriquecimiento.
+    """
+    nuevos_feedbacks = []
+    for fila in filas:
+        if fila.get("sentimiento") is None:
+            feedback = Feedback(autor=fila["autor"], comentario=fila["comentario"], fecha=fila["fecha"], estado_analisis="pendiente")
+        else:
+            feedback = Feedback(
+                autor=fila["autor"],
+                comentario=fila["comentario"],
+                fecha=fila["fecha"],
+                sentimiento=fila["sentimiento"],
+                resumen=fila["resumen"],
+                **{campo: fila.get(campo) for campo in CAMPOS_NIVEL_ANALISIS}
+            )
+            asignar_etiquetas(feedback, fila["etiquetas"])
+        nuevos_feedbacks.append(feedback)
+    db.add_all(nuevos_feedbacks)
+    await db.flush()  # Los INSERT se envían agrupados y devuelven los IDs sin consultas extra
+    ids = [fb.id for fb in nuevos_feedbacks]
+    await actualizar_agregados(db, despues=[instantanea(fb) for fb in nuevos_feedbacks])
+    await db.commit()
+    version_datos.incrementar()
+    return ids
+
+
+async def obtener_todos_los_feedbacks(
+    db: AsyncSession,
+    limite: int = LIMITE_PAGINA_POR_DEFECTO,
+    cursor: Optional[str] = None,
+    campos: Optional[list[str]] = None
+) -> tuple[list[dict], Optional[str]]:
+    """
+    Devuelve una página de feedbacks ordenados por fecha descendente y el cursor de la siguiente.
+    """
+    return await filtrar_feedbacks(db, limite=limite, cursor=cursor, campos=campos)
+
+
+async def buscar_feedback_por_id(feedback_id: int, db: AsyncSession) -> Feedback:
     """
     Busca un feedback por su ID.
     """
-    return db.query(Feedback).filter(Feedback.id == feedback_id).first()
+    return await _obtener_feedback(db, feedback_id)
 
 
-def actualizar_feedback_parcial(feedback_id: int, datos_actualizados: dict) -> Feedback:
+async def actualizar_feedback_parcial(db: AsyncSession, feedback_id: int, datos_actualizados: dict) -> Feedback:
     """
     Actualiza parcialmente un feedback (solo los campos enviados).
     """
-    db = SessionLocal()
-    feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+    feedback = await _obtener_feedback(db, feedback_id, con_etiquetas="etiquetas" in datos_actualizados, bloquear=True)
 
     if not feedback:
         raise ValueError("Feedback no encontrado")
 
+    antes = instantanea(feedback)
     for campo, valor in datos_actualizados.items():
-        if hasattr(feedback, campo) and valor is not None:
+        if campo == "etiquetas" and valor is not None:
+            asignar_etiquetas(feedback, valor)
+        elif hasattr(feedback, campo) and valor is not None:
             setattr(feedback, campo, valor)
 
-    db.commit()
-    db.refresh(feedback)
+    await actualizar_agregados(db, antes=[antes], despues=[instantanea(feedback)])
+    await db.commit()
+    version_datos.incrementar()
+    await db.refresh(feedback)
     return feedback
 
 
-def eliminar_feedback(feedback_id: int) -> None:
+async def eliminar_feedback(db: AsyncSession, feedback_id: int) -> None:
     """
     Elimina un feedback por su ID.
     """
-    db = SessionLocal()
-    feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+    feedback = await _obtener_feedback(db, feedback_id, bloquear=True)
 
     if not feedback:
         raise ValueError("Feedback no encontrado")
 
-    db.delete(feedback)
-    db.commit()
+    await actualizar_agregados(db, antes=[instantanea(feedback)])
+    await db.delete(feedback)
+    await db.commit()
+    version_datos.incrementar()
+
+
+# --- ENRIQUECIMIENTO EN SEGUNDO PLANO ---
+
+async def reclamar_feedbacks_pendientes(db: AsyncSession, limite: int, caducidad_segundos: int) -> List[tuple[int, str]]:
+    """
+    Reclama hasta `limite` feedbacks pendientes de análisis y los marca como "procesando".
+    Usa SELECT ... FOR UPDATE SKIP LOCKED para que varios trabajadores no reclamen la misma fila.
+    También recupera las filas que un trabajador caído dejó en "procesando" hace más de `caducidad_segundos`.
+    Devuelve una lista de tuplas (id, comentario).
+    """
+    ahora = datetime.utcnow()
+    reclamo_caducado = ahora - timedelta(seconds=caducidad_segundos)
+
+    feedbacks = (await db.execute(
+        select(Feedback)
+        .where(or_(
+            Feedback.estado_analisis == "pendiente",
+            and_(Feedback.estado_analisis == "procesando", Feedback.analisis_reclamado < reclamo_caducado)
+        ))
+        .order_by(Feedback.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    )).scalars().all()
+
+    for feedback in feedbacks:
+        feedback.estado_analisis = "procesando"
+        feedback.analisis_reclamado = ahora
+        feedback.analisis_intentos += 1
+
+    trabajos = [(feedback.id, feedback.comentario) for feedback in feedbacks]
+    await db.commit()
+    return trabajos
+
+
+async def completar_analisis_feedback(db: AsyncSession, feedback_id: int, analisis: dict) -> None:
+    """
+    Guarda el resultado del análisis IA de un feedback reclamado y lo marca como completado.
+    Si el resultado viene del enriquecimiento completo, guarda también el resto de campos.
+    Lanza ValueError si es el análisis por defecto: ese feedback no se ha llegado a analizar.
+    """
+    if es_analisis_por_defecto(analisis):
+        raise ValueError("El análisis por defecto no completa un feedback")
+
+    feedback = await _obtener_feedback(db, feedback_id, con_etiquetas=True, bloquear=True)
+    if not feedback:
+        return
+
+    antes = instantanea(feedback)
+    feedback.sentimiento = analisis["sentimiento"]
+    asignar_etiquetas(feedback, analisis["etiquetas"])
+    feedback.resumen = analisis["resumen"]
+    for campo in CAMPOS_ENRIQUECIMIENTO + CAMPOS_NIVEL_ANALISIS:
+        if analisis.get(campo) is not None:
+            setattr(feedback, campo, analisis[campo])
+    feedback.nivel_analisis = analisis.get("nivel_analisis", "ia")
+    feedback.estado_analisis = "completado"
+    await actualizar_agregados(db, antes=[antes], despues=[instantanea(feedback)])
+    await db.commit()
+    version_datos.incrementar()
+
+
+async def marcar_analisis_fallido(db: AsyncSession, feedback_id: int, max_intentos: int) -> None:
+    """
+    Devuelve a la cola un feedback cuyo análisis ha fallado, o lo marca como "error"
+    si ya ha agotado `max_intentos`.
+    """
+    feedback = await _obtener_feedback(db, feedback_id)
+    if not feedback:
+        return
+
+    feedback.estado_analisis = "error" if feedback.analisis_intentos >= max_intentos else "pendiente"
+    await db.commit()
+
+
+async def contar_feedbacks_por_estado(db: AsyncSession) -> dict:
+    """
+    Cuenta cuántos feedbacks hay en cada estado de análisis.
+    """
+    resultados = await db.execute(
+        select(Feedback.estado_analisis, func.count(Feedback.id))
+        .group_by(Feedback.estado_analisis)
+    )
+    return {estado: cantidad for estado, cantidad in resultados}
+
+
+# --- BACKFILL ---
+
+async def obtener_feedbacks_sin_campo(db: AsyncSession, campo: str, desde_id: int, limite: int) -> List[tuple[int, str]]:
+    """
+    Devuelve hasta `limite` feedbacks con `campo` vacío y id mayor que `desde_id`, ordenados por id.
+    La paginación por clave (id > último procesado) mantiene el coste constante en cada bloque.
+    """
+    columna = getattr(Feedback, campo)
+    filas = await db.execute(
+        select(Feedback.id, Feedback.comentario)
+        .where(columna.is_(None), Feedback.id > desde_id)
+        .order_by(Feedback.id)
+        .limit(limite)
+    )
+    return filas.all()
+
+
+async def contar_feedbacks_sin_campo(db: AsyncSession, campo: str, desde_id: int = 0) -> int:
+    """
+    Cuenta los feedbacks con `campo` vacío y id mayor que `desde_id`.
+    """
+    columna = getattr(Feedback, campo)
+    return await db.scalar(
+        select(func.count(Feedback.id))
+        .where(columna.is_(None), Feedback.id > desde_id)
+    )
+
+
+async def guardar_valores_campo(db: AsyncSession, campo: str, valores: dict[int, str]) -> None:
+    """
+    Guarda en una sola transacción el valor de `campo` para varios feedbacks ({id: valor}).
+    """
+    if not valores:
+        return
+
+    # Bloqueadas en orden de id, para que dos transacciones con filas en común no se bloqueen mutuamente
+    feedbacks = (await db.execute(
+        select(Feedback)
+        .where(Feedback.id.in_(valores.keys()))
+        .order_by(Feedback.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )).scalars().all()
+    antes = [instantanea(feedback) for feedback in feedbacks]
+    for feedback in feedbacks:
+        setattr(feedback, campo, valores[feedback.id])
+    await actualizar_agregados(db, antes=antes, despues=[instantanea(feedback) for feedback in feedbacks])
+    await db.commit()
+    version_datos.incrementar()
 
 
 # --- FUNCIONES IA ---
 
-def generar_respuesta_para_feedback(feedback_id: int) -> str:
+async def enriquecer_feedback_existente(db: AsyncSession, feedback_id: int) -> Feedback:
+    """
+    Ejecuta el enriquecimiento completo de un feedback en una sola llamada IA
+    y guarda todos los campos a la vez (análisis, toxicidad, urgencia, sugerencia y respuesta).
+    """
+    feedback = await _obtener_feedback(db, feedback_id, con_etiquetas=True)
+
+    if not feedback:
+        raise ValueError("Feedback no encontrado")
+
+    await _liberar_conexion(db)
+    # Sin degradar: si la IA no responde (IANoDisponible) o su respuesta no es válida (RespuestaIAInvalida)
+    # se lanza la excepción sin tocar la fila, en vez de sustituir el análisis que ya tiene por el neutro
+    enriquecimiento = await enriquecer_feedback_completo(feedback.comentario, degradar=False)
+
+    # Se vuelve a leer, ya bloqueada: durante la llamada a la IA otra escritura ha podido cambiarla
+    feedback = await _obtener_feedback(db, feedback_id, con_etiquetas=True, bloquear=True)
+    if not feedback:
+        raise ValueError("Feedback no encontrado")
+
+    antes = instantanea(feedback)
+    feedback.sentimiento = enriquecimiento["sentimiento"]
+    asignar_etiquetas(feedback, enriquecimiento["etiquetas"])
+    feedback.resumen = enriquecimiento["resumen"]
+    feedback.nivel_analisis = "ia"
+    feedback.estado_analisis = "completado"
+    for campo in CAMPOS_ENRIQUECIMIENTO:
+        if enriquecimiento.get(campo) is not None:
+            setattr(feedback, campo, enriquecimiento[campo])
+
+    await actualizar_agregados(db, antes=[antes], despues=[instantanea(feedback)])
+    await db.commit()
+    version_datos.incrementar()
+    await db.refresh(feedback)
+    return feedback
+
+
+async def generar_respuesta_para_feedback(db: AsyncSession, feedback_id: int) -> str:
     """
     Genera y guarda una respuesta empática a un comentario negativo.
+    Si ya hay una respuesta guardada (p. ej. del enriquecimiento completo), la reutiliza.
     """
-    db = SessionLocal()
-    feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+    feedback = await _obtener_feedback(db, feedback_id)
 
     if not feedback:
         raise ValueError("Feedback no encontrado")
@@ -93,20 +422,22 @@ def generar_respuesta_para_feedback(feedback_id: int) -> str:
     if feedback.sentimiento != "negativo":
         raise ValueError("Solo se generan respuestas para comentarios negativos")
 
-    respuesta = generar_respuesta_educada(feedback.comentario)
+    if feedback.respuesta:
+        return feedback.respuesta
+
+    await _liberar_conexion(db)
+    respuesta = await generar_respuesta_educada(feedback.comentario)
     feedback.respuesta = respuesta
-    db.commit()
-    db.refresh(feedback)
+    await db.commit()
 
     return respuesta
 
 
-def generar_sugerencia_para_feedback(feedback_id: int) -> str:
+async def generar_sugerencia_para_feedback(db: AsyncSession, feedback_id: int) -> str:
     """
     Genera y guarda una sugerencia concreta para un feedback.
     """
-    db = SessionLocal()
-    feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+    feedback = await _obtener_feedback(db, feedback_id)
 
     if not feedback:
         raise ValueError("Feedback no encontrado")
@@ -114,56 +445,84 @@ def generar_sugerencia_para_feedback(feedback_id: int) -> str:
     if feedback.sugerencia:
         return feedback.sugerencia
 
-    sugerencia = generar_sugerencia_para_comentario(feedback.comentario)
+    await _liberar_conexion(db)
+    sugerencia = await generar_sugerencia_para_comentario(feedback.comentario)
     feedback.sugerencia = sugerencia
-    db.commit()
-    db.refresh(feedback)
+    await db.commit()
 
     return sugerencia
 
 
-def detectar_feedback_toxico(feedback_id: int) -> dict:
+async def detectar_feedback_toxico(db: AsyncSession, feedback_id: int) -> dict:
     """
-    Analiza si un comentario es tóxico y devuelve el resultado.
+    Analiza si un comentario es tóxico, guarda el resultado y lo devuelve.
+    Si la toxicidad ya está guardada, no vuelve a llamar a la IA.
     """
-    db = SessionLocal()
-    feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+    feedback = await _obtener_feedback(db, feedback_id)
 
     if not feedback:
         raise ValueError("Feedback no encontrado")
 
-    return analizar_toxicidad_comentario(feedback.comentario)
+    if feedback.toxico is not None:
+        return {"toxico": feedback.toxico, "razon": feedback.razon_toxicidad}
 
+    await _liberar_conexion(db)
+    resultado = await analizar_toxicidad_comentario(feedback.comentario)
+    if isinstance(resultado.get("toxico"), bool):
+        feedback.toxico = resultado["toxico"]
+        feedback.razon_toxicidad = resultado.get("razon")
+        await db.commit()
 
-def clasificar_urgencia_feedback(feedback_id: int) -> str:
+    return resultado
+
+
+async def clasificar_urgencia_feedback(db: AsyncSession, feedback_id: int) -> Optional[str]:
     """
     Clasifica la urgencia de un feedback (urgente, normal, baja) y la guarda.
+    Si la urgencia ya está guardada, no vuelve a llamar a la IA.
+    Si la IA no devuelve una urgencia válida, no guarda nada y devuelve None.
     """
-    db = SessionLocal()
-    feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+    feedback = await _obtener_feedback(db, feedback_id)
+
+    if not feedback:
+        raise ValueError("Feedback no encontrado")
+
+    if feedback.urgencia:
+        return feedback.urgencia
 
+    await _liberar_conexion(db)
+    urgencia = await clasificar_nivel_urgencia(feedback.comentario)
+    if urgencia is None:
+        return None
+
+    # Se vuelve a leer, ya bloqueada: durante la llamada a la IA otra escritura ha podido cambiarla
+    feedback = await _obtener_feedback(db, feedback_id, bloquear=True)
     if not feedback:
         raise ValueError("Feedback no encontrado")
 
-    urgencia = clasificar_nivel_urgencia(feedback.comentario)
+    antes = instantanea(feedback)
     feedback.urgencia = urgencia
-    db.commit()
-    db.refresh(feedback)
+    await actualizar_agregados(db, antes=[antes], despues=[instantanea(feedback)])
+    await db.commit()
+    version_datos.incrementar()
 
     return urgencia
 
 
-def detectar_cambios_sentimiento(autor: str, db: Session) -> dict:
+async def detectar_cambios_sentimiento(autor: str, db: AsyncSession) -> dict:
     """
     Analiza los cambios de sentimiento de un autor a lo largo del tiempo.
     """
-    feedbacks = db.query(Feedback).filter(Feedback.autor == autor).order_by(Feedback.fecha.asc()).all()
+    historial = (await db.execute(
+        select(Feedback.sentimiento).where(Feedback.autor == autor).order_by(Feedback.fecha.asc())
+    )).scalars().all()
 
-    if not feedbacks:
+    if not historial:
         raise ValueError("No se encontraron feedbacks para este autor.")
 
-    sentimientos = [f.sentimiento for f in feedbacks]
-    conclusion = detectar_cambio_de_sentimiento(sentimientos)
+    sentimientos = [s for s in historial if s]  # ignora los pendientes de análisis
+    await _liberar_conexion(db)
+    conclusion = await detectar_cambio_de_sentimiento(sentimientos)
 
     return {
         "autor": autor,
@@ -172,19 +531,51 @@ def detectar_cambios_sentimiento(autor: str, db: Session) -> dict:
     }
 
 
-def filtrar_feedbacks(
-    db: Session,
+def codificar_cursor(fecha: datetime, feedback_id: int) -> str:
+    """
+    Cursor opaco con la posición (fecha, id) del último feedback devuelto.
+    """
+    posicion = json.dumps([fecha.isoformat(), feedback_id])
+    return base64.urlsafe_b64encode(posicion.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Inversa de codificar_cursor. Lanza ValueError si el cursor no es válido.
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        fecha, feedback_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return datetime.fromisoformat(fecha), int(feedback_id)
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise ValueError("Cursor no válido") from e
+
+
+def validar_campos(campos: Optional[list[str]]) -> list[str]:
+    """
+    Comprueba los campos pedidos en una proyección y devuelve la lista a seleccionar.
+    Sin campos se seleccionan todos. Lanza ValueError si alguno no existe.
+    """
+    if not campos:
+        return list(CAMPOS_PROYECTABLES)
+    desconocidos = [c for c in campos if c not in CAMPOS_PROYECTABLES]
+    if desconocidos:
+        raise ValueError(f"Campos no válidos: {', '.join(desconocidos)}")
+    return list(dict.fromkeys(campos))
+
+
+def aplicar_filtros_feedback(
+    query,
     autor: Optional[str] = None,
     desde: Optional[date] = None,
     hasta: Optional[date] = None,
     sentimiento: Optional[str] = None,
-    urgencia: Optional[str] = None
-) -> List[Feedback]:
+    urgencia: Optional[str] = None,
+    tag: Optional[str] = None
+):
     """
-    Devuelve feedbacks filtrados según parámetros opcionales.
+    Añade a `query` los filtros opcionales de autor, rango de fechas, sentimiento, urgencia y etiqueta.
     """
-    query = db.query(Feedback)
-
     if autor:
         query = query.filter(Feedback.autor.ilike(f"%{autor}%"))
     if desde:
@@ -197,5 +588,80 @@ def filtrar_feedbacks(
         query = query.filter(Feedback.sentimiento == sentimiento)
     if urgencia:
         query = query.filter(Feedback.urgencia == urgencia)
+    if tag:
+        # EXISTS sobre feedback_tag, resuelto con el índice (etiqueta, feedback_id)
+        query = query.filter(Feedback.tags.any(FeedbackTag.etiqueta == normalizar_etiqueta(tag)))
+    return query
+
+
+async def filtrar_feedbacks(
+    db: AsyncSession,
+    autor: Optional[str] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sentimiento: Optional[str] = None,
+    urgencia: Optional[str] = None,
+    tag: Optional[str] = None,
+    limite: int = LIMITE_PAGINA_POR_DEFECTO,
+    cursor: Optional[str] = None,
+    campos: Optional[list[str]] = None
+) -> tuple[list[dict], Optional[str]]:
+    """
+    Devuelve una página de feedbacks filtrados según parámetros opcionales y el cursor de la siguiente
+    (None si no hay más).
+
+    Pagina por (fecha, id) descendente: cada página continúa justo después de la anterior con
+    una condición sobre el índice, así que el coste no crece al avanzar páginas. Solo se leen
+    de la base de datos las columnas de `campos`.
+    """
+    campos = validar_campos(campos)
+    # fecha e id se leen siempre para poder construir el cursor
+    columnas = list(dict.fromkeys(campos + ["fecha", "id"]))
+    query = aplicar_filtros_feedback(
+        select(*(getattr(Feedback, c) for c in columnas)),
+        autor, desde, hasta, sentimiento, urgencia, tag
+    )
+
+    if cursor:
+        fecha_cursor, id_cursor = decodificar_cursor(cursor)
+        query = query.filter(tuple_(Feedback.fecha, Feedback.id) < tuple_(fecha_cursor, id_cursor))
+
+    # Se pide una fila de más para saber si hay página siguiente sin hacer un COUNT
+    filas = (await db.execute(query.order_by(Feedback.fecha.desc(), Feedback.id.desc()).limit(limite + 1))).all()
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(filas[-1].fecha, filas[-1].id)
+
+    return [{c: getattr(fila, c) for c in campos} for fila in filas], siguiente
+
+
+def iterar_feedbacks(
+    db: Session,
+    autor: Optional[str] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sentimiento: Optional[str] = None,
+    urgencia: Optional[str] = None,
+    tag: Optional[str] = None,
+    campos: Optional[list[str]] = None,
+    tamano_bloque: int = EXPORTACION_TAMANO_BLOQUE
+) -> Iterator[dict]:
+    """
+    Recorre todos los feedbacks que cumplen los filtros (los mismos que filtrar_feedbacks),
+    ordenados por fecha descendente, devolviendo un dict por fila con los `campos` pedidos.
+
+    Usa yield_per, que en PostgreSQL lee con un cursor del servidor: en memoria solo hay
+    `tamano_bloque` filas a la vez, sea cual sea el tamaño del resultado.
+    Es la única función síncrona del servicio: la exportación la recorre desde el threadpool
+    de Starlette, así que no bloquea el event loop.
+    """
+    campos = validar_campos(campos)
+    query = aplicar_filtros_feedback(
+        db.query(*(getattr(Feedback, c) for c in campos)),
+        autor, desde, hasta, sentimiento, urgencia, tag
+    )
+    query = query.order_by(Feedback.fecha.desc(), Feedback.id.desc()).yield_per(tamano_bloque)
 
-    return query.order_by(Feedback.fecha.desc()).all()
+    for fila in query:
+        yield {c: getattr(fila, c) for c in campos}
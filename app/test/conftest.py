@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+from app import worker, backfill
+from app.ai import openai_client
+from app.ai.openai_client import CircuitoIA
+from app.db.session import async_engine
+
+
+def _limite_de_peticiones() -> RateLimitError:
+    respuesta = httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "https://api.openai.com"))
+    return RateLimitError("Rate limit", response=respuesta, body=None)
+
+
+class CompletionsFalsas:
+    """
+    Sustituto de `client.chat.completions`: falla con un 429 las primeras `fallos` llamadas y después
+    responde `contenido` (o lo que devuelva `contenido(prompt)` si es una función).
+    """
+
+    def __init__(self, contenido="ok", fallos: int = 0):
+        self.contenido = contenido
+        self.fallos = fallos
+        self.llamadas = 0
+
+    async def create(self, messages: list, **_):
+        self.llamadas += 1
+        if self.llamadas <= self.fallos:
+            raise _limite_de_peticiones()
+        contenido = self.contenido(messages[-1]["content"]) if callable(self.contenido) else self.contenido
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=contenido))],
+            usage=None,
+        )
+
+
+@pytest.fixture
+def ia_falsa(monkeypatch):
+    """
+    Instala un cliente de OpenAI falso y un circuito nuevo (que se abre tras `umbral` fallos),
+    sin esperas entre reintentos ni peticiones duplicadas. Devuelve las CompletionsFalsas instaladas.
+    """
+    def instalar(contenido="ok", fallos: int = 0, umbral: int = 10) -> CompletionsFalsas:
+        completions = CompletionsFalsas(contenido, fallos)
+        monkeypatch.setattr(openai_client, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        monkeypatch.setattr(openai_client, "OPENAI_ESPERA_BASE", 0.001)
+        monkeypatch.setattr(openai_client, "OPENAI_DUPLICAR_OPERACIONES", set())
+
+        # Los módulos que importan el circuito directamente tienen que ver el mismo
+        circuito = CircuitoIA(umbral, espera=60)
+        for modulo in (openai_client, worker, backfill):
+            monkeypatch.setattr(modulo, "circuito", circuito)
+        return completions
+    return instalar
+
+
+@pytest.fixture
+def ejecutar():
+    """
+    Ejecuta una corrutina en un event loop nuevo y cierra después las conexiones del motor asíncrono,
+    que no pueden pasar de un event loop a otro.
+    """
+    def ejecutar_corrutina(corrutina):
+        async def envoltorio():
+            try:
+                return await corrutina
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(envoltorio())
+    return ejecutar_corrutina
@@ -0,0 +1,82 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.main import app
+from app.db.session import SessionLocal, AsyncSessionLocal, engine
+from app.models.conteo_terminos import ConteoTermino
+from app.models.resumen_diario import ResumenDiario
+from app.analytics.reconstruir import RECONSTRUCCIONES
+from app.services.feedback_service import actualizar_feedback_parcial, guardar_valores_campo
+
+client = TestClient(app)
+
+COLUMNAS = {
+    ConteoTermino: ("termino", "dia", "sentimiento", "cantidad"),
+    ResumenDiario: ("dia", "autor", "sentimiento", "urgencia", "cantidad", "longitud_total"),
+}
+
+
+def _contenido(modelo, columnas: tuple) -> set:
+    with SessionLocal() as db:
+        filas = db.execute(select(*(getattr(modelo, c) for c in columnas)).where(modelo.cantidad > 0)).all()
+    return {tuple(str(valor) for valor in fila) for fila in filas}
+
+
+def _comprobar_contra_reconstruccion():
+    incremental = {modelo: _contenido(modelo, columnas) for modelo, columnas in COLUMNAS.items()}
+
+    for reconstruir in RECONSTRUCCIONES.values():
+        with SessionLocal() as db:
+            assert reconstruir(db) > 0
+            db.commit()
+
+    for modelo, columnas in COLUMNAS.items():
+        assert _contenido(modelo, columnas) == incremental[modelo]
+
+
+def test_reconstruir_agregados_coincide_con_el_mantenimiento_incremental():
+    """
+    Tras crear, editar y borrar feedbacks, reconstruir term_counts y feedback_daily_rollup desde cero
+    da el mismo contenido que el que se ha ido manteniendo en cada escritura.
+    """
+    ids = [
+        client.post("/feedback/", json={"autor": "TestAgregados", "comentario": comentario}).json()["id"]
+        for comentario in ("El ambiente es muy bueno", "El horario es malo y el salario también", "Buen equipo")
+    ]
+    client.post("/feedback/", params={"diferido": "true"}, json={"autor": "TestAgregados", "comentario": "Pendiente de analizar"})
+    client.patch(f"/feedback/{ids[0]}", json={"comentario": "El ambiente ha empeorado", "sentimiento": "negativo", "urgencia": "normal"})
+    client.delete(f"/feedback/{ids[2]}")
+
+    _comprobar_contra_reconstruccion()
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="SQLite no bloquea filas con SELECT ... FOR UPDATE")
+def test_escrituras_simultaneas_no_desajustan_los_agregados(ejecutar):
+    """
+    Dos escrituras a la vez sobre el mismo feedback (el backfill rellenando la urgencia y un PATCH
+    del sentimiento) no restan las dos el mismo estado anterior: los agregados siguen coincidiendo
+    con su reconstrucción.
+    """
+    feedback_id = client.post(
+        "/feedback/", params={"diferido": "true"}, json={"autor": "TestAgregados", "comentario": "Escrituras a la vez"}
+    ).json()["id"]
+
+    async def escenario():
+        async with AsyncSessionLocal() as db_backfill, AsyncSessionLocal() as db_patch:
+            await asyncio.gather(
+                guardar_valores_campo(db_backfill, "urgencia", {feedback_id: "urgente"}),
+                actualizar_feedback_parcial(db_patch, feedback_id, {"sentimiento": "negativo"}),
+            )
+
+    ejecutar(escenario())
+
+    feedback = client.get(f"/feedback/{feedback_id}").json()
+    assert (feedback["urgencia"], feedback["sentimiento"]) == ("urgente", "negativo")
+    _comprobar_contra_reconstruccion()
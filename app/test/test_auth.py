@@ -4,7 +4,13 @@ import uuid
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
 from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from sqlalchemy import select
+
 from app.main import app
+from app.db.session import SessionLocal
+from app.models.user import User
+from app.utils.security import BCRYPT_ROUNDS
 
 client = TestClient(app)
 
@@ -68,3 +74,43 @@ def test_get_current_user():
     assert "id" in data
     assert data["email"] == f"{usuario_test}@mail.com"
     assert "role" in data
+
+
+# 4. CACHÉ DE USUARIOS AUTENTICADOS
+def test_get_current_user_usa_cache():
+    payload = {
+        "email": f"{usuario_test}@mail.com",
+        "password": "123456"
+    }
+    token = client.post("/auth/login", json=payload).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    client.get("/auth/me", headers=headers)
+    antes = client.get("/metrics/auth_cache").json()
+    response = client.get("/auth/me", headers=headers)
+    despues = client.get("/metrics/auth_cache").json()
+
+    # La segunda petición se resuelve sin consultar la tabla users
+    assert response.status_code == 200
+    assert despues["aciertos"] == antes["aciertos"] + 1
+    assert despues["fallos"] == antes["fallos"]
+
+
+# 5. RECÁLCULO DEL HASH AL HACER LOGIN
+def test_login_recalcula_hash_con_otro_coste():
+    email = f"{uuid.uuid4()}@mail.com"
+    client.post("/auth/register", json={"email": email, "password": "123456"})
+
+    # Se guarda un hash con un coste menor que BCRYPT_ROUNDS, como el de una contraseña antigua
+    hash_antiguo = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("123456")
+    with SessionLocal() as db:
+        db.scalars(select(User).where(User.email == email)).one().hashed_password = hash_antiguo
+        db.commit()
+
+    response = client.post("/auth/login", json={"email": email, "password": "123456"})
+    assert response.status_code == 200
+
+    with SessionLocal() as db:
+        hash_guardado = db.scalars(select(User).where(User.email == email)).one().hashed_password
+    assert hash_guardado != hash_antiguo
+    assert hash_guardado.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
@@ -0,0 +1,144 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import time
+import uuid
+import asyncio
+from datetime import datetime
+
+from app import backfill
+from app.backfill import LimitadorTasa
+from app.ai.openai_client import CircuitoIA, IANoDisponible
+from app.db.session import AsyncSessionLocal
+from app.models.feedback import Feedback
+from app.db.init_db import init_db
+from app.services.feedback_service import guardar_feedback_pendiente
+
+init_db()  # crea las tablas si se ejecuta este fichero solo
+
+
+def test_limitador_de_tasa_permite_una_rafaga_y_despues_espacia():
+    """
+    El cubo empieza lleno (`por_segundo` fichas) y después deja pasar `por_segundo` peticiones por segundo.
+    """
+    async def medir():
+        limitador = LimitadorTasa(50)
+        inicio = time.monotonic()
+        for _ in range(50):
+            await limitador.esperar()
+        rafaga = time.monotonic() - inicio
+        for _ in range(10):
+            await limitador.esperar()
+        return rafaga, time.monotonic() - inicio
+
+    rafaga, total = asyncio.run(medir())
+    assert rafaga < 0.05
+    assert 0.15 <= total < 1
+
+
+def test_backfill_se_reanuda_desde_el_checkpoint(monkeypatch, ejecutar):
+    """
+    Un backfill detenido guarda el último bloque terminado; al relanzarlo continúa desde ahí,
+    sin volver a pedir a la IA las filas ya rellenadas, y termina como "completado".
+    """
+    llamadas = []
+    bloquear = {"activo": False}
+
+    async def urgencia_falsa(comentario: str) -> str:
+        llamadas.append(comentario)
+        if bloquear["activo"] and len(llamadas) > 2:
+            await asyncio.Event().wait()  # se queda esperando hasta que se detiene el backfill
+        return "normal"
+
+    monkeypatch.setitem(backfill.CAMPOS_BACKFILL, "urgencia", urgencia_falsa)
+
+    async def escenario():
+        # Primero se rellenan las filas que hayan dejado otras pruebas, para que los bloques sean solo de estas
+        await backfill.ejecutar_backfill("urgencia", 100, 1000)
+        llamadas.clear()
+        bloquear["activo"] = True
+
+        async with AsyncSessionLocal() as db:
+            ids = [
+                (await guardar_feedback_pendiente(db, "TestBackfill", f"Comentario de backfill {uuid.uuid4()}", datetime.now())).id
+                for _ in range(5)
+            ]
+
+        # Primera ejecución: termina el primer bloque de 2 filas y se detiene en el segundo
+        backfill.iniciar_backfill("urgencia", 2, 1000)
+        while len(llamadas) <= 2:
+            await asyncio.sleep(0.01)
+        assert backfill.detener_backfill("urgencia")
+        await asyncio.gather(backfill._tareas["urgencia"], return_exceptions=True)
+        detenido = await backfill.obtener_checkpoint("urgencia")
+
+        # Segunda ejecución: reanuda desde el checkpoint
+        llamadas_primera = len(llamadas)
+        bloquear["activo"] = False
+        progreso = await backfill.ejecutar_backfill("urgencia", 2, 1000)
+        terminado = await backfill.obtener_checkpoint("urgencia")
+
+        async with AsyncSessionLocal() as db:
+            comentarios = {feedback_id: (await db.get(Feedback, feedback_id)).comentario for feedback_id in ids}
+            urgencias = [(await db.get(Feedback, feedback_id)).urgencia for feedback_id in ids]
+        return ids, comentarios, urgencias, detenido, terminado, progreso, llamadas[llamadas_primera:]
+
+    ids, comentarios, urgencias, detenido, terminado, progreso, llamadas_reanudacion = ejecutar(escenario())
+
+    assert detenido["estado"] == "detenido"
+    ya_rellenados = [feedback_id for feedback_id in ids if feedback_id <= detenido["ultimo_id"]]
+    assert ya_rellenados
+    assert not {comentarios[feedback_id] for feedback_id in ya_rellenados} & set(llamadas_reanudacion)
+
+    assert terminado["estado"] == "completado"
+    assert progreso.estado == "completado"
+    assert urgencias == ["normal"] * len(ids)
+
+
+def test_backfill_se_pausa_con_el_circuito_abierto(monkeypatch, ejecutar):
+    """
+    Si la IA deja de estar disponible, el backfill se pausa sin contar errores ni avanzar el checkpoint;
+    cuando el circuito vuelve a dejar pasar llamadas, rellena las filas que faltaban.
+    """
+    circuito = CircuitoIA(umbral=1, espera=0.2)
+    monkeypatch.setattr(backfill, "circuito", circuito)
+    monkeypatch.setattr(backfill, "ESPERA_MINIMA_CIRCUITO", 0.05)
+    fallar = {"activo": False}
+
+    async def urgencia_falsa(comentario: str) -> str:
+        if fallar["activo"]:
+            fallar["activo"] = False
+            circuito.registrar_fallo()
+            raise IANoDisponible("Circuito abierto", circuito.segundos_para_reintentar())
+        return "normal"
+
+    monkeypatch.setitem(backfill.CAMPOS_BACKFILL, "urgencia", urgencia_falsa)
+
+    async def escenario():
+        await backfill.ejecutar_backfill("urgencia", 100, 1000)  # filas que hayan dejado otras pruebas
+        fallar["activo"] = True
+
+        async with AsyncSessionLocal() as db:
+            ids = [
+                (await guardar_feedback_pendiente(db, "TestBackfill", f"Comentario de backfill {uuid.uuid4()}", datetime.now())).id
+                for _ in range(3)
+            ]
+
+        tarea = asyncio.create_task(backfill.ejecutar_backfill("urgencia", 10, 1000))
+        estados = set()
+        while not tarea.done():
+            estados.add(backfill.progresos["urgencia"].estado)
+            await asyncio.sleep(0.01)
+        progreso = await tarea
+
+        async with AsyncSessionLocal() as db:
+            urgencias = [(await db.get(Feedback, feedback_id)).urgencia for feedback_id in ids]
+        return estados, progreso, urgencias
+
+    estados, progreso, urgencias = ejecutar(escenario())
+
+    assert "pausado" in estados
+    assert progreso.estado == "completado"
+    assert progreso.errores == 0
+    assert urgencias == ["normal"] * 3
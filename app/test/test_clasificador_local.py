@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.ai.clasificador_local import clasificar_localmente
+
+
+def test_comentario_positivo_claro():
+    """
+    Un comentario corto y claramente positivo se resuelve en local con confianza alta.
+    """
+    resultado = clasificar_localmente("El ambiente es muy bueno")
+
+    assert resultado["sentimiento"] == "positivo"
+    assert resultado["confianza"] >= 0.8
+    assert "ambiente" in resultado["etiquetas"]
+
+
+def test_negacion_invierte_polaridad():
+    """
+    "no" delante de una palabra positiva la convierte en negativa y viceversa.
+    """
+    assert clasificar_localmente("No es bueno")["sentimiento"] == "negativo"
+    assert clasificar_localmente("No está mal")["sentimiento"] == "positivo"
+
+
+def test_pero_da_mas_peso_a_lo_que_sigue():
+    """
+    Con "pero", la parte final del comentario decide el sentimiento.
+    """
+    resultado = clasificar_localmente("El sueldo es bueno pero el ambiente es horrible")
+
+    assert resultado["sentimiento"] == "negativo"
+    assert resultado["etiquetas"][:2] == ["salario", "ambiente"]
+
+
+def test_comentario_sin_contenido_es_neutro():
+    resultado = clasificar_localmente("Sin comentarios")
+
+    assert resultado["sentimiento"] == "neutro"
+    assert resultado["confianza"] >= 0.9
+
+
+def test_comentario_ambiguo_tiene_confianza_baja():
+    """
+    Un comentario mixto o sin palabras con polaridad debe escalarse a la IA.
+    """
+    assert clasificar_localmente("Estoy contento con el equipo aunque hay algunos problemas")["confianza"] < 0.8
+    assert clasificar_localmente("La reunión fue el martes")["confianza"] < 0.8
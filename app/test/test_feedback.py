@@ -2,8 +2,16 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
+import csv
+import gzip
+import json
+import uuid
+
 from fastapi.testclient import TestClient
 from app.main import app  
+from sqlalchemy import select
+from app.db.session import SessionLocal
+from app.models.feedback_tag import FeedbackTag
 
 # Creamos el cliente de prueba con la app
 client = TestClient(app)
@@ -33,4 +41,139 @@ def test_crear_feedback():
     assert "resumen" in data
     assert "etiquetas" in data
 
+def test_listar_feedbacks_paginado_con_proyeccion():
+    """
+    El listado devuelve páginas con solo los campos pedidos y un cursor para la siguiente,
+    sin repetir filas y en orden de fecha e id descendentes.
+    """
+    # Misma fecha, posterior a la de cualquier otro feedback: son las dos primeras filas del listado
+    ids = [
+        client.post(
+            "/feedback/",
+            params={"diferido": "true"},
+            json={"autor": "TestUser", "comentario": f"Comentario para paginar {i}", "fecha": "2999-01-01T12:00:00"}
+        ).json()["id"]
+        for i in range(2)
+    ]
+    try:
+        pagina = client.get("/feedback/", params={"limit": 1, "fields": "id,sentimiento"})
+        assert pagina.status_code == 200
+        primera = pagina.json()
+        assert [set(item) for item in primera["items"]] == [{"id", "sentimiento"}]
+        assert primera["next_cursor"]
+
+        segunda = client.get("/feedback/", params={"limit": 1, "fields": "id", "cursor": primera["next_cursor"]}).json()
+        assert len(segunda["items"]) == 1
+        assert [primera["items"][0]["id"], segunda["items"][0]["id"]] == sorted(ids, reverse=True)
+    finally:
+        for feedback_id in ids:
+            client.delete(f"/feedback/{feedback_id}")
+
+def test_listar_feedbacks_campo_no_valido():
+    response = client.get("/feedback/", params={"fields": "id,no_existe"})
+    assert response.status_code == 400
+
+def test_importar_requiere_autenticacion():
+    """
+    La importación masiva solo está disponible para administradores.
+    """
+    response = client.post("/feedback/importar", content=b"autor,comentario\nTestUser,Comentario importado\n")
+    assert response.status_code == 401
+
+def test_backfill_requiere_autenticacion():
+    """
+    Lanzar o detener un backfill es solo para administradores y consultar su progreso requiere login.
+    """
+    assert client.post("/feedback/backfill/urgencia").status_code == 401
+    assert client.post("/feedback/backfill/urgencia/detener").status_code == 401
+    assert client.get("/feedback/backfill/urgencia").status_code == 401
+
+def test_exportar_ndjson_y_csv_comprimido():
+    """
+    La exportación devuelve una línea por feedback en NDJSON y, con gzip=true, un CSV comprimido
+    con cabecera y solo los campos pedidos.
+    """
+    autor = f"Exportacion-{uuid.uuid4()}"
+    for comentario in ("El ambiente es muy bueno", "El horario es malo", "Sin más comentarios"):
+        assert client.post("/feedback/", json={"autor": autor, "comentario": comentario}).status_code == 200
+
+    response = client.get("/feedback/export", params={"autor": autor})
+    assert response.status_code == 200
+    filas = [json.loads(linea) for linea in response.text.splitlines()]
+    assert len(filas) == 3
+    assert all(fila["autor"] == autor and isinstance(fila["etiquetas"], list) for fila in filas)
+
+    # Se leen los bytes tal como llegan, sin que el cliente los descomprima
+    with client.stream("GET", "/feedback/export", params={"autor": autor, "format": "csv", "fields": "id,autor", "gzip": "true"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        comprimido = b"".join(response.iter_raw())
+    filas = list(csv.DictReader(gzip.decompress(comprimido).decode("utf-8").splitlines()))
+    assert len(filas) == 3
+    assert all(set(fila) == {"id", "autor"} and fila["autor"] == autor for fila in filas)
+
+def _etiquetas_en_feedback_tag(feedback_id: int) -> set:
+    with SessionLocal() as db:
+        return set(db.scalars(select(FeedbackTag.etiqueta).where(FeedbackTag.feedback_id == feedback_id)))
+
+def test_feedback_tag_sigue_a_la_columna_etiquetas():
+    """
+    Crear, editar y borrar un feedback mantiene feedback_tag igual que la columna etiquetas
+    (normalizadas en minúsculas y sin repetir).
+    """
+    creado = client.post("/feedback/", json={"autor": "TestUser", "comentario": "El ambiente es muy bueno"}).json()
+    assert _etiquetas_en_feedback_tag(creado["id"]) == {e.strip().lower() for e in creado["etiquetas"]}
+
+    response = client.patch(f"/feedback/{creado['id']}", json={"etiquetas": ["Salario", "horario ", "salario"]})
+    assert response.status_code == 200
+    assert _etiquetas_en_feedback_tag(creado["id"]) == {"salario", "horario"}
+
+    assert client.delete(f"/feedback/{creado['id']}").status_code == 200
+    assert _etiquetas_en_feedback_tag(creado["id"]) == set()
+
+def test_enriquecer_con_respuesta_no_valida_no_modifica_el_feedback(ia_falsa):
+    """
+    Si el enriquecimiento devuelve algo que no se puede interpretar, se responde 502
+    y el feedback conserva su análisis.
+    """
+    creado = client.post("/feedback/", json={"autor": "TestUser", "comentario": "El ambiente es muy bueno"}).json()
+    ia_falsa("esto no es JSON")
+
+    response = client.post(f"/feedback/enriquecer/{creado['id']}")
+    assert response.status_code == 502
+
+    actual = client.get(f"/feedback/{creado['id']}").json()
+    assert (actual["sentimiento"], actual["resumen"], actual["etiquetas"]) == (creado["sentimiento"], creado["resumen"], creado["etiquetas"])
+
+def test_detectar_toxico_con_respuesta_que_no_es_un_objeto(ia_falsa):
+    """
+    Una respuesta de toxicidad que es JSON pero no un objeto devuelve el resultado neutro sin guardarlo.
+    """
+    creado = client.post("/feedback/", json={"autor": "TestUser", "comentario": "El ambiente es muy bueno"}).json()
+    ia_falsa("[1, 2, 3]")
+
+    response = client.post(f"/feedback/detectar_toxico/{creado['id']}")
+    assert response.status_code == 200
+    assert response.json()["toxico"] is None
+    assert client.get(f"/feedback/{creado['id']}").json()["toxico"] is None
+
+def test_bulk_deja_pendientes_los_que_la_ia_no_analiza(ia_falsa):
+    """
+    En POST /feedback/bulk, los comentarios que la IA no devuelve bien se guardan pendientes de análisis
+    (sin sentimiento) en lugar de con el análisis neutro; los resueltos en local se guardan completos.
+    """
+    ia_falsa("esto no es JSON")
+    response = client.post("/feedback/bulk", json=[
+        {"autor": "TestUser", "comentario": "El ambiente es muy bueno"},
+        # El clasificador local no tiene confianza suficiente con este comentario, así que se escala a la IA
+        {"autor": "TestUser", "comentario": f"Comentario del trabajador zzqx wvvk {uuid.uuid4()}"},
+    ])
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["fallidos"] == 1
+    assert data["ids_pendientes"] == [data["ids"][1]]
 
+    local, pendiente = (client.get(f"/feedback/{feedback_id}").json() for feedback_id in data["ids"])
+    assert (local["estado_analisis"], local["sentimiento"]) == ("completado", "positivo")
+    assert (pendiente["estado_analisis"], pendiente["sentimiento"]) == ("pendiente", None)
@@ -4,6 +4,9 @@ import os
 # Añade el directorio raíz del proyecto al path para permitir las importaciones absolutas
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
+import random
+from datetime import date, timedelta
+
 from fastapi.testclient import TestClient
 from app.main import app  # Importamos la instancia de FastAPI
 
@@ -35,3 +38,138 @@ def test_resumen_sentimientos_endpoint():
     assert resumen["positivo"]["cantidad"] >= 0
     assert resumen["neutro"]["cantidad"] >= 0
     assert resumen["negativo"]["cantidad"] >= 0
+
+
+def test_resumen_sentimientos_con_filtros():
+    """
+    Con filtros que no coinciden con ningún feedback, el resumen devuelve ceros en lugar de fallar.
+    """
+    response = client.get("/metrics/resumen", params={"autor": "autor-que-no-existe", "desde": "2000-01-01"})
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["total_feedbacks"] == 0
+    assert data["resumen_por_sentimiento"]["positivo"] == {"cantidad": 0, "porcentaje": 0.0}
+
+
+def test_palabras_frecuentes_excluye_stopwords():
+    """
+    Las palabras vacías y las indicadas en `stopwords` no aparecen en el resultado.
+    """
+    response = client.get("/metrics/palabras_frecuentes", params={"limit": 20, "stopwords": "equipo,empresa"})
+    assert response.status_code == 200
+
+    palabras = [p["palabra"] for p in response.json()]
+    assert len(palabras) <= 20
+    assert not {"de", "la", "que", "equipo", "empresa"} & set(palabras)
+
+
+def test_feedback_extremos_k():
+    """
+    Con k=3 devuelve exactamente los 3 feedbacks más cortos y los 3 más largos, en orden de longitud.
+    """
+    # Un día propio, lejos de los demás feedbacks de las pruebas, para que solo cuenten estos
+    dia = date(1990, 1, 1) + timedelta(days=random.randrange(3650))
+    longitudes = [20, 5, 35, 15, 30, 10, 25]
+    ids = [
+        client.post(
+            "/feedback/",
+            params={"diferido": "true"},
+            json={"autor": "TestExtremos", "comentario": "x" * longitud, "fecha": f"{dia}T12:00:00"}
+        ).json()["id"]
+        for longitud in longitudes
+    ]
+    try:
+        response = client.get("/metrics/feedback_extremos", params={"k": 3, "desde": str(dia), "hasta": str(dia)})
+        assert response.status_code == 200
+
+        data = response.json()
+        assert [fb["longitud"] for fb in data["más_cortos"]] == [5, 10, 15]
+        assert [fb["longitud"] for fb in data["más_largos"]] == [35, 30, 25]
+        assert data["más_corto"] == data["más_cortos"][0]
+        assert data["más_largo"] == data["más_largos"][0]
+        assert {fb["id"] for fb in data["más_cortos"] + data["más_largos"]} <= set(ids)
+    finally:
+        for feedback_id in ids:
+            client.delete(f"/feedback/{feedback_id}")
+
+
+def test_estado_pool():
+    """
+    /metrics/pool informa de las conexiones de cada pool y de las esperas para obtenerlas.
+    """
+    client.get("/metrics/resumen")  # al menos un checkout en el pool asíncrono
+    response = client.get("/metrics/pool")
+    assert response.status_code == 200
+
+    data = response.json()
+    for pool in ("asincrono", "sincrono"):
+        assert {"tamano", "en_uso", "libres", "overflow", "checkouts", "espera_media_ms", "timeouts"} <= set(data[pool])
+    assert data["asincrono"]["checkouts"] >= 1
+    assert data["configuracion"]["pool_size"] == data["asincrono"]["tamano"]
+
+
+def test_uso_ia():
+    """
+    /metrics/ai_usage agrupa las llamadas a la IA por operación y suma los totales.
+    """
+    response = client.get("/metrics/ai_usage")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert {"llamadas", "errores", "fallos_parseo", "reintentos", "tokens_prompt", "tokens_completion"} <= set(data["totales"])
+    assert data["totales"]["llamadas"] == sum(op["llamadas"] for op in data["operaciones"].values())
+    for op in data["operaciones"].values():
+        assert op["histograma_latencia_ms"]["+inf"] == op["llamadas"]
+    assert data["circuito"]["estado"] in ("cerrado", "abierto", "semiabierto")
+
+
+def test_exposicion_prometheus():
+    """
+    /metrics/prometheus cuenta las peticiones por plantilla de ruta (no por id) y sus consultas SQL.
+    """
+    client.get("/metrics/resumen")
+    client.get("/feedback/999999999")
+    response = client.get("/metrics/prometheus")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    texto = response.text
+    assert 'http_peticiones_total{metodo="GET",ruta="/metrics/resumen",estado="200"}' in texto
+    assert 'ruta="/feedback/{feedback_id}",estado="404"' in texto
+    assert "999999999" not in texto
+    assert 'db_consulta_duracion_segundos_count{ruta="/feedback/{feedback_id}"}' in texto
+
+
+def test_cache_de_metricas_se_invalida_al_escribir():
+    """
+    La misma consulta se sirve desde la caché mientras no cambian los datos; crear, editar o borrar
+    un feedback incrementa version_datos y la siguiente consulta ya refleja el cambio.
+    """
+    def consultar() -> tuple:
+        general = client.get("/metrics/general").json()
+        return general["total"], general.get("positivo", 0), client.get("/metrics/cache").json()
+
+    total, positivos, antes = consultar()
+    total_repetido, _, despues = consultar()
+    assert total_repetido == total
+    assert despues["aciertos"] == antes["aciertos"] + 1
+    assert despues["version_datos"] == antes["version_datos"]
+
+    # Diferido para no depender de la IA: queda pendiente, sin sentimiento
+    feedback_id = client.post(
+        "/feedback/", params={"diferido": "true"}, json={"autor": "TestCacheMetricas", "comentario": "Comentario para la caché"}
+    ).json()["id"]
+    total_creado, _, creado = consultar()
+    assert creado["version_datos"] > despues["version_datos"]
+    assert total_creado == total + 1
+
+    client.patch(f"/feedback/{feedback_id}", json={"sentimiento": "positivo"})
+    _, positivos_editado, editado = consultar()
+    assert editado["version_datos"] > creado["version_datos"]
+    assert positivos_editado == positivos + 1
+
+    client.delete(f"/feedback/{feedback_id}")
+    total_borrado, positivos_borrado, borrado = consultar()
+    assert borrado["version_datos"] > editado["version_datos"]
+    assert (total_borrado, positivos_borrado) == (total, positivos)
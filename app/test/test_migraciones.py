@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import pytest
+from sqlalchemy import text
+
+from app.db import migraciones
+from app.db.migraciones import MIGRACIONES, aplicar_migraciones, versiones_aplicadas
+from app.db.session import engine
+
+solo_postgresql = pytest.mark.skipif(engine.dialect.name != "postgresql", reason="Las migraciones solo se aplican en PostgreSQL")
+
+VERSION_DE_PRUEBA = 999999
+
+
+def test_versiones_consecutivas():
+    """
+    Las versiones empiezan en 1 y van seguidas: una migración nueva siempre se añade al final.
+    """
+    assert [version for version, _, _ in MIGRACIONES] == list(range(1, len(MIGRACIONES) + 1))
+
+
+@solo_postgresql
+def test_migraciones_se_aplican_una_vez(monkeypatch):
+    """
+    Cada migración se ejecuta una sola vez y queda registrada en schema_migraciones;
+    volver a aplicarlas no hace nada.
+    """
+    ejecuciones = []
+    monkeypatch.setattr(migraciones, "MIGRACIONES", MIGRACIONES + [
+        (VERSION_DE_PRUEBA, "Migración de prueba", lambda conn: ejecuciones.append(conn)),
+    ])
+    try:
+        aplicadas = aplicar_migraciones(engine)
+        assert VERSION_DE_PRUEBA in aplicadas
+        assert aplicar_migraciones(engine) == []
+        assert len(ejecuciones) == 1
+
+        with engine.begin() as conn:
+            assert {version for version, _, _ in MIGRACIONES} | {VERSION_DE_PRUEBA} <= versiones_aplicadas(conn)
+            descripcion = conn.execute(
+                text("SELECT descripcion FROM schema_migraciones WHERE version = :version"), {"version": VERSION_DE_PRUEBA}
+            ).scalar_one()
+        assert descripcion == "Migración de prueba"
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM schema_migraciones WHERE version = :version"), {"version": VERSION_DE_PRUEBA})
+
+
+def test_sin_postgresql_no_se_aplica_nada():
+    """
+    En otras bases de datos (SQLite en los benchmarks y las pruebas) create_all basta y no se migra nada.
+    """
+    if engine.dialect.name == "postgresql":
+        pytest.skip("Solo aplica fuera de PostgreSQL")
+    assert aplicar_migraciones(engine) == []
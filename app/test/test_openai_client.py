@@ -0,0 +1,137 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import re
+import json
+import uuid
+import asyncio
+
+import pytest
+
+from app.ai import openai_client
+from app.ai.openai_client import CircuitoIA, IANoDisponible
+
+
+def test_circuito_se_abre_y_prueba_una_llamada():
+    """
+    El circuito se abre tras `umbral` fallos seguidos y, pasada la espera, deja pasar una sola llamada de prueba.
+    """
+    circuito = CircuitoIA(umbral=2, espera=0.05)
+    circuito.registrar_fallo()
+    assert circuito.permitir()
+    circuito.registrar_fallo()
+    assert circuito.estado()["estado"] == "abierto"
+    assert not circuito.permitir()
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert circuito.permitir()
+    assert not circuito.permitir()  # solo una llamada de prueba a la vez
+    circuito.registrar_exito()
+    assert circuito.estado()["estado"] == "cerrado"
+    assert circuito.estado()["llamadas_rechazadas"] == 2
+
+
+def test_reintenta_los_429(ia_falsa):
+    """
+    Un 429 se reintenta con backoff hasta obtener respuesta.
+    """
+    completions = ia_falsa(fallos=2)
+    respuesta = asyncio.run(openai_client.generar_respuesta_openai("sistema", "prompt", operacion="respuesta"))
+
+    assert respuesta == "ok"
+    assert completions.llamadas == 3
+
+
+def test_circuito_abierto_degrada_al_analisis_neutro(ia_falsa):
+    """
+    Con OpenAI fallando, el circuito se abre, las llamadas siguientes no llegan a OpenAI
+    y el análisis devuelve el resultado neutro en lugar de un error.
+    """
+    completions = ia_falsa(fallos=100, umbral=2)
+    with pytest.raises(IANoDisponible):
+        asyncio.run(openai_client.generar_respuesta_openai("sistema", "prompt", operacion="respuesta"))
+    assert openai_client.circuito.estado()["estado"] == "abierto"
+
+    llamadas = completions.llamadas
+    analisis = asyncio.run(openai_client.analizar_feedback_con_ia("Comentario sin caché para el circuito"))
+    assert analisis == openai_client.ANALISIS_POR_DEFECTO
+    assert completions.llamadas == llamadas
+
+
+def test_respuestas_no_validas_no_se_guardan_en_cache(ia_falsa):
+    """
+    Una urgencia fuera de las válidas o una toxicidad sin "toxico" booleano no se guardan en caché:
+    la siguiente llamada vuelve a preguntar a la IA.
+    """
+    completions = ia_falsa(contenido="quizás")
+    assert asyncio.run(openai_client.clasificar_nivel_urgencia("Comentario de urgencia no válida")) is None
+    assert asyncio.run(openai_client.clasificar_nivel_urgencia("Comentario de urgencia no válida")) is None
+    assert completions.llamadas == 2
+
+    completions.contenido = '["no", "es", "un", "objeto"]'
+    resultado = asyncio.run(openai_client.analizar_toxicidad_comentario("Comentario de toxicidad no válida"))
+    assert resultado["toxico"] is None
+    asyncio.run(openai_client.analizar_toxicidad_comentario("Comentario de toxicidad no válida"))
+    assert completions.llamadas == 4
+
+
+def _respuesta_lote(invalidos: set, solo_en_la_primera: bool = False):
+    """
+    Respuesta a PROMPT_ANALISIS_LOTE: un análisis por comentario del lote, con un sentimiento no
+    válido para los comentarios de `invalidos` (solo en la primera petición si `solo_en_la_primera`).
+    Devuelve también la lista con el tamaño de cada lote recibido.
+    """
+    lotes = []
+
+    def responder(prompt: str) -> str:
+        lote = json.loads(re.search(r"(\[\s*\{.*?\}\s*\])", prompt, re.S).group(1))
+        lotes.append(len(lote))
+        fallan = invalidos if len(lotes) == 1 or not solo_en_la_primera else set()
+        return json.dumps([
+            {
+                "indice": elemento["indice"],
+                "sentimiento": "eufórico" if elemento["comentario"] in fallan else "positivo",
+                "etiquetas": ["ambiente"],
+                "resumen": "Resumen del comentario",
+            }
+            for elemento in lote
+        ])
+
+    return responder, lotes
+
+
+def test_analisis_en_lote_reintenta_solo_los_elementos_no_validos(ia_falsa):
+    """
+    Los comentarios repetidos se analizan una vez y solo se reenvían los elementos que el modelo
+    no devolvió bien; si en el reintento salen bien, no queda ninguno fallido.
+    """
+    comentarios = [f"Comentario en lote {uuid.uuid4()}" for _ in range(3)]
+    responder, lotes = _respuesta_lote({comentarios[1]}, solo_en_la_primera=True)
+    ia_falsa(contenido=responder)
+
+    resultado = asyncio.run(openai_client.analizar_feedbacks_en_lote(comentarios + [comentarios[0]], tamano_lote=10))
+
+    assert lotes == [3, 1]
+    assert [r["sentimiento"] for r in resultado["resultados"]] == ["positivo"] * 4
+    assert resultado["llamadas"] == 2
+    assert resultado["reintentos"] == 1
+    assert resultado["fallidos"] == 0
+
+
+def test_analisis_en_lote_deja_sin_resultado_lo_que_sigue_fallando(ia_falsa, monkeypatch):
+    """
+    Un elemento que sigue sin ser válido tras los reintentos queda como None (no con el análisis
+    por defecto, que parecería un resultado real); el resto del lote no se ve afectado.
+    """
+    monkeypatch.setattr(openai_client, "IA_REINTENTOS_LOTE", 1)
+    comentarios = [f"Comentario en lote {uuid.uuid4()}" for _ in range(2)]
+    responder, lotes = _respuesta_lote({comentarios[0]})
+    ia_falsa(contenido=responder)
+
+    resultado = asyncio.run(openai_client.analizar_feedbacks_en_lote(comentarios, tamano_lote=10))
+
+    assert lotes == [2, 1]
+    assert resultado["resultados"][0] is None
+    assert resultado["resultados"][1]["sentimiento"] == "positivo"
+    assert resultado["fallidos"] == 1
@@ -0,0 +1,107 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app import worker
+from app.ai import openai_client
+from app.ai.openai_client import ANALISIS_POR_DEFECTO
+from app.db.session import AsyncSessionLocal
+from app.models.feedback import Feedback
+from app.db.init_db import init_db
+from app.services.feedback_service import guardar_feedback_pendiente, completar_analisis_feedback
+
+init_db()  # crea las tablas si se ejecuta este fichero solo
+
+# El clasificador local no tiene confianza suficiente con este comentario, así que se escala a la IA
+COMENTARIO_PARA_IA = "Comentario del trabajador zzqx wvvk"
+
+
+async def _crear_pendientes(cantidad: int) -> list[int]:
+    async with AsyncSessionLocal() as db:
+        return [
+            (await guardar_feedback_pendiente(db, "TestWorker", f"{COMENTARIO_PARA_IA} {uuid.uuid4()}", datetime.now())).id
+            for _ in range(cantidad)
+        ]
+
+
+async def _leer(ids: list[int]) -> list[Feedback]:
+    async with AsyncSessionLocal() as db:
+        return [await db.get(Feedback, feedback_id) for feedback_id in ids]
+
+
+def test_trabajador_completa_los_pendientes(ia_falsa, ejecutar):
+    """
+    El trabajador reclama los feedbacks pendientes, los analiza y los marca como completados.
+    """
+    ia_falsa(json.dumps({"sentimiento": "negativo", "etiquetas": ["horario"], "resumen": "Queja sobre el horario"}))
+
+    async def escenario():
+        ids = await _crear_pendientes(2)
+        await worker.procesar_lote(tamano_lote=100)
+        return await _leer(ids)
+
+    for feedback in ejecutar(escenario()):
+        assert feedback.estado_analisis == "completado"
+        assert feedback.sentimiento == "negativo"
+        assert feedback.resumen == "Queja sobre el horario"
+        assert feedback.analisis_intentos == 1
+
+
+def test_trabajador_reintenta_y_marca_error(ia_falsa, monkeypatch, ejecutar):
+    """
+    Una respuesta no válida devuelve el feedback a la cola sin guardar el análisis neutro;
+    al agotar ENRIQUECIMIENTO_MAX_INTENTOS queda en "error".
+    """
+    monkeypatch.setattr(worker, "ENRIQUECIMIENTO_MAX_INTENTOS", 2)
+    ia_falsa("esto no es JSON")
+
+    async def escenario():
+        ids = await _crear_pendientes(1)
+        await worker.procesar_lote(tamano_lote=100)
+        primera = (await _leer(ids))[0]
+        await worker.procesar_lote(tamano_lote=100)
+        return primera, (await _leer(ids))[0]
+
+    primera, segunda = ejecutar(escenario())
+    assert (primera.estado_analisis, primera.analisis_intentos) == ("pendiente", 1)
+    assert (segunda.estado_analisis, segunda.analisis_intentos) == ("error", 2)
+    assert segunda.sentimiento is None
+
+
+def test_trabajador_no_reclama_con_el_circuito_abierto(ia_falsa, ejecutar):
+    """
+    Con el circuito de la IA abierto, los feedbacks siguen pendientes y no gastan intentos.
+    """
+    completions = ia_falsa("{}")
+    for _ in range(openai_client.circuito.umbral):
+        openai_client.circuito.registrar_fallo()
+
+    async def escenario():
+        ids = await _crear_pendientes(1)
+        procesados = await worker.procesar_lote(tamano_lote=100)
+        return procesados, (await _leer(ids))[0]
+
+    procesados, feedback = ejecutar(escenario())
+    assert procesados == 0
+    assert (feedback.estado_analisis, feedback.analisis_intentos) == ("pendiente", 0)
+    assert completions.llamadas == 0
+
+
+def test_completar_rechaza_el_analisis_por_defecto(ejecutar):
+    """
+    completar_analisis_feedback no marca como completado un feedback con el análisis neutro.
+    """
+    async def escenario():
+        ids = await _crear_pendientes(1)
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(ValueError):
+                await completar_analisis_feedback(db, ids[0], dict(ANALISIS_POR_DEFECTO))
+        return (await _leer(ids))[0]
+
+    assert ejecutar(escenario()).estado_analisis == "pendiente"
@@ -0,0 +1,87 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class CacheLRU:
+    """
+    Caché en memoria acotada por número de entradas: al llenarse descarta la menos usada (LRU).
+    Opcionalmente las entradas caducan tras `ttl` segundos.
+    Lleva contadores de aciertos y fallos para poder medir su eficacia.
+
+    `obtener` devuelve None cuando no hay entrada, así que no se deben guardar valores None.
+    """
+
+    def __init__(self, max_entradas: int, ttl: Optional[float] = None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: Hashable) -> Optional[Any]:
+        with self._lock:
+            entrada = self._datos.get(clave)
+
+            if entrada is None:
+                self.fallos += 1
+                return None
+
+            valor, caduca = entrada
+            if caduca is not None and caduca < time.monotonic():
+                del self._datos[clave]
+                self.fallos += 1
+                return None
+
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        caduca = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._datos[clave] = (valor, caduca)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave: Hashable) -> None:
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._datos),
+            "max_entradas": self.max_entradas,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+        }
+
+
+class VersionDatos:
+    """
+    Contador que se incrementa cada vez que cambian los feedbacks.
+    Las cachés de resultados calculados a partir de los datos incluyen la versión en la clave,
+    así que tras una escritura dejan de servir lo calculado antes sin tener que vaciarse.
+    Solo ve las escrituras hechas en este proceso.
+    """
+
+    def __init__(self):
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def incrementar(self) -> None:
+        with self._lock:
+            self.valor += 1
+
+
+# Versión de los datos de feedback en este proceso; la incrementa feedback_service tras cada commit
+version_datos = VersionDatos()
@@ -1,18 +1,30 @@
+import os
+from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.models.user import User
-from app.utils.security import decode_access_token
+from app.services.auth_service import UsuarioAutenticado, obtener_usuario_autenticado
+from app.utils.security import decode_access_token_claims
+
+load_dotenv()
+# Si es true, los tokens con "uid" y "role" se aceptan sin consultar la base de datos.
+# Un cambio de rol no se ve hasta que el usuario obtiene un token nuevo.
+AUTH_CONFIAR_EN_TOKEN = os.getenv("AUTH_CONFIAR_EN_TOKEN", "false").lower() == "true"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> UsuarioAutenticado:
     try:
 
-        email = decode_access_token(token)
+        claims = decode_access_token_claims(token)
+        email = claims["sub"]
+
+        if AUTH_CONFIAR_EN_TOKEN and "uid" in claims and "role" in claims:
+            return UsuarioAutenticado(id=claims["uid"], email=email, role=claims["role"])
 
-        user = db.query(User).filter(User.email == email).first()
+        # La sesión no abre ninguna conexión si el usuario está en la caché
+        user = await obtener_usuario_autenticado(db, email)
         
         if not user:
             raise HTTPException(
@@ -29,4 +41,13 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Error al verificar el token",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+
+async def get_current_admin(user: UsuarioAutenticado = Depends(get_current_user)) -> UsuarioAutenticado:
+    """
+    Igual que get_current_user, pero solo deja pasar a usuarios con rol "admin".
+    """
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Se requiere rol de administrador")
+    return user
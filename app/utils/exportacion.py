@@ -0,0 +1,69 @@
+import io
+import csv
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator
+
+# Bytes que se acumulan antes de enviar un trozo de la respuesta
+TAMANO_TROZO = 64 * 1024
+
+
+def _valor_json(campo: str, valor):
+    if campo == "etiquetas":
+        return [e.strip() for e in (valor or "").split(",") if e.strip()]
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+def filas_a_ndjson(filas: Iterable[dict]) -> Iterator[str]:
+    """
+    Convierte cada fila en una línea JSON (NDJSON). Las etiquetas se devuelven como lista, igual que en la API.
+    """
+    for fila in filas:
+        yield json.dumps({c: _valor_json(c, v) for c, v in fila.items()}, ensure_ascii=False) + "\n"
+
+
+def filas_a_csv(filas: Iterable[dict], campos: list[str]) -> Iterator[str]:
+    """
+    Convierte las filas en líneas CSV con cabecera. Las etiquetas quedan como texto separado por comas.
+    """
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=campos)
+    escritor.writeheader()
+    for fila in filas:
+        escritor.writerow({c: v.isoformat() if isinstance(v, datetime) else v for c, v in fila.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def agrupar_en_trozos(lineas: Iterable[str], tamano: int = TAMANO_TROZO) -> Iterator[bytes]:
+    """
+    Junta las líneas en trozos de unos `tamano` bytes para no enviar una escritura por fila.
+    """
+    pendiente: list[bytes] = []
+    acumulado = 0
+    for linea in lineas:
+        datos = linea.encode("utf-8")
+        pendiente.append(datos)
+        acumulado += len(datos)
+        if acumulado >= tamano:
+            yield b"".join(pendiente)
+            pendiente, acumulado = [], 0
+    if pendiente:
+        yield b"".join(pendiente)
+
+
+def comprimir_gzip(trozos: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Comprime en gzip sobre la marcha, sin tener el contenido completo en memoria.
+    """
+    compresor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for trozo in trozos:
+        comprimido = compresor.compress(trozo)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
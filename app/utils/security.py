@@ -3,6 +3,9 @@ from datetime import datetime, timedelta
 from fastapi import HTTPException, status
 from jose import jwt, JWTError
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
 import os
 
 
@@ -12,8 +15,17 @@ ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))  # valor por defecto si no está
 
 
-# Contexto para cifrar contraseñas usando bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Coste de bcrypt (2^BCRYPT_ROUNDS iteraciones): cada punto más dobla el tiempo de cada hash y verificación
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Hilos dedicados a bcrypt: limita cuántos núcleos pueden ocupar los logins simultáneos
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Contexto para cifrar contraseñas usando bcrypt. Los hashes con otro coste se marcan como
+# desactualizados (needs_update) y se vuelven a calcular en el siguiente login.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt libera el GIL mientras calcula, así que unos pocos hilos bastan para no bloquear el event loop
+_executor_hash = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
 
 # Hasear contraseña antes de guardarla
 def hash_password(password : str) -> str:
@@ -23,6 +35,18 @@ def hash_password(password : str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# Versiones para código async: el cálculo (cientos de ms de CPU) se hace en los hilos de bcrypt
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor_hash, hash_password, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña y, si es correcta pero el hash está desactualizado, devuelve también el hash nuevo.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor_hash, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
 # Crear un token de acceso JWT válido por X minutos
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=15)):
     to_encode = data.copy()
@@ -31,20 +55,19 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(token: str) -> str:
+def decode_access_token_claims(token: str) -> dict:
     try:
         # 1. Verificamos y decodificamos el token con la clave y el algoritmo
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         
-        # 2. Extraemos el "sub" (subject), que es el email que guardamos en el token
-        email: str = payload.get("sub")
-        if email is None:
+        # 2. El "sub" (subject) es el email que guardamos en el token; "uid" y "role" son opcionales
+        if payload.get("sub") is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token inválido: falta el campo 'sub'",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return email
+        return payload
     
     except JWTError:
         # Si el token está mal firmado, ha expirado o no es válido
@@ -53,4 +76,7 @@ def decode_access_token(token: str) -> str:
             detail="Token inválido o expirado",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
\ No newline at end of file
+
+
+def decode_access_token(token: str) -> str:
+    return decode_access_token_claims(token)["sub"]
@@ -0,0 +1,213 @@
+"""
+Telemetría de peticiones HTTP y consultas a la base de datos en formato Prometheus.
+
+MiddlewareTelemetria mide cada petición (latencia, código de estado y peticiones en curso) por
+método y plantilla de ruta ("/feedback/{feedback_id}", no el id concreto, para que el número de
+series no crezca con los datos). Los eventos before/after_cursor_execute de los motores cuentan
+las consultas y su duración atribuyéndolas a la ruta que las lanzó, que se propaga con una
+ContextVar hasta las conexiones asíncronas y los hilos del threadpool. Las consultas fuera de
+una petición (trabajadores, backfill) se agrupan en la ruta "sin_peticion".
+
+Todo se expone en GET /metrics/prometheus. Los valores son del proceso: con varios workers de
+uvicorn, Prometheus debe consultar cada uno o sumarlos.
+"""
+import bisect
+import time
+import threading
+from contextvars import ContextVar
+from typing import Iterable
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+# Límites superiores (segundos) de las cubetas de los histogramas
+CUBETAS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CUBETAS_DB = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+RUTA_SIN_PETICION = "sin_peticion"
+RUTA_DESCONOCIDA = "desconocida"  # peticiones que no coinciden con ninguna ruta (404)
+
+_ruta_actual: ContextVar[str] = ContextVar("ruta_actual", default=RUTA_SIN_PETICION)
+
+
+class Histograma:
+    """
+    Histograma acumulado con la suma y el número de observaciones, como los de Prometheus.
+    """
+
+    def __init__(self, cubetas: tuple):
+        self.cubetas = cubetas
+        self.conteos = [0] * (len(cubetas) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        self.conteos[bisect.bisect_left(self.cubetas, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def lineas(self, nombre: str, etiquetas: str) -> Iterable[str]:
+        acumulado = 0
+        for limite, conteo in zip(self.cubetas, self.conteos):
+            acumulado += conteo
+            yield f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}'
+        yield f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {self.total}'
+        yield f"{nombre}_sum{{{etiquetas}}} {self.suma:.6f}"
+        yield f"{nombre}_count{{{etiquetas}}} {self.total}"
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(**valores) -> str:
+    return ",".join(f'{clave}="{_escapar(valor)}"' for clave, valor in valores.items())
+
+
+class RegistroTelemetria:
+    """
+    Contadores, histogramas y peticiones en curso de la API y de la base de datos.
+    """
+
+    def __init__(self):
+        self.peticiones: dict[tuple, int] = {}  # (método, ruta, estado) -> peticiones
+        self.duracion_peticiones: dict[tuple, Histograma] = {}  # (método, ruta)
+        self.en_curso: dict[tuple, int] = {}  # (método, ruta)
+        self.duracion_consultas: dict[str, Histograma] = {}  # ruta
+        self.errores_consultas: dict[str, int] = {}  # ruta
+        self._lock = threading.Lock()
+
+    def empezar_peticion(self, metodo: str, ruta: str) -> None:
+        with self._lock:
+            self.en_curso[(metodo, ruta)] = self.en_curso.get((metodo, ruta), 0) + 1
+
+    def terminar_peticion(self, metodo: str, ruta: str, estado: int, segundos: float) -> None:
+        with self._lock:
+            self.en_curso[(metodo, ruta)] -= 1
+            self.peticiones[(metodo, ruta, estado)] = self.peticiones.get((metodo, ruta, estado), 0) + 1
+            if (metodo, ruta) not in self.duracion_peticiones:
+                self.duracion_peticiones[(metodo, ruta)] = Histograma(CUBETAS_HTTP)
+            self.duracion_peticiones[(metodo, ruta)].observar(segundos)
+
+    def registrar_consulta(self, ruta: str, segundos: float) -> None:
+        with self._lock:
+            if ruta not in self.duracion_consultas:
+                self.duracion_consultas[ruta] = Histograma(CUBETAS_DB)
+            self.duracion_consultas[ruta].observar(segundos)
+
+    def registrar_error_consulta(self, ruta: str) -> None:
+        with self._lock:
+            self.errores_consultas[ruta] = self.errores_consultas.get(ruta, 0) + 1
+
+    def exposicion(self) -> str:
+        """
+        Texto en el formato de exposición de Prometheus (versión 0.0.4).
+        """
+        lineas = []
+        with self._lock:
+            lineas += [
+                "# HELP http_peticiones_total Peticiones HTTP terminadas por método, ruta y código de estado.",
+                "# TYPE http_peticiones_total counter",
+            ]
+            for (metodo, ruta, estado), valor in sorted(self.peticiones.items()):
+                lineas.append(f"http_peticiones_total{{{_etiquetas(metodo=metodo, ruta=ruta, estado=estado)}}} {valor}")
+
+            lineas += [
+                "# HELP http_peticion_duracion_segundos Duración de las peticiones HTTP hasta enviar la respuesta completa.",
+                "# TYPE http_peticion_duracion_segundos histogram",
+            ]
+            for (metodo, ruta), histograma in sorted(self.duracion_peticiones.items()):
+                lineas += histograma.lineas("http_peticion_duracion_segundos", _etiquetas(metodo=metodo, ruta=ruta))
+
+            lineas += [
+                "# HELP http_peticiones_en_curso Peticiones HTTP que se están atendiendo.",
+                "# TYPE http_peticiones_en_curso gauge",
+            ]
+            for (metodo, ruta), valor in sorted(self.en_curso.items()):
+                lineas.append(f"http_peticiones_en_curso{{{_etiquetas(metodo=metodo, ruta=ruta)}}} {valor}")
+
+            lineas += [
+                "# HELP db_consulta_duracion_segundos Duración de las consultas SQL por ruta que las lanzó.",
+                "# TYPE db_consulta_duracion_segundos histogram",
+            ]
+            for ruta, histograma in sorted(self.duracion_consultas.items()):
+                lineas += histograma.lineas("db_consulta_duracion_segundos", _etiquetas(ruta=ruta))
+
+            lineas += [
+                "# HELP db_consultas_con_error_total Consultas SQL que terminaron con error por ruta.",
+                "# TYPE db_consultas_con_error_total counter",
+            ]
+            for ruta, valor in sorted(self.errores_consultas.items()):
+                lineas.append(f"db_consultas_con_error_total{{{_etiquetas(ruta=ruta)}}} {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+telemetria = RegistroTelemetria()
+
+
+def _plantilla_ruta(scope) -> str:
+    aplicacion = scope.get("app")
+    for ruta in getattr(getattr(aplicacion, "router", None), "routes", ()):
+        coincidencia, _ = ruta.matches(scope)
+        if coincidencia == Match.FULL:
+            return ruta.path
+    return RUTA_DESCONOCIDA
+
+
+class MiddlewareTelemetria:
+    """
+    Middleware ASGI que mide cada petición HTTP y deja su ruta en la ContextVar para las consultas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        ruta = _plantilla_ruta(scope)
+        estado = 500  # si la aplicación falla antes de responder
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        token = _ruta_actual.set(ruta)
+        telemetria.empezar_peticion(metodo, ruta)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            telemetria.terminar_peticion(metodo, ruta, estado, time.perf_counter() - inicio)
+            _ruta_actual.reset(token)
+
+
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_consultas", []).append(time.perf_counter())
+
+
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info["inicio_consultas"].pop()
+    telemetria.registrar_consulta(_ruta_actual.get(), time.perf_counter() - inicio)
+
+
+def _error_de_consulta(contexto_error):
+    # after_cursor_execute no se llama si la consulta falla
+    inicios = contexto_error.connection.info.get("inicio_consultas") if contexto_error.connection else None
+    if inicios:
+        inicios.pop()
+        telemetria.registrar_error_consulta(_ruta_actual.get())
+
+
+def instrumentar_motor(motor: Engine) -> None:
+    """
+    Registra los eventos que miden las consultas del motor (para uno asíncrono, su sync_engine).
+    """
+    event.listen(motor, "before_cursor_execute", _antes_de_consulta)
+    event.listen(motor, "after_cursor_execute", _despues_de_consulta)
+    event.listen(motor, "handle_error", _error_de_consulta)
@@ -0,0 +1,32 @@
+import re
+
+# Palabras vacías que no aportan significado al contar términos
+STOPWORDS_ES = {
+    "el", "la", "los", "las", "de", "del", "a", "al", "en", "por", "para",
+    "y", "o", "con", "sin", "un", "una", "unos", "unas", "es", "son",
+    "que", "como", "más", "muy", "se", "lo", "su", "sus", "ya", "no", "me", "mi", "fue"
+}
+
+
+def limpiar_texto(texto: str) -> str:
+    """
+    Convierte a minúsculas y elimina signos, dejando solo letras, números y espacios.
+    """
+    texto = texto.lower()
+    texto = re.sub(r"[^a-zA-Z0-9áéíóúÁÉÍÓÚñÑ\s]", "", texto)
+    return texto.strip()
+
+
+def tokenizar(texto: str) -> list[str]:
+    """
+    Separa el texto limpio en palabras, conservando todas (también las vacías).
+    """
+    return limpiar_texto(texto).split()
+
+
+def palabras_significativas(texto: str, stopwords: set[str] = STOPWORDS_ES) -> list[str]:
+    """
+    Devuelve las palabras del texto sin las palabras vacías.
+    Es el vocabulario que usa /metrics/palabras_frecuentes.
+    """
+    return [palabra for palabra in tokenizar(texto) if palabra not in stopwords]
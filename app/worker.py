@@ -0,0 +1,125 @@
+"""
+Trabajadores de enriquecimiento en segundo plano.
+
+Reclaman los feedbacks guardados con estado_analisis="pendiente", ejecutan el análisis IA
+y guardan sentimiento, etiquetas y resumen. Pueden ejecutarse dentro de la API
+(ENRIQUECIMIENTO_WORKERS_EN_PROCESO > 0) o como proceso independiente:
+
+    python -m app.worker --workers 4
+
+Varios procesos pueden trabajar a la vez: el reclamo usa SELECT ... FOR UPDATE SKIP LOCKED.
+"""
+import os
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+from app.db.session import AsyncSessionLocal
+from app.ai.openai_client import enriquecer_feedback_completo, circuito
+from app.ai.enrutador import analizar_feedback_enrutado
+from app.services.feedback_service import (
+    reclamar_feedbacks_pendientes,
+    completar_analisis_feedback,
+    marcar_analisis_fallido
+)
+
+load_dotenv()
+ENRIQUECIMIENTO_WORKERS = int(os.getenv("ENRIQUECIMIENTO_WORKERS", 4))
+ENRIQUECIMIENTO_TAMANO_LOTE = int(os.getenv("ENRIQUECIMIENTO_TAMANO_LOTE", 10))  # filas reclamadas de cada vez
+ENRIQUECIMIENTO_ESPERA = float(os.getenv("ENRIQUECIMIENTO_ESPERA", 2))  # segundos de espera si no hay trabajo
+ENRIQUECIMIENTO_MAX_INTENTOS = int(os.getenv("ENRIQUECIMIENTO_MAX_INTENTOS", 3))
+ENRIQUECIMIENTO_CADUCIDAD_RECLAMO = int(os.getenv("ENRIQUECIMIENTO_CADUCIDAD_RECLAMO", 300))  # segundos
+# Si es true, cada feedback se enriquece por completo (toxicidad, urgencia, sugerencia, respuesta) en una llamada
+ENRIQUECIMIENTO_COMPLETO = os.getenv("ENRIQUECIMIENTO_COMPLETO", "false").lower() == "true"
+
+# Permite despertar a los trabajadores del mismo proceso en cuanto llega un feedback nuevo
+_hay_trabajo = asyncio.Event()
+
+
+def avisar_trabajadores() -> None:
+    _hay_trabajo.set()
+
+
+# Cada paso abre su propia sesión: durante las llamadas IA el trabajador no retiene ninguna conexión
+
+async def _reclamar(limite: int) -> list[tuple[int, str]]:
+    async with AsyncSessionLocal() as db:
+        return await reclamar_feedbacks_pendientes(db, limite, ENRIQUECIMIENTO_CADUCIDAD_RECLAMO)
+
+
+async def _guardar_resultados(trabajos: list[tuple[int, str]], resultados: list) -> None:
+    async with AsyncSessionLocal() as db:
+        for (feedback_id, _), resultado in zip(trabajos, resultados):
+            if not isinstance(resultado, Exception):
+                try:
+                    await completar_analisis_feedback(db, feedback_id, resultado)
+                    continue
+                except ValueError as e:
+                    resultado = e
+            print(f"ERROR AL ANALIZAR FEEDBACK {feedback_id}:", str(resultado))
+            await marcar_analisis_fallido(db, feedback_id, ENRIQUECIMIENTO_MAX_INTENTOS)
+
+
+async def procesar_lote(tamano_lote: int = ENRIQUECIMIENTO_TAMANO_LOTE) -> int:
+    """
+    Reclama un lote de feedbacks pendientes, los analiza en paralelo y guarda los resultados.
+    Devuelve cuántos feedbacks se han procesado.
+    Mientras el circuito de la IA está abierto no reclama nada: los feedbacks siguen pendientes
+    en lugar de gastar intentos o guardarse con el análisis neutro.
+    """
+    if not circuito.disponible():
+        return 0
+
+    trabajos = await _reclamar(tamano_lote)
+    if not trabajos:
+        return 0
+
+    # Sin degradar: un fallo de la IA o una respuesta no válida devuelve el feedback a la cola
+    # (hasta ENRIQUECIMIENTO_MAX_INTENTOS) en vez de guardarlo con el análisis neutro
+    analizar = enriquecer_feedback_completo if ENRIQUECIMIENTO_COMPLETO else analizar_feedback_enrutado
+    resultados = await asyncio.gather(
+        *(analizar(comentario, degradar=False) for _, comentario in trabajos),
+        return_exceptions=True
+    )
+    await _guardar_resultados(trabajos, resultados)
+    return len(trabajos)
+
+
+async def ejecutar_trabajador() -> None:
+    """
+    Bucle de un trabajador: procesa lotes mientras haya trabajo y, si no lo hay,
+    espera un aviso o ENRIQUECIMIENTO_ESPERA segundos antes de volver a mirar.
+    """
+    while True:
+        try:
+            procesados = await procesar_lote()
+        except Exception as e:
+            print("ERROR EN EL TRABAJADOR DE ENRIQUECIMIENTO:", str(e))
+            procesados = 0
+
+        if procesados == 0:
+            _hay_trabajo.clear()
+            try:
+                await asyncio.wait_for(_hay_trabajo.wait(), timeout=ENRIQUECIMIENTO_ESPERA)
+            except asyncio.TimeoutError:
+                pass
+
+
+def iniciar_trabajadores(num_workers: int) -> list[asyncio.Task]:
+    """
+    Lanza `num_workers` trabajadores como tareas del event loop actual.
+    """
+    return [asyncio.create_task(ejecutar_trabajador()) for _ in range(num_workers)]
+
+
+async def _main(num_workers: int) -> None:
+    print(f"🔧 Iniciando {num_workers} trabajadores de enriquecimiento...")
+    await asyncio.gather(*iniciar_trabajadores(num_workers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trabajadores de enriquecimiento IA en segundo plano")
+    parser.add_argument("--workers", type=int, default=ENRIQUECIMIENTO_WORKERS, help="Número de trabajadores")
+    args = parser.parse_args()
+
+    asyncio.run(_main(args.workers))
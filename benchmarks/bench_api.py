@@ -0,0 +1,251 @@
+"""
+Suite de rendimiento de la API con la IA simulada (PostgreSQL o SQLite).
+
+Crea una base de datos con `--filas` feedbacks sintéticos (en el esquema `bench` de PostgreSQL,
+o en un fichero SQLite con `--sqlite`), sustituye el cliente de OpenAI por el de ia_simulada y
+mide las peticiones por segundo y las latencias p50/p95/p99 de POST /feedback/, del listado,
+de varios filtros y de todos los endpoints GET de /metrics. Los resultados se guardan en JSON
+para poder comparar ejecuciones (`--comparar` muestra la variación de p95 frente a otra).
+
+    python -m benchmarks.bench_api --filas 100000 --latencia-ia 300
+    python -m benchmarks.bench_api --sqlite /tmp/bench.db --filas 10000 --comparar benchmarks/resultados/anterior.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Callable, Optional
+import httpx
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.api import feedback, metrics
+from app.ai.cache_ia import cache_ia
+from app.db.session import get_db, url_asincrona
+from benchmarks.comun import (
+    crear_motor_benchmark, crear_motor_benchmark_async, preparar_esquema, preparar_sqlite, borrar_esquema
+)
+from benchmarks.ia_simulada import ClienteIASimulado, instalar
+
+CARPETA_RESULTADOS = os.path.join(os.path.dirname(__file__), "resultados")
+
+# Parámetros para los endpoints de /metrics que los necesitan (el resto se piden sin parámetros)
+PARAMETROS_METRICAS = {
+    "/metrics/por_usuario": {"nombre": "usuario_42"},
+    "/metrics/feedback_por_fecha": {"granularidad": "week"},
+    "/metrics/feedback_extremos": {"k": 5},
+}
+# Comentarios de POST /feedback/: los primeros los resuelve el clasificador local, los otros van a la IA
+COMENTARIOS_CLAROS = ["El ambiente es muy bueno", "El horario es horrible", "Sin comentarios"]
+COMENTARIOS_AMBIGUOS = ["La reunión fue el martes", "Estoy contento con el equipo aunque hay algunos problemas"]
+
+
+def crear_aplicacion(fabrica_sesiones: async_sessionmaker) -> FastAPI:
+    aplicacion = FastAPI()
+    aplicacion.include_router(feedback.router, prefix="/feedback")
+    aplicacion.include_router(metrics.router, prefix="/metrics")
+
+    async def get_db_benchmark():
+        async with fabrica_sesiones() as db:
+            yield db
+
+    aplicacion.dependency_overrides[get_db] = get_db_benchmark
+    return aplicacion
+
+
+def escenarios(semilla: int) -> list[dict]:
+    """
+    Peticiones que se miden: nombre, método, ruta, parámetros y, para POST, una función que genera
+    el cuerpo de cada petición (comentarios distintos para que no los sirva la caché de IA).
+    """
+    aleatorio = random.Random(semilla)
+
+    def cuerpo_feedback(numero: int) -> dict:
+        base = aleatorio.choice(COMENTARIOS_CLAROS if numero % 2 else COMENTARIOS_AMBIGUOS)
+        return {"autor": f"usuario_{aleatorio.randrange(5000)}", "comentario": f"{base} ({semilla}-{numero})"}
+
+    lista = [
+        {"nombre": "POST /feedback/", "metodo": "POST", "ruta": "/feedback/", "cuerpo": cuerpo_feedback},
+        {"nombre": "GET /feedback/", "metodo": "GET", "ruta": "/feedback/", "parametros": {"limit": 50}},
+        {"nombre": "GET /feedback/filtrados (autor)", "metodo": "GET", "ruta": "/feedback/filtrados",
+         "parametros": {"autor": "usuario_42", "limit": 20}},
+        {"nombre": "GET /feedback/filtrados (sentimiento y fechas)", "metodo": "GET", "ruta": "/feedback/filtrados",
+         "parametros": {"sentimiento": "negativo", "desde": "2024-06-01", "hasta": "2024-07-01", "limit": 50}},
+        {"nombre": "GET /feedback/filtrados (etiqueta)", "metodo": "GET", "ruta": "/feedback/filtrados",
+         "parametros": {"tag": "ambiente", "limit": 50}},
+    ]
+    for ruta in metrics.router.routes:
+        if isinstance(ruta, APIRoute) and "GET" in ruta.methods:
+            camino = "/metrics" + ruta.path
+            lista.append({
+                "nombre": f"GET {camino}", "metodo": "GET", "ruta": camino,
+                "parametros": PARAMETROS_METRICAS.get(camino, {}),
+            })
+    return lista
+
+
+async def lanzar_carga(
+    cliente: httpx.AsyncClient,
+    escenario: dict,
+    peticiones: int,
+    concurrencia: int,
+    desplazamiento: int = 0
+) -> dict:
+    """
+    Reparte `peticiones` del escenario entre `concurrencia` clientes.
+    Devuelve las peticiones por segundo, los percentiles de latencia en milisegundos y los errores.
+    """
+    pendientes = iter(range(desplazamiento, desplazamiento + peticiones))
+    latencias = []
+    errores = 0
+    cuerpo: Optional[Callable[[int], dict]] = escenario.get("cuerpo")
+
+    async def cliente_virtual():
+        nonlocal errores
+        for numero in pendientes:
+            inicio = time.perf_counter()
+            respuesta = await cliente.request(
+                escenario["metodo"], escenario["ruta"],
+                params=escenario.get("parametros"), json=cuerpo(numero) if cuerpo else None
+            )
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            errores += respuesta.status_code >= 400
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente_virtual() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+    return {
+        "peticiones": peticiones,
+        "errores": errores,
+        "peticiones_por_segundo": round(peticiones / duracion, 1),
+        "p50_ms": round(percentiles[49], 2),
+        "p95_ms": round(percentiles[94], 2),
+        "p99_ms": round(percentiles[98], 2),
+    }
+
+
+async def medir_todo(motor: AsyncEngine, peticiones: int, concurrencia: int, semilla: int) -> dict:
+    fabrica = async_sessionmaker(motor, autoflush=False, expire_on_commit=False)
+    transporte = httpx.ASGITransport(app=crear_aplicacion(fabrica))
+    resultados = {}
+    try:
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark", timeout=120) as cliente:
+            for escenario in escenarios(semilla):
+                # Calentamiento: abre conexiones y prepara consultas (sus filas no cuentan en la medida)
+                await lanzar_carga(cliente, escenario, 2, 1, desplazamiento=peticiones)
+                resultado = await lanzar_carga(cliente, escenario, peticiones, concurrencia)
+                resultados[escenario["nombre"]] = resultado
+                print(
+                    f"{escenario['nombre']:<55}{resultado['peticiones_por_segundo']:>10.1f}{resultado['p50_ms']:>10.1f}"
+                    f"{resultado['p95_ms']:>10.1f}{resultado['p99_ms']:>10.1f}{resultado['errores']:>8}"
+                )
+    finally:
+        await motor.dispose()
+    return resultados
+
+
+def _commit_actual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual: dict, ruta_anterior: str) -> None:
+    """
+    Muestra la variación de p95 y de peticiones por segundo de cada escenario frente a otra ejecución.
+    """
+    with open(ruta_anterior, encoding="utf-8") as fichero:
+        anterior = json.load(fichero)["resultados"]
+    print(f"\nComparación con {ruta_anterior}")
+    print(f"{'escenario':<55}{'p95 antes':>12}{'p95 ahora':>12}{'variación':>12}{'pet/s':>10}")
+    for nombre, resultado in actual.items():
+        if nombre not in anterior:
+            continue
+        antes = anterior[nombre]["p95_ms"]
+        pet_s_antes = anterior[nombre]["peticiones_por_segundo"]
+        variacion = f"{(resultado['p95_ms'] - antes) / antes * 100:+.1f}%" if antes else "-"
+        pet_s = f"{(resultado['peticiones_por_segundo'] / pet_s_antes - 1) * 100:+.1f}%" if pet_s_antes else "-"
+        print(f"{nombre:<55}{antes:>12.1f}{resultado['p95_ms']:>12.1f}{variacion:>12}{pet_s:>10}")
+
+
+def main(args) -> None:
+    metrics.METRICAS_CACHE_TTL = metrics.METRICAS_CACHE_TTL if args.con_cache else 0
+    cache_ia.persistente = False  # la tabla ia_cache es la de la base de datos real, no la de benchmark
+    anterior_cliente = instalar(ClienteIASimulado(args.latencia_ia, args.variacion_ia))
+
+    motor = None
+    try:
+        if args.sqlite:
+            motor = preparar_sqlite(args.sqlite, args.filas, args.con_terminos)
+            motor_async = create_async_engine(url_asincrona(f"sqlite:///{args.sqlite}"))
+            base_datos = "sqlite"
+        else:
+            motor = crear_motor_benchmark()
+            preparar_esquema(motor, args.filas, args.con_terminos)
+            motor_async = crear_motor_benchmark_async(pool_size=args.concurrencia, max_overflow=0)
+            base_datos = "postgresql"
+
+        print(f"{args.filas} filas en {base_datos}, {args.peticiones} peticiones por escenario, "
+              f"{args.concurrencia} clientes, IA simulada de {args.latencia_ia} ms")
+        print(f"{'escenario':<55}{'pet/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>8}")
+        resultados = asyncio.run(medir_todo(motor_async, args.peticiones, args.concurrencia, args.semilla))
+    finally:
+        instalar(anterior_cliente)
+        if motor is not None and not args.sqlite:
+            borrar_esquema(motor)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_actual(),
+        "entorno": {"python": sys.version.split()[0], "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "configuracion": {
+            "base_datos": base_datos,
+            "filas": args.filas,
+            "peticiones": args.peticiones,
+            "concurrencia": args.concurrencia,
+            "latencia_ia_ms": args.latencia_ia,
+            "variacion_ia_ms": args.variacion_ia,
+            "cache_metricas": args.con_cache,
+            "semilla": args.semilla,
+        },
+        "resultados": resultados,
+    }
+    salida = args.salida or os.path.join(
+        CARPETA_RESULTADOS, f"api_{base_datos}_{args.filas}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as fichero:
+        json.dump(informe, fichero, ensure_ascii=False, indent=2)
+    print(f"\n✅ Resultados guardados en {salida}")
+
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rendimiento de los endpoints de la API con la IA simulada")
+    parser.add_argument("--filas", type=int, default=100_000, help="Feedbacks sintéticos (10.000 a 1.000.000)")
+    parser.add_argument("--sqlite", metavar="RUTA", help="Usar un fichero SQLite en lugar de PostgreSQL")
+    parser.add_argument("--peticiones", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--concurrencia", type=int, default=10)
+    parser.add_argument("--latencia-ia", type=float, default=300, help="Latencia de la IA simulada en ms")
+    parser.add_argument("--variacion-ia", type=float, default=100, help="Variación máxima de la latencia en ms")
+    parser.add_argument("--con-cache", action="store_true", help="Mantener la caché de respuestas de /metrics")
+    parser.add_argument("--con-terminos", action="store_true", help="Calcular también term_counts (más lento)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Fichero JSON de resultados (por defecto en benchmarks/resultados/)")
+    parser.add_argument("--comparar", metavar="JSON", help="Resultados de otra ejecución con los que comparar")
+    main(parser.parse_args())
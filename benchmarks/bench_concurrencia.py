@@ -0,0 +1,116 @@
+"""
+Prueba de carga de los endpoints asíncronos con distintos tamaños del pool de conexiones (requiere PostgreSQL).
+
+Lanza `--peticiones` peticiones con `--concurrencia` clientes a la vez contra la aplicación, en
+el mismo proceso y el mismo event loop (un único worker de uvicorn), y repite la prueba con cada
+tamaño de pool. Con pool_size=1 las consultas se atienden de una en una, igual que cuando los
+endpoints async usaban una Session síncrona; con más conexiones las peticiones por segundo
+deberían crecer hasta que se sature la base de datos.
+
+    python -m benchmarks.bench_concurrencia --filas 200000 --pools 1 5 10 20
+"""
+import time
+import asyncio
+import argparse
+import statistics
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api import feedback, metrics
+from app.db.session import get_db
+from benchmarks.comun import crear_motor_benchmark, crear_motor_benchmark_async, preparar_esquema, borrar_esquema
+
+# Rutas que se reparten las peticiones: lecturas del resumen diario, de la tabla feedback y un listado
+RUTAS_POR_DEFECTO = [
+    "/metrics/resumen",
+    "/metrics/feedback_por_fecha?granularidad=week",
+    "/metrics/longitud_comentarios?cubetas=10",
+    "/metrics/feedback_extremos?k=5",
+    "/feedback/filtrados?autor=usuario_42&limit=20",
+]
+
+
+def crear_aplicacion(fabrica_sesiones: async_sessionmaker) -> FastAPI:
+    """
+    Aplicación con los routers de feedback y métricas cuyas sesiones salen de `fabrica_sesiones`.
+    """
+    aplicacion = FastAPI()
+    aplicacion.include_router(feedback.router, prefix="/feedback")
+    aplicacion.include_router(metrics.router, prefix="/metrics")
+
+    async def get_db_benchmark():
+        async with fabrica_sesiones() as db:
+            yield db
+
+    aplicacion.dependency_overrides[get_db] = get_db_benchmark
+    return aplicacion
+
+
+async def lanzar_carga(cliente: httpx.AsyncClient, rutas: list[str], peticiones: int, concurrencia: int) -> dict:
+    """
+    Reparte `peticiones` entre `concurrencia` clientes que piden las rutas por turnos.
+    Devuelve las peticiones por segundo y los percentiles de latencia en milisegundos.
+    """
+    pendientes = iter(range(peticiones))
+    latencias = []
+
+    async def cliente_virtual():
+        for numero in pendientes:
+            inicio = time.perf_counter()
+            respuesta = await cliente.get(rutas[numero % len(rutas)])
+            respuesta.raise_for_status()
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente_virtual() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    percentiles = statistics.quantiles(latencias, n=100)
+    return {
+        "peticiones_por_segundo": round(peticiones / duracion, 1),
+        "p50_ms": round(percentiles[49], 1),
+        "p95_ms": round(percentiles[94], 1),
+        "p99_ms": round(percentiles[98], 1),
+    }
+
+
+async def medir_pool(pool_size: int, rutas: list[str], peticiones: int, concurrencia: int) -> dict:
+    motor = crear_motor_benchmark_async(pool_size=pool_size, max_overflow=0)
+    fabrica = async_sessionmaker(motor, autoflush=False, expire_on_commit=False)
+    transporte = httpx.ASGITransport(app=crear_aplicacion(fabrica))
+    try:
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+            await lanzar_carga(cliente, rutas, len(rutas), 1)  # calentamiento: abre conexiones y prepara consultas
+            return await lanzar_carga(cliente, rutas, peticiones, concurrencia)
+    finally:
+        await motor.dispose()
+
+
+def main(filas: int, pools: list[int], rutas: list[str], peticiones: int, concurrencia: int) -> None:
+    metrics.METRICAS_CACHE_TTL = 0  # se mide la base de datos, no la caché de respuestas
+    motor = crear_motor_benchmark()
+    try:
+        preparar_esquema(motor, filas)
+        print(f"{filas} filas, {peticiones} peticiones, {concurrencia} clientes concurrentes")
+        print(f"{'pool':>6}{'peticiones/s':>15}{'p50 (ms)':>12}{'p95 (ms)':>12}{'p99 (ms)':>12}")
+        for pool_size in pools:
+            resultado = asyncio.run(medir_pool(pool_size, rutas, peticiones, concurrencia))
+            print(
+                f"{pool_size:>6}{resultado['peticiones_por_segundo']:>15.1f}{resultado['p50_ms']:>12.1f}"
+                f"{resultado['p95_ms']:>12.1f}{resultado['p99_ms']:>12.1f}"
+            )
+    finally:
+        borrar_esquema(motor)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rendimiento de los endpoints asíncronos según el tamaño del pool")
+    parser.add_argument("--filas", type=int, default=200_000)
+    parser.add_argument("--pools", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--rutas", nargs="+", default=RUTAS_POR_DEFECTO)
+    parser.add_argument("--peticiones", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    args = parser.parse_args()
+
+    main(args.filas, args.pools, args.rutas, args.peticiones, args.concurrencia)
@@ -0,0 +1,108 @@
+"""
+Benchmark de los índices de filtrado de feedback (requiere PostgreSQL).
+
+Crea una tabla `bench_feedback` con la misma estructura que `feedback`, la llena con
+`--filas` filas sintéticas, mide las consultas de filtrar_feedbacks y de las métricas por
+usuario sin índices, crea los mismos índices que la migración 2 y las vuelve a medir.
+
+    python -m benchmarks.bench_indices --filas 1000000 --repeticiones 5
+"""
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+from app.db.session import engine
+from app.db.migraciones import crear_indices_filtrado
+from benchmarks.comun import sql_insertar_filas
+
+TABLA = "bench_feedback"
+
+# Consultas equivalentes a las que generan filtrar_feedbacks y /metrics/por_usuario
+CONSULTAS = {
+    "rango_fechas": (
+        f"SELECT * FROM {TABLA} WHERE fecha >= :desde AND fecha <= :hasta "
+        "ORDER BY fecha DESC, id DESC LIMIT 50"
+    ),
+    "pagina_profunda": (
+        f"SELECT * FROM {TABLA} WHERE (fecha, id) < (:desde, 1000000000) "
+        "ORDER BY fecha DESC, id DESC LIMIT 50"
+    ),
+    "autor_ilike": f"SELECT * FROM {TABLA} WHERE autor ILIKE :patron ORDER BY fecha DESC, id DESC LIMIT 50",
+    "autor_ilike_contar": f"SELECT count(*) FROM {TABLA} WHERE autor ILIKE :patron",
+    "metricas_por_usuario": (
+        f"SELECT sentimiento, count(id) FROM {TABLA} WHERE autor = :autor GROUP BY sentimiento"
+    ),
+    "sentimiento_y_fecha": (
+        f"SELECT * FROM {TABLA} WHERE sentimiento = 'negativo' AND fecha >= :desde AND fecha <= :hasta "
+        "ORDER BY fecha DESC, id DESC LIMIT 50"
+    ),
+}
+
+
+def preparar_tabla(filas: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLA}"))
+        conn.execute(text(f"CREATE TABLE {TABLA} (LIKE feedback)"))
+        conn.execute(text(f"ALTER TABLE {TABLA} ADD PRIMARY KEY (id)"))
+        conn.execute(text(sql_insertar_filas(TABLA)), {"filas": filas})
+        conn.execute(text(f"ANALYZE {TABLA}"))
+
+
+def medir(repeticiones: int) -> dict[str, float]:
+    """
+    Devuelve la mediana en milisegundos de cada consulta de CONSULTAS.
+    """
+    parametros = {
+        "desde": datetime(2025, 3, 1),
+        "hasta": datetime(2025, 3, 1) + timedelta(days=7),
+        "patron": "%ario_123%",
+        "autor": "usuario_1234",
+    }
+    tiempos = {}
+    with engine.connect() as conn:
+        for nombre, sql in CONSULTAS.items():
+            consulta = text(sql)
+            muestras = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                conn.execute(consulta, parametros).fetchall()
+                muestras.append((time.perf_counter() - inicio) * 1000)
+            tiempos[nombre] = statistics.median(muestras)
+    return tiempos
+
+
+def main(filas: int, repeticiones: int, mantener: bool) -> None:
+    print(f"🔧 Generando {filas} filas en {TABLA}...")
+    preparar_tabla(filas)
+
+    antes = medir(repeticiones)
+
+    print("🔧 Creando índices...")
+    with engine.begin() as conn:
+        trigramas = crear_indices_filtrado(conn, TABLA)
+        conn.execute(text(f"ANALYZE {TABLA}"))
+    if not trigramas:
+        print("⚠️ Sin índice de trigramas: las consultas ILIKE seguirán sin índice")
+
+    despues = medir(repeticiones)
+
+    print(f"\n{'consulta':<24}{'sin índices (ms)':>18}{'con índices (ms)':>18}{'mejora':>10}")
+    for nombre in CONSULTAS:
+        mejora = antes[nombre] / despues[nombre] if despues[nombre] else float("inf")
+        print(f"{nombre:<24}{antes[nombre]:>18.2f}{despues[nombre]:>18.2f}{mejora:>9.1f}x")
+
+    if not mantener:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {TABLA}"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide las consultas de filtrado con y sin índices")
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--repeticiones", type=int, default=5, help="Ejecuciones de cada consulta (se usa la mediana)")
+    parser.add_argument("--mantener", action="store_true", help="No borrar la tabla al terminar")
+    args = parser.parse_args()
+
+    main(args.filas, args.repeticiones, args.mantener)
@@ -0,0 +1,135 @@
+"""
+Rendimiento de los logins y su efecto sobre el resto de peticiones (requiere PostgreSQL).
+
+Lanza `--logins` logins con `--concurrencia` clientes a la vez y, mientras tanto, un cliente
+que pide cada 5 ms una ruta sin autenticación ni base de datos (/metrics/pool). Se repite con
+bcrypt en el event loop (como antes, cuando login_user verificaba la contraseña de forma
+síncrona) y en los hilos de bcrypt. Con bcrypt en el event loop, la latencia de la otra ruta
+sube hasta lo que tarda cada hash; en los hilos debería quedarse en unos pocos milisegundos.
+
+    python -m benchmarks.bench_login --logins 200 --concurrencia 20 --rounds 12
+"""
+import time
+import asyncio
+import argparse
+import statistics
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api import auth, metrics
+from app.db.session import get_db
+from app.models.user import User
+from app.services import auth_service
+from app.utils import security
+from benchmarks.comun import crear_motor_benchmark, crear_motor_benchmark_async, preparar_esquema, borrar_esquema
+
+USUARIOS = 50
+CONTRASENA = "contrasena-de-prueba"
+INTERVALO_OTRA_RUTA = 0.005  # segundos entre peticiones a la ruta sin autenticación
+
+
+def crear_aplicacion(fabrica_sesiones: async_sessionmaker) -> FastAPI:
+    aplicacion = FastAPI()
+    aplicacion.include_router(auth.router, prefix="/auth")
+    aplicacion.include_router(metrics.router, prefix="/metrics")
+
+    async def get_db_benchmark():
+        async with fabrica_sesiones() as db:
+            yield db
+
+    aplicacion.dependency_overrides[get_db] = get_db_benchmark
+    return aplicacion
+
+
+async def _verificar_en_el_bucle(plain_password: str, hashed_password: str):
+    # Comportamiento anterior: bcrypt se ejecuta en el hilo del event loop y lo bloquea
+    return security.pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _percentiles(latencias: list[float]) -> dict:
+    percentiles = statistics.quantiles(latencias, n=100)
+    return {"p50_ms": round(percentiles[49], 1), "p99_ms": round(percentiles[98], 1)}
+
+
+async def medir(fabrica: async_sessionmaker, logins: int, concurrencia: int) -> dict:
+    """
+    Logins por segundo y latencia de /metrics/pool mientras duran los logins.
+    """
+    transporte = httpx.ASGITransport(app=crear_aplicacion(fabrica))
+    async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+        pendientes = iter(range(logins))
+        terminado = asyncio.Event()
+        latencias_otra_ruta = []
+
+        async def cliente_login():
+            for numero in pendientes:
+                respuesta = await cliente.post("/auth/login", json={
+                    "email": f"usuario_{numero % USUARIOS}@benchmark.com", "password": CONTRASENA
+                })
+                respuesta.raise_for_status()
+
+        async def cliente_otra_ruta():
+            # Cada petición "llega" INTERVALO_OTRA_RUTA segundos después de terminar la anterior; la latencia
+            # se cuenta desde ese momento, así que incluye lo que el event loop tarda en volver a atenderla
+            while not terminado.is_set():
+                llegada = time.perf_counter() + INTERVALO_OTRA_RUTA
+                await asyncio.sleep(INTERVALO_OTRA_RUTA)
+                (await cliente.get("/metrics/pool")).raise_for_status()
+                latencias_otra_ruta.append((time.perf_counter() - llegada) * 1000)
+
+        otra_ruta = asyncio.create_task(cliente_otra_ruta())
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente_login() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+        terminado.set()
+        await otra_ruta
+
+    return {"logins_por_segundo": round(logins / duracion, 1), **_percentiles(latencias_otra_ruta)}
+
+
+async def medir_modos(logins: int, concurrencia: int) -> dict:
+    motor = crear_motor_benchmark_async(pool_size=concurrencia, max_overflow=0)
+    fabrica = async_sessionmaker(motor, autoflush=False, expire_on_commit=False)
+    original = auth_service.verify_and_update_password_async
+    resultados = {}
+    try:
+        auth_service.verify_and_update_password_async = _verificar_en_el_bucle
+        resultados["event loop"] = await medir(fabrica, logins, concurrencia)
+        auth_service.verify_and_update_password_async = original
+        resultados[f"{security.HASH_WORKERS} hilos"] = await medir(fabrica, logins, concurrencia)
+    finally:
+        auth_service.verify_and_update_password_async = original
+        await motor.dispose()
+    return resultados
+
+
+def main(logins: int, concurrencia: int, rounds: int) -> None:
+    security.pwd_context.update(bcrypt__rounds=rounds)
+    motor = crear_motor_benchmark()
+    try:
+        preparar_esquema(motor, 0)
+        contrasena = security.hash_password(CONTRASENA)
+        with motor.begin() as conn:
+            conn.execute(insert(User), [
+                {"email": f"usuario_{i}@benchmark.com", "hashed_password": contrasena, "role": "user"}
+                for i in range(USUARIOS)
+            ])
+
+        print(f"{logins} logins, {concurrencia} clientes concurrentes, bcrypt con coste {rounds}")
+        print(f"{'bcrypt en':>12}{'logins/s':>12}{'otra ruta p50 (ms)':>21}{'otra ruta p99 (ms)':>21}")
+        for modo, resultado in asyncio.run(medir_modos(logins, concurrencia)).items():
+            print(f"{modo:>12}{resultado['logins_por_segundo']:>12.1f}{resultado['p50_ms']:>21.1f}{resultado['p99_ms']:>21.1f}")
+    finally:
+        borrar_esquema(motor)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Logins por segundo y su efecto sobre la latencia del resto de la API")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=security.BCRYPT_ROUNDS, help="Coste de bcrypt")
+    args = parser.parse_args()
+
+    main(args.logins, args.concurrencia, args.rounds)
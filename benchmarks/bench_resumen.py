@@ -0,0 +1,63 @@
+"""
+Benchmark de /metrics/resumen: cálculo anterior con pandas frente al GROUP BY en SQL (requiere PostgreSQL).
+
+    python -m benchmarks.bench_resumen --filas 100000 1000000
+"""
+import asyncio
+import argparse
+import pandas
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.feedback import Feedback
+from app.utils.utils import model_to_dict_feedback
+from app.analytics.estadisticas_service import calcular_resumen_sentimientos
+from benchmarks.comun import crear_motor_benchmark, crear_motor_benchmark_async, preparar_esquema, borrar_esquema, medir
+
+
+def resumen_con_pandas(db: Session) -> dict:
+    # Implementación anterior: carga la tabla entera en un DataFrame para contar tres valores
+    feedbacks_df = pandas.DataFrame(model_to_dict_feedback(db.query(Feedback).all()))
+    conteo = feedbacks_df.value_counts('sentimiento')
+    porcentaje = ((conteo / conteo.sum()) * 100).round(2).to_dict()
+    return {
+        "total_feedbacks": len(feedbacks_df),
+        "resumen_por_sentimiento": {
+            tipo: {"cantidad": int(conteo.get(tipo, 0)), "porcentaje": float(porcentaje.get(tipo, 0))}
+            for tipo in ['positivo', 'neutro', 'negativo']
+        }
+    }
+
+
+def main(tamanos: list[int], repeticiones: int) -> None:
+    motor = crear_motor_benchmark()
+    motor_async = crear_motor_benchmark_async()
+    bucle = asyncio.new_event_loop()
+    try:
+        print(f"{'filas':>10}{'versión':>10}{'mediana (ms)':>16}{'memoria pico (MB)':>20}")
+        for filas in tamanos:
+            preparar_esquema(motor, filas)
+            with Session(motor) as db:
+                antes = medir(lambda: resumen_con_pandas(db), repeticiones)
+                esperado = resumen_con_pandas(db)
+            db_async = AsyncSession(motor_async)
+            try:
+                despues = medir(lambda: bucle.run_until_complete(calcular_resumen_sentimientos(db_async)), repeticiones)
+                assert esperado == bucle.run_until_complete(calcular_resumen_sentimientos(db_async))
+            finally:
+                bucle.run_until_complete(db_async.close())
+            for version, resultado in (("pandas", antes), ("sql", despues)):
+                print(f"{filas:>10}{version:>10}{resultado['mediana_ms']:>16.2f}{resultado['memoria_pico_mb']:>20.2f}")
+    finally:
+        bucle.run_until_complete(motor_async.dispose())
+        bucle.close()
+        borrar_esquema(motor)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara el resumen de sentimientos con pandas y con SQL")
+    parser.add_argument("--filas", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    main(args.filas, args.repeticiones)
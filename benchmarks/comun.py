@@ -0,0 +1,151 @@
+"""
+Utilidades compartidas por los benchmarks.
+
+Los benchmarks que llaman al código de la aplicación trabajan en un esquema aparte (`bench`)
+con las mismas tablas: el motor de `crear_motor_benchmark` pone ese esquema el primero en el
+search_path, así que los modelos (tabla "feedback" sin esquema) leen y escriben allí sin tocar
+los datos reales. Sin PostgreSQL, `preparar_sqlite` crea los mismos datos en un fichero SQLite.
+"""
+import os
+import time
+import statistics
+import tracemalloc
+from typing import Callable
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.db.session import SQLALCHEMY_DATABASE_URL, url_asincrona
+from app.db.base_class import Base
+from app.db import init_db  # noqa: F401  (registra todos los modelos en Base)
+from app.analytics.agregados import reconstruir_resumen_diario, reconstruir_conteo_terminos
+
+ESQUEMA = "bench"
+
+
+def sql_insertar_filas(tabla: str) -> str:
+    """
+    INSERT ... SELECT que genera `:filas` feedbacks sintéticos en `tabla`: 5.000 autores,
+    dos años de fechas y los tres sentimientos repartidos por igual.
+    """
+    return f"""
+        INSERT INTO {tabla} (id, autor, comentario, fecha, sentimiento, etiquetas, resumen,
+                             urgencia, estado_analisis, analisis_intentos)
+        SELECT g,
+               'usuario_' || (g % 5000),
+               'Comentario de prueba número ' || g,
+               TIMESTAMP '2024-01-01' + (g % 730) * INTERVAL '1 day' + (g % 86400) * INTERVAL '1 second',
+               (ARRAY['positivo', 'negativo', 'neutro'])[1 + g % 3],
+               'ambiente,salario',
+               'Resumen ' || g,
+               (ARRAY['urgente', 'normal', 'baja'])[1 + g % 3],
+               'completado',
+               0
+        FROM generate_series(1, :filas) AS g
+    """
+
+
+def sql_insertar_filas_sqlite(tabla: str) -> str:
+    """
+    Versión para SQLite de `sql_insertar_filas`: los mismos feedbacks, generados con una CTE recursiva.
+    """
+    return f"""
+        INSERT INTO {tabla} (id, autor, comentario, fecha, sentimiento, etiquetas, resumen,
+                             urgencia, estado_analisis, analisis_intentos)
+        WITH RECURSIVE g(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM g WHERE n < :filas)
+        SELECT n,
+               'usuario_' || (n % 5000),
+               'Comentario de prueba número ' || n,
+               datetime('2024-01-01', '+' || (n % 730) || ' days', '+' || (n % 86400) || ' seconds'),
+               CASE n % 3 WHEN 0 THEN 'positivo' WHEN 1 THEN 'negativo' ELSE 'neutro' END,
+               'ambiente,salario',
+               'Resumen ' || n,
+               CASE n % 3 WHEN 0 THEN 'urgente' WHEN 1 THEN 'normal' ELSE 'baja' END,
+               'completado',
+               0
+        FROM g
+    """
+
+
+def crear_motor_benchmark() -> Engine:
+    return create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"options": f"-c search_path={ESQUEMA},public -c timezone=UTC"}
+    )
+
+
+def crear_motor_benchmark_async(**opciones_pool) -> AsyncEngine:
+    """
+    Motor asíncrono (asyncpg) sobre el esquema de benchmark. `opciones_pool` se pasa tal cual
+    a create_async_engine (pool_size, max_overflow...).
+    """
+    return create_async_engine(
+        url_asincrona(SQLALCHEMY_DATABASE_URL),
+        connect_args={"server_settings": {"search_path": f"{ESQUEMA},public", "timezone": "UTC"}},
+        **opciones_pool
+    )
+
+
+def preparar_esquema(motor: Engine, filas: int, con_terminos: bool = False) -> None:
+    """
+    Crea de cero el esquema de benchmark con todas las tablas e índices y `filas` feedbacks.
+    Calcula también feedback_daily_rollup y, si se pide (es más lento), term_counts.
+    """
+    with motor.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {ESQUEMA}"))
+    Base.metadata.create_all(bind=motor)
+    with motor.begin() as conn:
+        conn.execute(text(sql_insertar_filas("feedback")), {"filas": filas})
+        conn.execute(text(f"SELECT setval(pg_get_serial_sequence('feedback', 'id'), :filas)"), {"filas": filas})
+        conn.execute(text("ANALYZE feedback"))
+    with Session(motor) as db:
+        reconstruir_resumen_diario(db)
+        if con_terminos:
+            reconstruir_conteo_terminos(db)
+        db.commit()
+
+
+def preparar_sqlite(ruta: str, filas: int, con_terminos: bool = False) -> Engine:
+    """
+    Crea de cero una base de datos SQLite en `ruta` con todas las tablas y `filas` feedbacks,
+    igual que `preparar_esquema` en PostgreSQL. Devuelve su motor síncrono.
+    """
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    motor = create_engine(f"sqlite:///{ruta}")
+    Base.metadata.create_all(bind=motor)
+    with motor.begin() as conn:
+        conn.execute(text(sql_insertar_filas_sqlite("feedback")), {"filas": filas})
+        conn.execute(text("ANALYZE"))
+    with Session(motor) as db:
+        reconstruir_resumen_diario(db)
+        if con_terminos:
+            reconstruir_conteo_terminos(db)
+        db.commit()
+    return motor
+
+
+def borrar_esquema(motor: Engine) -> None:
+    with motor.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE"))
+
+
+def medir(funcion: Callable[[], object], repeticiones: int) -> dict:
+    """
+    Ejecuta `funcion` varias veces y devuelve la mediana en milisegundos y el pico de memoria
+    de Python (MB) de la primera ejecución.
+    """
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    muestras = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        muestras.append((time.perf_counter() - inicio) * 1000)
+
+    return {"mediana_ms": round(statistics.median(muestras), 2), "memoria_pico_mb": round(pico / 1024 / 1024, 2)}
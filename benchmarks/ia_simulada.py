@@ -0,0 +1,107 @@
+"""
+Sustituto local y determinista del cliente de OpenAI para los benchmarks.
+
+Imita `client.chat.completions.create`: reconoce cada prompt de openai_client (análisis, análisis
+en lote, enriquecimiento, toxicidad, urgencia y texto libre) y devuelve una respuesta válida con
+el mismo formato, elegida a partir del hash del prompt, así que el mismo comentario produce
+siempre el mismo resultado. Cada llamada espera `latencia_ms` (más una variación también
+derivada del hash) sin bloquear el event loop y devuelve un `usage` con tokens aproximados.
+
+    anterior = instalar(ClienteIASimulado(latencia_ms=300))
+    ...
+    instalar(anterior)
+"""
+import re
+import json
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+from app.ai import openai_client
+
+SENTIMIENTOS = ("positivo", "negativo", "neutro")
+ETIQUETAS = ("ambiente", "salario", "horario", "liderazgo", "formación", "comunicación")
+
+
+def _numero(texto: str) -> int:
+    return int.from_bytes(hashlib.sha256(texto.encode("utf-8")).digest()[:8], "big")
+
+
+def _analisis(comentario: str) -> dict:
+    numero = _numero(comentario)
+    return {
+        "sentimiento": SENTIMIENTOS[numero % 3],
+        "etiquetas": [ETIQUETAS[numero % 6], ETIQUETAS[(numero // 6) % 6]],
+        "resumen": f"Resumen simulado: {comentario[:60]}",
+    }
+
+
+def responder(prompt: str) -> str:
+    """
+    Contenido que devolvería el modelo para `prompt`, según el tipo de petición de openai_client.
+    """
+    numero = _numero(prompt)
+    if '"indice"' in prompt:
+        lote = json.loads(re.search(r"(\[\s*\{.*?\}\s*\])", prompt, re.S).group(1))
+        return json.dumps([{"indice": e["indice"], **_analisis(e["comentario"])} for e in lote], ensure_ascii=False)
+    if '"razon_toxicidad"' in prompt:
+        analisis = _analisis(prompt)
+        return json.dumps({
+            **analisis,
+            "toxico": numero % 10 == 0,
+            "razon_toxicidad": "Respuesta simulada",
+            "urgencia": ("urgente", "normal", "baja")[numero % 3],
+            "sugerencia": "Sugerencia simulada",
+            "respuesta": "Respuesta simulada" if analisis["sentimiento"] == "negativo" else None,
+        }, ensure_ascii=False)
+    if '"sentimiento"' in prompt:
+        return json.dumps(_analisis(prompt), ensure_ascii=False)
+    if "toxico" in prompt:
+        return json.dumps({"toxico": numero % 10 == 0, "razon": "Respuesta simulada"})
+    if "urgente, normal o baja" in prompt:
+        return ("urgente", "normal", "baja")[numero % 3]
+    return "Respuesta simulada."
+
+
+class _CompletionsSimuladas:
+    def __init__(self, cliente: "ClienteIASimulado"):
+        self._cliente = cliente
+
+    async def create(self, messages: list, max_tokens: int = 200, **_):
+        prompt = messages[-1]["content"]
+        variacion = (_numero(prompt) % 1000) / 1000 * self._cliente.variacion_ms
+        await asyncio.sleep((self._cliente.latencia_ms + variacion) / 1000)
+        self._cliente.llamadas += 1
+
+        contenido = responder(prompt)
+        tokens_prompt = sum(len(m["content"]) for m in messages) // 4  # ~4 caracteres por token
+        tokens_respuesta = min(max_tokens, len(contenido) // 4 + 1)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=contenido))],
+            usage=SimpleNamespace(
+                prompt_tokens=tokens_prompt,
+                completion_tokens=tokens_respuesta,
+                total_tokens=tokens_prompt + tokens_respuesta,
+            ),
+        )
+
+
+class ClienteIASimulado:
+    """
+    Cliente con la misma interfaz que AsyncOpenAI para las llamadas de openai_client.
+    """
+
+    def __init__(self, latencia_ms: float = 300, variacion_ms: float = 100):
+        self.latencia_ms = latencia_ms
+        self.variacion_ms = variacion_ms
+        self.llamadas = 0
+        self.chat = SimpleNamespace(completions=_CompletionsSimuladas(self))
+
+
+def instalar(cliente):
+    """
+    Sustituye el cliente de openai_client y devuelve el anterior para poder restaurarlo.
+    """
+    anterior = openai_client.client
+    openai_client.client = cliente
+    return anterior